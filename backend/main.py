@@ -1,10 +1,17 @@
 import uvicorn
-from fastapi import FastAPI
+import os
+from fastapi import FastAPI, Request
+from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from src.core import config
+from src.core.serialization import FastJSONResponse
 from src.db import init_db
-from src.api import user_router, medication_router, reminder_router, third_party_router
+from src.db.pool_metrics import begin_request_pool_timing
+from src.api import user_router, medication_router, reminder_router, third_party_router, internal_router
+from src.serves.drug_search_index import rebuild_drug_search_index
+from src.serves.scheduler_service import reminder_scheduler
+from src.serves.third_party_service import start_http_client, close_http_client
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
@@ -12,8 +19,17 @@ async def lifespan(_app: FastAPI):
     print("开始初始化数据库...")
     init_db()  # 初始化数据库
     print("成功初始化数据库...")
+    await start_http_client()  # 创建共享的第三方API客户端
+    if config.REMINDER_SCHEDULER_ENABLED and config.REMINDER_READ_MODE == "materialized":
+        await reminder_scheduler.start()  # 启动提醒后台生成任务
+        print(f"提醒调度器已启动，滚动生成 {config.REMINDER_HORIZON_DAYS} 天")
+    if config.DRUG_SEARCH_MODE != "remote":
+        index = await rebuild_drug_search_index()  # 构建本地药品搜索索引
+        print(f"本地药品搜索索引已构建，共 {index.stats()['documents']} 条，用时 {index.build_seconds:.2f} 秒")
     print(f"后端地址: {config.HOST}:{config.PORT}")
     yield
+    await reminder_scheduler.stop()
+    await close_http_client()
     print("应用关闭...")
 
 # noinspection SpellCheckingInspection
@@ -24,7 +40,8 @@ def main():
         title="MediTrack API",
         description="面向患者的药物管理平台",
         version="0.1.0",
-        lifespan=lifespan
+        lifespan=lifespan,
+        default_response_class=FastJSONResponse  # 由pydantic-core直接序列化为JSON字节
     )
 
     # 配置CORS中间件
@@ -37,9 +54,19 @@ def main():
         ],
         allow_credentials=True,
         allow_methods=["*"],
-        allow_headers=["*"]
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"]  # 分页游标
     )
 
+    # 记录每个请求等待数据库连接的时间（Server-Timing响应头）
+    @app.middleware("http")
+    async def pool_timing_middleware(request: Request, call_next):
+        pool_wait = begin_request_pool_timing()
+        response = await call_next(request)
+        if pool_wait[1]:
+            response.headers["Server-Timing"] = f"db-pool;dur={pool_wait[0] * 1000:.3f};desc=\"{pool_wait[1]} checkouts\""
+        return response
+
     # 注册用户路由
     app.include_router(user_router)
 
@@ -52,6 +79,14 @@ def main():
     # 注册第三方查询路由
     app.include_router(third_party_router)
 
+    # 注册内部运维路由
+    app.include_router(internal_router)
+
+    # 本地照片存储的静态文件服务
+    if config.PHOTO_STORAGE_BACKEND == "local":
+        os.makedirs(config.PHOTO_LOCAL_DIR, exist_ok=True)
+        app.mount("/photos", StaticFiles(directory=config.PHOTO_LOCAL_DIR), name="photos")
+
     # 启动uvicorn服务
     uvicorn.run(app, host=config.HOST, port=config.PORT)
 
@@ -0,0 +1,1195 @@
+"""
+命令行管理工具
+用法：
+    python manage.py import-drug-catalog <文件路径> [--format csv|jsonl] [--batch-size 1000]
+    python manage.py bench-drug-search [--size 200000] [--queries 1000]
+    python manage.py migrate-photos [--batch-size 50]
+    python manage.py migrate-medication-json [--batch-size 500]
+    python manage.py bench-medication-payload [--medications 30] [--photos 3] [--photo-kb 300]
+    python manage.py bench-schedule-expansion [--medications 1000] [--days 90] [--rounds 5]
+    python manage.py compile-schedules [--batch-size 500]
+    python manage.py bench-list-serialization [--rows 500] [--requests 200]
+    python manage.py check-export-memory [--rows 1000000] [--format ndjson|csv] [--synthetic]
+    python manage.py rebuild-rollups [--user-id <用户ID>] [--batch-size 100]
+    python manage.py check-rollups [--user-id <用户ID>] [--limit 100] [--fix]
+    python manage.py check-write-queries
+    python manage.py check-etags
+    python manage.py bench-reminder-generation [--medications 8] [--days 30]
+    python manage.py bench-reminder-range [--medications 10] [--days 90] [--page-size 200]
+    python manage.py bench-async-load [--concurrency 200] [--requests 20] [--latency-ms 0]
+    python manage.py bench-jwt-verify [--seconds 2]
+    python manage.py bench-jisu-client [--calls 500]
+    python manage.py check-singleflight [--callers 100] [--delay-ms 100]
+    python manage.py migrate-indexes
+"""
+import argparse
+import asyncio
+import random
+import time
+
+
+def import_drug_catalog(args):
+    """从CSV/JSONL文件批量导入药品目录"""
+    from src.db import init_db
+    from src.serves import drug_catalog_service
+
+    file_format = args.format or ("csv" if args.path.lower().endswith(".csv") else "jsonl")
+    init_db()
+
+    async def run():
+        with open(args.path, encoding="utf-8-sig", newline="") as file:
+            return await drug_catalog_service.import_catalog_records(
+                drug_catalog_service.iter_catalog_file(file, file_format),
+                batch_size=args.batch_size
+            )
+
+    started = time.perf_counter()
+    result = asyncio.run(run())
+    print(f"导入完成: 读取 {result['read']} 条，写入 {result['imported']} 条，"
+          f"跳过 {result['skipped']} 条，共 {result['batches']} 批，用时 {time.perf_counter() - started:.2f} 秒")
+
+
+def _synthetic_catalog(size: int, rng: random.Random):
+    """生成合成药品目录（药名由常见成分、剂型组合而成）"""
+    ingredients = ["阿莫西林", "布洛芬", "对乙酰氨基酚", "头孢克肟", "奥美拉唑", "二甲双胍", "氨氯地平",
+                   "阿托伐他汀", "氯雷他定", "蒙脱石", "板蓝根", "连花清瘟", "维生素C", "复方甘草", "硝苯地平",
+                   "左氧氟沙星", "阿奇霉素", "甲硝唑", "氯化钾", "葡萄糖酸钙"]
+    forms = ["片", "胶囊", "颗粒", "缓释片", "分散片", "口服液", "注射液", "软膏", "滴眼液", "肠溶片"]
+    cities = ["北京", "上海", "广州", "深圳", "杭州", "成都", "武汉", "西安", "南京", "天津", "重庆", "哈药"]
+    suffixes = ["制药有限公司", "药业股份有限公司", "医药集团", "生物制药有限公司"]
+
+    for i in range(size):
+        name = f"{rng.choice(ingredients)}{rng.choice(forms)}"
+        yield {
+            "external_drug_id": f"bench_{i}",
+            "name": name,
+            "generic_name": name,
+            "trade_name": name,
+            "manufacturer": f"{rng.choice(cities)}{rng.randint(1, 500)}{rng.choice(suffixes)}",
+            "specification": None,
+            "dosage_form": None,
+            "is_prescription": bool(i % 2),
+            "drug_image_url": "",
+            "drug_code": None,
+            "approval_number": f"国药准字H{20000000 + i}",
+            "barcode": f"69{i:011d}",
+            "medicine_id": f"bench_{i}"
+        }
+
+
+def bench_drug_search(args):
+    """对合成药品目录构建本地搜索索引并统计查询耗时（不连接数据库）"""
+    from src.serves.drug_search_index import DrugSearchIndex
+
+    rng = random.Random(args.seed)
+    docs = list(_synthetic_catalog(args.size, rng))
+    index = DrugSearchIndex.build(docs)
+    print(f"索引构建: {args.size} 条，用时 {index.build_seconds:.2f} 秒，{index.stats()}")
+
+    workloads = {
+        "name": [doc["name"][:rng.randint(1, len(doc["name"]))] for doc in rng.sample(docs, args.queries)],
+        "manufacturer": [doc["manufacturer"][:4] for doc in rng.sample(docs, args.queries)],
+        "barcode": [doc["barcode"] for doc in rng.sample(docs, args.queries)],
+        "approval_number": [doc["approval_number"] for doc in rng.sample(docs, args.queries)]
+    }
+    for name, queries in workloads.items():
+        search_type = "name" if name == "approval_number" else name
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query, search_type, 10)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        print(f"{name}: p50={latencies[len(latencies) // 2]:.3f}ms "
+              f"p99={latencies[int(len(latencies) * 0.99)]:.3f}ms max={latencies[-1]:.3f}ms")
+
+
+def migrate_photos(args):
+    """将药物记录中内联的Base64照片迁移到照片存储"""
+    from src.serves import photo_service
+
+    started = time.perf_counter()
+    result = asyncio.run(photo_service.migrate_inline_photos(batch_size=args.batch_size))
+    print(f"迁移完成: 药物记录 {result['medications']} 条，照片 {result['photos']} 张，"
+          f"失败 {result['failed']} 条，用时 {time.perf_counter() - started:.2f} 秒")
+
+
+def migrate_medication_json(args):
+    """将药物的排期与说明书列由Text迁移为JSONB（部署新代码之前执行）"""
+    from src.serves import medication_service
+
+    started = time.perf_counter()
+    result = asyncio.run(medication_service.migrate_json_columns(batch_size=args.batch_size))
+    columns = ", ".join(result["columns"]) or "无（已是JSONB）"
+    print(f"迁移完成: 列 {columns}，回填 {result['medications']} 条，切换时重新转换 {result['reconverted']} 条，"
+          f"用时 {time.perf_counter() - started:.2f} 秒")
+
+
+def bench_medication_payload(args):
+    """对照片较多的用户比较各视图的响应大小与序列化耗时（不连接数据库）"""
+    import base64
+    import json
+    from datetime import date, datetime
+    from uuid import uuid4
+    from src.api.medication import _resolve_fields, _build_partial_response
+    from src.db.models.medication import Medication
+
+    rng = random.Random(args.seed)
+    user_id = str(uuid4())
+    photo = "data:image/jpeg;base64," + base64.b64encode(rng.randbytes(args.photo_kb * 1024)).decode()
+    manual = {"indications": "说明" * 2000, "dosage": "用法用量" * 500}
+    medications = [
+        Medication(
+            id=i + 1, user_id=user_id, name=f"药物{i}", dosage="500mg", frequency_type="daily", times_per_day=3,
+            daily_times=["08:00", "12:00", "18:00"], weekly_days=None, start_date=date.today(), end_date=None,
+            notes="备注" * 200, photos=json.dumps([photo] * args.photos), barcode=None, drug_code=None,
+            manufacturer="某制药有限公司", specification="10mg*24片", dosage_form="片剂", is_prescription=False,
+            drug_image_url=None, instruction_manual=manual, approval_number=None, generic_name=None,
+            trade_name=None, data_source="manual", external_drug_id=None, is_active=True,
+            created_at=datetime.now(), updated_at=datetime.now()
+        )
+        for i in range(args.medications)
+    ]
+
+    for view in ("detail", "list", "summary"):
+        names, columns = _resolve_fields(view, None)
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            payload = "[" + ",".join(
+                _build_partial_response(med, names).model_dump_json(exclude_unset=True) for med in medications
+            ) + "]"
+        elapsed = (time.perf_counter() - started) * 1000 / args.rounds
+        print(f"{view}: 查询 {len(columns)} 列，响应 {len(payload.encode()) / 1024:.1f} KB，序列化 {elapsed:.2f} ms")
+
+
+def bench_schedule_expansion(args):
+    """比较逐次解析JSON与时间字符串展开排期、与使用编译排期展开的吞吐量（不连接数据库）"""
+    import json
+    from datetime import date, timedelta
+    from src.serves.medication_schedule import MedicationSchedule, compile_schedule
+
+    rng = random.Random(args.seed)
+    start = date.today()
+    end = start + timedelta(days=args.days - 1)
+    medications = []
+    for _ in range(args.medications):
+        if rng.random() < 0.8:
+            times = sorted(f"{hour:02d}:{rng.choice((0, 15, 30, 45)):02d}" for hour in rng.sample(range(6, 23), rng.randint(1, 4)))
+            medications.append(("daily", json.dumps(times), None))
+        else:
+            medications.append(("weekly", None, json.dumps(sorted(rng.sample(range(1, 8), rng.randint(1, 3))))))
+
+    def legacy_occurrences(frequency_type, daily_times, weekly_days):
+        # 优化前的展开方式：每次解析JSON字符串，按集合判断星期几，产出时间字符串
+        current = start
+        if frequency_type == "daily":
+            times = json.loads(daily_times)
+            while current <= end:
+                for time_str in times:
+                    yield current, time_str
+                current += timedelta(days=1)
+        else:
+            days = set(json.loads(weekly_days))
+            while current <= end:
+                if current.isoweekday() in days:
+                    yield current, None
+                current += timedelta(days=1)
+
+    schedules = []
+    for frequency_type, daily_times, weekly_days in medications:
+        mask, minutes = compile_schedule(
+            frequency_type,
+            json.loads(daily_times) if daily_times else None,
+            json.loads(weekly_days) if weekly_days else None
+        )
+        schedules.append(MedicationSchedule(mask, minutes, start, None))
+
+    def run(name, expand):
+        best = None
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            slots = expand()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{name}: {slots} 个时段，{best * 1000:.2f} ms，{slots / best / 1e6:.2f} M时段/秒")
+        return best
+
+    legacy = run("逐次解析", lambda: sum(1 for med in medications for _ in legacy_occurrences(*med)))
+    compiled = run("编译排期", lambda: sum(1 for schedule in schedules for _ in schedule.occurrences(start, end)))
+    print(f"加速比: {legacy / compiled:.2f}x")
+
+
+def bench_list_serialization(args):
+    """
+    统计药物与提醒列表接口每个请求的CPU时间（进程内调用真实路由，服务层以合成数据代替数据库，不连接数据库）
+    同时挂载按优化前方式序列化的对照路由：提醒列表返回字典由jsonable_encoder转换，药物列表逐行构建校验过的响应模型
+    """
+    from datetime import date, datetime
+    from typing import List
+    from uuid import uuid4
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from src.api import medication_router, reminder_router
+    from src.api.medication import _resolve_fields, _build_partial_response
+    from src.api.user import get_current_user
+    from src.core.serialization import FastJSONResponse
+    from src.db.database import get_db
+    from src.db.models.medication import Medication
+    from src.schemas.medication import MedicationPartialResponse
+    from src.schemas.user import UserResponse
+    from src.serves import medication_service, reminder_service
+
+    rng = random.Random(args.seed)
+    user_id = str(uuid4())
+    now = datetime.now()
+    medications = [
+        Medication(
+            id=i + 1, user_id=user_id, name=f"药物{i}", dosage="500mg", frequency_type="daily", times_per_day=2,
+            daily_times=["08:00", "20:00"], weekly_days=None, start_date=date.today(), end_date=None,
+            notes="备注", photos=None, barcode=None, drug_code=None, manufacturer="某制药有限公司",
+            specification="10mg*24片", dosage_form="片剂", is_prescription=False, drug_image_url=None,
+            instruction_manual={"dosage": "一次1片"}, approval_number=None, generic_name=None, trade_name=None,
+            data_source="manual", external_drug_id=None, is_active=True, created_at=now, updated_at=now
+        )
+        for i in range(args.rows)
+    ]
+    reminders = [
+        {
+            "id": i + 1, "user_id": user_id, "medication_id": rng.randint(1, 30), "medication_name": f"药物{i % 30}",
+            "dosage": "500mg", "scheduled_date": date.today(), "scheduled_time": f"{rng.randint(6, 22):02d}:00",
+            "is_completed": rng.random() < 0.5, "completed_at": now, "created_at": now, "updated_at": now
+        }
+        for i in range(args.rows)
+    ]
+
+    async def medications_page(db, current_user_id, columns, limit, cursor, marker=None):
+        return medications, None
+
+    async def reminders_by_date(db, current_user_id, target_date, marker=None):
+        return reminders
+
+    async def marker(db, current_user_id, *args):
+        return len(medications), now
+
+    medication_service.get_user_medications_page = medications_page
+    medication_service.get_medications_marker = marker
+    reminder_service.get_reminders_by_date = reminders_by_date
+    reminder_service.get_reminders_marker = marker
+
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.include_router(medication_router)
+    app.include_router(reminder_router)
+    app.dependency_overrides[get_current_user] = lambda: UserResponse(
+        id=user_id, username="bench", created_at=now, updated_at=now
+    )
+    app.dependency_overrides[get_db] = lambda: None
+
+    @app.get("/baseline/reminders")
+    async def baseline_reminders():
+        return reminders
+
+    @app.get("/baseline/medications", response_model=List[MedicationPartialResponse], response_model_exclude_unset=True)
+    async def baseline_medications():
+        names, _ = _resolve_fields("detail", None)
+        return [_build_partial_response(med, names) for med in medications]
+
+    client = TestClient(app)
+    for name, path in (
+        ("提醒列表", "/reminders"),
+        ("提醒列表（优化前）", "/baseline/reminders"),
+        ("药物列表", "/medications"),
+        ("药物列表（优化前）", "/baseline/medications")
+    ):
+        for _ in range(min(20, args.requests)):
+            client.get(path)
+        started = time.process_time()
+        for _ in range(args.requests):
+            response = client.get(path)
+        elapsed = (time.process_time() - started) * 1000 / args.requests
+        print(f"{name}: {args.rows} 行，响应 {len(response.content) / 1024:.1f} KB，CPU {elapsed:.2f} ms/请求")
+
+
+def compile_schedules(args):
+    """为已有药物记录添加并回填编译后的排期列"""
+    from src.serves import medication_service
+
+    started = time.perf_counter()
+    result = asyncio.run(medication_service.compile_schedules(batch_size=args.batch_size))
+    print(f"回填完成: 药物记录 {result['medications']} 条，用时 {time.perf_counter() - started:.2f} 秒")
+
+
+def check_export_memory(args):
+    """
+    导出用药记录，校验峰值内存不随行数增长
+    默认在外层事务中写入合成记录（结束后回滚），经export_service的服务端游标查询（AsyncSession.stream + yield_per）读取并编码；
+    --synthetic 时只向编码器输入内存中生成的批次，不连接数据库
+    """
+    import tracemalloc
+    from datetime import date, datetime, timedelta
+    from src.serves.export_service import encode_export_stream, EXPORT_BATCH_SIZE
+
+    async def synthetic_partitions():
+        now = datetime.now()
+        start = date.today()
+        for offset in range(0, args.rows, EXPORT_BATCH_SIZE):
+            yield [
+                {
+                    "id": i, "user_id": "00000000-0000-0000-0000-000000000000", "medication_id": i % 20,
+                    "medication_name": f"药物{i % 20}", "dosage": "500mg",
+                    "scheduled_date": start + timedelta(days=i // 60), "scheduled_time": "08:00",
+                    "is_completed": i % 3 == 0, "completed_at": now if i % 3 == 0 else None,
+                    "created_at": now, "updated_at": now
+                }
+                for i in range(offset, min(offset + EXPORT_BATCH_SIZE, args.rows))
+            ]
+
+    async def measure_export(partitions):
+        # 只统计读取与编码期间的内存（写入合成记录不计入）
+        tracemalloc.start()
+        started = time.perf_counter()
+        total = 0
+        async for chunk in encode_export_stream(partitions, args.format):
+            total += len(chunk)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return total, peak, time.perf_counter() - started
+
+    async def run_database():
+        from uuid import uuid4
+        from sqlalchemy import text
+        from sqlalchemy.ext.asyncio import AsyncSession
+        from src.db.database import async_engine
+        from src.serves.export_service import _iter_stored_partitions
+
+        async with async_engine.connect() as conn:
+            transaction = await conn.begin()
+            db = AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False)
+            user_id = str(uuid4())
+            try:
+                await _seed_bench_medications(db, user_id, 20, random.Random(42))
+                # 在数据库端生成记录，不占用本进程内存（每个药物每天4个时段）
+                per_medication = -(-args.rows // 20)
+                await db.execute(text(
+                    "INSERT INTO reminder (user_id, medication_id, scheduled_date, scheduled_time, "
+                    "is_completed, completed_at, created_at, updated_at) "
+                    "SELECT :user_id, m.id, DATE '2000-01-01' + g / 4, lpad((6 + g % 4 * 4)::text, 2, '0') || ':00', "
+                    "g % 3 = 0, CASE WHEN g % 3 = 0 THEN now() END, now(), now() "
+                    "FROM medication m CROSS JOIN generate_series(0, :per_medication - 1) g "
+                    "WHERE m.user_id = :user_id"
+                ), {"user_id": user_id, "per_medication": per_medication})
+                db.expunge_all()
+                print(f"已写入 {per_medication * 20} 条记录")
+                return await measure_export(_iter_stored_partitions(db, user_id, None, None))
+            finally:
+                await db.close()
+                await transaction.rollback()
+
+    if args.synthetic:
+        total, peak, elapsed = asyncio.run(measure_export(synthetic_partitions()))
+    else:
+        total, peak, elapsed = asyncio.run(run_database())
+
+    print(f"导出 {total / 1024 / 1024:.1f} MB，峰值内存 {peak / 1024 / 1024:.2f} MB，用时 {elapsed:.2f} 秒")
+    if peak > args.max_peak_mb * 1024 * 1024:
+        raise SystemExit(f"峰值内存超过 {args.max_peak_mb} MB")
+
+
+def rebuild_rollups(args):
+    """从提醒表回填/重建每日汇总表"""
+    from src.db import init_db
+    from src.serves import rollup_service
+
+    init_db()
+    started = time.perf_counter()
+    result = asyncio.run(rollup_service.rebuild_rollups(user_id=args.user_id, batch_size=args.batch_size))
+    print(f"重建完成: 用户 {result['users']} 个，汇总 {result['rows']} 行，用时 {time.perf_counter() - started:.2f} 秒")
+
+
+def check_rollups(args):
+    """校验每日汇总表与提醒表是否一致，--fix 时重建不一致的用户"""
+    from src.serves import rollup_service
+
+    mismatches = asyncio.run(rollup_service.check_rollups(user_id=args.user_id, limit=args.limit))
+    for row in mismatches:
+        print(f"用户 {row['user_id']} 药物 {row['medication_id']} {row['scheduled_date']}: "
+              f"应为 {row['expected_scheduled']}/{row['expected_completed']}/{row['expected_on_time']}，"
+              f"实际 {row['actual_scheduled']}/{row['actual_completed']}/{row['actual_on_time']}")
+    if not mismatches:
+        print("汇总表与提醒表一致")
+        return
+
+    print(f"发现 {len(mismatches)} 条不一致（最多显示 {args.limit} 条）")
+    if not args.fix:
+        raise SystemExit(1)
+
+    async def fix():
+        for user_id in sorted({row["user_id"] for row in mismatches}):
+            await rollup_service.rebuild_rollups(user_id=user_id)
+
+    asyncio.run(fix())
+    print("已重建不一致用户的汇总")
+
+
+def check_write_queries(args):
+    """统计各写入接口的SQL语句数，超过预算时失败（在外层事务中执行，结束后回滚，不留下数据）"""
+    from datetime import date
+    from uuid import uuid4
+    from sqlalchemy import event, select, func
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from src.db.database import async_engine
+    from src.db.models.reminder import Reminder
+    from src.db.models.user import UserProfile
+    from src.schemas.medication import MedicationCreate, MedicationUpdate
+    from src.serves import medication_service, reminder_service
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        # 外层事务的保存点语句不计入
+        if not statement.lstrip().upper().startswith(("SAVEPOINT", "RELEASE", "ROLLBACK")):
+            statements.append(statement)
+
+    failures = []
+
+    async def measure(name, write, budget=1):
+        statements.clear()
+        result = await write
+        print(f"{name}: {len(statements)} 条语句（预算 {budget}）")
+        if len(statements) > budget:
+            failures.append(name)
+        return result
+
+    async def run():
+        async with async_engine.connect() as conn:
+            transaction = await conn.begin()
+            # 服务层的commit只释放保存点，最后回滚外层事务
+            db = AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False)
+            user_id = str(uuid4())
+            db.add(UserProfile(id=user_id, username=f"check_{user_id[:8]}"))
+            await db.flush()
+
+            event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+            try:
+                medication = await measure("create_medication", medication_service.create_medication(
+                    db, user_id, MedicationCreate(
+                        name="检查用药物", dosage="1片", frequency_type="daily", times_per_day=2,
+                        daily_times=["08:00", "20:00"], start_date=date.today()
+                    )
+                ))
+                await measure("update_medication", medication_service.update_medication(
+                    db, medication.id, user_id, MedicationUpdate(dosage="2片")
+                ))
+
+                await reminder_service.generate_reminders_for_range(db, user_id, date.today(), date.today())
+                ids = [reminder["id"] for reminder in
+                       await reminder_service.get_reminders_by_date(db, user_id, date.today())]
+                await measure("complete_reminder", reminder_service.complete_reminder(db, ids[0], user_id))
+                await measure("uncomplete_reminder", reminder_service.uncomplete_reminder(db, ids[0], user_id))
+                await measure("batch_complete", reminder_service.set_reminders_completed(db, ids, user_id, True))
+
+                # 药物仍有已物化的提醒，删除须在同一条语句中一并清理
+                deleted = await measure(
+                    "delete_medication", medication_service.delete_medication(db, medication.id, user_id)
+                )
+                remaining = await db.scalar(
+                    select(func.count()).select_from(Reminder).where(Reminder.medication_id == medication.id)
+                )
+                print(f"delete_medication: 删除{'成功' if deleted else '失败'}，剩余提醒 {remaining} 条")
+                if not deleted or remaining:
+                    failures.append("delete_medication_with_reminders")
+            finally:
+                event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+                await db.close()
+                await transaction.rollback()
+
+    asyncio.run(run())
+    if failures:
+        raise SystemExit(f"以下写入检查未通过: {', '.join(failures)}")
+
+
+def check_etags(args):
+    """校验写入后药物与提醒列表的ETag随之变化、未变化时保持不变（在外层事务中执行，结束后回滚）"""
+    from datetime import date
+    from uuid import uuid4
+    from sqlalchemy import update
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from src.core.etag import make_etag, etag_matches
+    from src.db.database import async_engine
+    from src.db.models.medication import Medication
+    from src.db.models.user import UserProfile
+    from src.schemas.medication import MedicationCreate, MedicationUpdate
+    from src.serves import medication_service, reminder_service
+
+    failures = []
+
+    def expect(name, condition):
+        print(f"{name}: {'通过' if condition else '失败'}")
+        if not condition:
+            failures.append(name)
+
+    async def run():
+        async with async_engine.connect() as conn:
+            transaction = await conn.begin()
+            db = AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False)
+            user_id = str(uuid4())
+            today = date.today()
+
+            async def etags():
+                medications = make_etag(await medication_service.get_medications_marker(db, user_id))
+                reminders = make_etag(await reminder_service.get_reminders_marker(db, user_id, today))
+                return medications, reminders
+
+            try:
+                db.add(UserProfile(id=user_id, username=f"check_{user_id[:8]}"))
+                await db.flush()
+                medication = await medication_service.create_medication(db, user_id, MedicationCreate(
+                    name="检查用药物", dosage="1片", frequency_type="daily", times_per_day=2,
+                    daily_times=["08:00", "20:00"], start_date=today
+                ))
+                await reminder_service.generate_reminders_for_range(db, user_id, today, today)
+                reminder_ids = [reminder["id"] for reminder in
+                                await reminder_service.get_reminders_by_date(db, user_id, today)]
+
+                medications_etag, reminders_etag = await etags()
+                expect("无写入时ETag不变", await etags() == (medications_etag, reminders_etag))
+                expect("If-None-Match匹配", etag_matches(f'W/{reminders_etag}, "other"', reminders_etag))
+
+                await reminder_service.complete_reminder(db, reminder_ids[0], user_id)
+                current = await etags()
+                expect("complete_reminder后提醒ETag变化", current[1] != reminders_etag)
+                expect("complete_reminder后药物ETag不变", current[0] == medications_etag)
+                reminders_etag = current[1]
+
+                await medication_service.update_medication(db, medication.id, user_id, MedicationUpdate(dosage="2片"))
+                current = await etags()
+                expect("update_medication后药物ETag变化", current[0] != medications_etag)
+                expect("update_medication后提醒ETag变化（响应包含剂量）", current[1] != reminders_etag)
+                medications_etag, reminders_etag = current
+
+                # 模拟其他工作进程或命令行的写入：不经过本进程的读缓存失效
+                await db.execute(
+                    update(Medication).where(Medication.id == medication.id).values(name="检查用药物（改）")
+                )
+                await db.flush()
+                current = await etags()
+                expect("其他进程写入后药物ETag变化", current[0] != medications_etag)
+                expect("其他进程写入后提醒ETag变化", current[1] != reminders_etag)
+                marker = await reminder_service.get_reminders_marker(db, user_id, today)
+                renamed = await reminder_service.get_reminders_by_date(db, user_id, today, marker)
+                expect("其他进程写入后提醒列表不读取旧缓存", renamed[0]["medication_name"] == "检查用药物（改）")
+            finally:
+                await db.close()
+                await transaction.rollback()
+
+    asyncio.run(run())
+    if failures:
+        raise SystemExit(f"以下ETag检查未通过: {', '.join(failures)}")
+
+
+async def _seed_bench_medications(db, user_id: str, count: int, rng: random.Random) -> list:
+    """
+    在会话中为基准测试创建用户与药物（约3/4为每日多次，其余为每周）
+    :return: 创建的药物列表
+    """
+    from datetime import date, timedelta
+    from src.db.models.user import UserProfile
+    from src.schemas.medication import MedicationCreate
+    from src.serves import medication_service
+
+    db.add(UserProfile(id=user_id, username=f"bench_{user_id[:8]}"))
+    await db.flush()
+    start = date.today() - timedelta(days=rng.randint(0, 30))
+    medications = []
+    for i in range(count):
+        if i % 4 == 3:
+            data = MedicationCreate(
+                name=f"基准药物{i}", dosage="1片", frequency_type="weekly", times_per_day=1,
+                weekly_days=sorted(rng.sample(range(1, 8), rng.randint(1, 3))), start_date=start
+            )
+        else:
+            times = sorted(f"{hour:02d}:00" for hour in rng.sample(range(6, 23), rng.randint(2, 4)))
+            data = MedicationCreate(
+                name=f"基准药物{i}", dosage="1片", frequency_type="daily", times_per_day=len(times),
+                daily_times=times, start_date=start
+            )
+        medications.append(await medication_service.create_medication(db, user_id, data))
+    return medications
+
+
+def bench_reminder_generation(args):
+    """
+    比较逐时段查询是否存在再逐条插入（优化前）与批量生成提醒的耗时和SQL语句数
+    分别测量首次生成（全部时段缺失）与重复生成（全部时段已存在），在外层事务中执行，结束后回滚
+    """
+    from datetime import date, timedelta
+    from uuid import uuid4
+    from sqlalchemy import event, select, delete
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from src.db.database import async_engine
+    from src.db.models.reminder import Reminder
+    from src.db.models.reminder_rollup import ReminderDailyRollup
+    from src.serves import reminder_service
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(("SAVEPOINT", "RELEASE", "ROLLBACK")):
+            statements.append(statement)
+
+    async def legacy_generate(db, user_id, start, end):
+        # 优化前的生成方式：每个时段单独查询是否存在，缺失时逐条添加（查询前自动flush）
+        generated = 0
+        for med in await reminder_service._get_active_medications(db, user_id):
+            target_date = start
+            while target_date <= end:
+                in_range = med.start_date <= target_date and (med.end_date is None or target_date <= med.end_date)
+                if med.frequency_type == "daily":
+                    slots = (med.daily_times or []) if in_range else []
+                else:
+                    slots = [None] if in_range and target_date.isoweekday() in (med.weekly_days or []) else []
+                for time_str in slots:
+                    conditions = [
+                        Reminder.user_id == user_id,
+                        Reminder.medication_id == med.id,
+                        Reminder.scheduled_date == target_date
+                    ]
+                    if time_str is not None:
+                        conditions.append(Reminder.scheduled_time == time_str)
+                    if await db.scalar(select(Reminder.id).where(*conditions).limit(1)) is None:
+                        db.add(Reminder(
+                            user_id=user_id, medication_id=med.id, scheduled_date=target_date,
+                            scheduled_time=time_str, is_completed=False
+                        ))
+                        generated += 1
+                target_date += timedelta(days=1)
+        await db.flush()
+        return generated
+
+    async def run():
+        async with async_engine.connect() as conn:
+            transaction = await conn.begin()
+            db = AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False)
+            user_id = str(uuid4())
+            start = date.today()
+            end = start + timedelta(days=args.days - 1)
+
+            async def measure(name, generate):
+                statements.clear()
+                started = time.perf_counter()
+                count = await generate(db, user_id, start, end)
+                elapsed = (time.perf_counter() - started) * 1000
+                print(f"{name}: 生成 {count} 条，{len(statements)} 条SQL语句，用时 {elapsed:.1f} ms")
+                return count, elapsed
+
+            async def reset():
+                await db.execute(delete(Reminder).where(Reminder.user_id == user_id))
+                await db.execute(delete(ReminderDailyRollup).where(ReminderDailyRollup.user_id == user_id))
+                db.expunge_all()
+
+            try:
+                await _seed_bench_medications(db, user_id, args.medications, random.Random(args.seed))
+                event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+                legacy_count, legacy_first = await measure("逐时段（首次）", legacy_generate)
+                _, legacy_repeat = await measure("逐时段（重复）", legacy_generate)
+                await reset()
+                bulk_count, bulk_first = await measure("批量（首次）", reminder_service.generate_reminders_for_range)
+                _, bulk_repeat = await measure("批量（重复）", reminder_service.generate_reminders_for_range)
+            finally:
+                event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+                await db.close()
+                await transaction.rollback()
+
+        print(f"加速比: 首次 {legacy_first / bulk_first:.1f}x，重复 {legacy_repeat / bulk_repeat:.1f}x")
+        if legacy_count != bulk_count:
+            raise SystemExit(f"生成数量不一致: 逐时段 {legacy_count}，批量 {bulk_count}")
+
+    asyncio.run(run())
+
+
+def bench_reminder_range(args):
+    """
+    比较预生成模式与按需计算（虚拟）模式下日期范围查询的耗时（在外层事务中执行，结束后回滚）
+    预生成模式读取物化的全部时段；虚拟模式只保留已完成的记录，其余由药物排期展开
+    """
+    from datetime import date, datetime, timedelta
+    from uuid import uuid4
+    from sqlalchemy import select, update, delete, func
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from src.core.config import config
+    from src.db.database import async_engine
+    from src.db.models.reminder import Reminder
+    from src.serves import reminder_service
+
+    rng = random.Random(args.seed)
+    mode = config.REMINDER_READ_MODE
+
+    async def query(db, user_id, start, end, limit):
+        # 分页时按游标取完所有页
+        rows, cursor = await reminder_service.get_date_range_reminders(db, user_id, start, end, limit)
+        pages = 1
+        while cursor:
+            page, cursor = await reminder_service.get_date_range_reminders(db, user_id, start, end, limit, cursor)
+            rows += page
+            pages += 1
+        return rows, pages
+
+    async def measure(db, name, user_id, start, end, limit=None):
+        latencies = []
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            rows, pages = await query(db, user_id, start, end, limit)
+            latencies.append((time.perf_counter() - started) * 1000)
+            db.expunge_all()
+        latencies.sort()
+        print(f"{name}: {len(rows)} 条，{pages} 页，p50={latencies[len(latencies) // 2]:.1f}ms "
+              f"p99={latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:.1f}ms")
+        return len(rows)
+
+    async def run():
+        async with async_engine.connect() as conn:
+            transaction = await conn.begin()
+            db = AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False)
+            user_id = str(uuid4())
+            start = date.today() - timedelta(days=args.days // 2)
+            end = start + timedelta(days=args.days - 1)
+
+            async def stored_count():
+                return await db.scalar(select(func.count()).select_from(Reminder).where(Reminder.user_id == user_id))
+
+            try:
+                await _seed_bench_medications(db, user_id, args.medications, rng)
+                await reminder_service.generate_reminders_for_range(db, user_id, start, end)
+                # 将今天之前约70%的时段标记为已完成
+                past_ids = (await db.scalars(select(Reminder.id).where(
+                    Reminder.user_id == user_id, Reminder.scheduled_date < date.today()
+                ))).all()
+                completed_ids = [i for i in past_ids if rng.random() < 0.7]
+                await db.execute(update(Reminder).where(Reminder.id.in_(completed_ids)).values(
+                    is_completed=True, completed_at=datetime.now()
+                ))
+
+                config.REMINDER_READ_MODE = "materialized"
+                print(f"预生成模式: 提醒表 {await stored_count()} 行")
+                materialized = await measure(db, "预生成 全部", user_id, start, end)
+                await measure(db, f"预生成 每页{args.page_size}", user_id, start, end, args.page_size)
+
+                # 虚拟模式只保存完成过的剂量
+                await db.execute(delete(Reminder).where(Reminder.user_id == user_id, Reminder.is_completed == False))
+                config.REMINDER_READ_MODE = "virtual"
+                print(f"虚拟模式: 提醒表 {await stored_count()} 行")
+                virtual = await measure(db, "虚拟 全部", user_id, start, end)
+                await measure(db, f"虚拟 每页{args.page_size}", user_id, start, end, args.page_size)
+            finally:
+                config.REMINDER_READ_MODE = mode
+                await db.close()
+                await transaction.rollback()
+
+        if materialized != virtual:
+            raise SystemExit(f"两种模式返回的条数不一致: 预生成 {materialized}，虚拟 {virtual}")
+
+    asyncio.run(run())
+
+
+def bench_async_load(args):
+    """
+    在进程内以N个并发用户压测读取药物列表，比较在async路由中调用同步会话（优化前，阻塞事件循环）
+    与异步会话的p50/p99延迟（只读查询，不写入数据）
+    --latency-ms 在每次请求中附加pg_sleep，模拟到Supabase的网络往返
+    """
+    from uuid import uuid4
+    import httpx
+    from fastapi import FastAPI
+    from sqlalchemy import select, func
+    from src.db.database import sessions, async_sessions, async_engine, engine
+    from src.db.models.medication import Medication
+
+    user_id = str(uuid4())
+    latency = args.latency_ms / 1000
+
+    def list_query():
+        return select(Medication).where(Medication.user_id == user_id).order_by(Medication.id)
+
+    app = FastAPI()
+
+    @app.get("/sync")
+    async def sync_route():
+        # 优化前的写法：async路由中直接使用同步会话，每次查询都阻塞事件循环
+        with sessions() as db:
+            if latency:
+                db.execute(select(func.pg_sleep(latency)))
+            return len(db.execute(list_query()).scalars().all())
+
+    @app.get("/async")
+    async def async_route():
+        async with async_sessions() as db:
+            if latency:
+                await db.execute(select(func.pg_sleep(latency)))
+            return len((await db.execute(list_query())).scalars().all())
+
+    async def load(path):
+        latencies = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def user():
+                for _ in range(args.requests):
+                    started = time.perf_counter()
+                    response = await client.get(path)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    response.raise_for_status()
+
+            # 预热连接池
+            await asyncio.gather(*(client.get(path) for _ in range(10)))
+            started = time.perf_counter()
+            await asyncio.gather(*(user() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+        latencies.sort()
+        print(f"{path}: {len(latencies)} 个请求，p50={latencies[len(latencies) // 2]:.1f}ms "
+              f"p99={latencies[int(len(latencies) * 0.99)]:.1f}ms，吞吐量 {len(latencies) / elapsed:.0f} 请求/秒")
+
+    async def run():
+        try:
+            await load("/sync")
+            await load("/async")
+        finally:
+            await async_engine.dispose()
+            engine.dispose()
+
+    print(f"并发用户 {args.concurrency}，每个用户 {args.requests} 个请求，模拟往返 {args.latency_ms} ms")
+    asyncio.run(run())
+
+
+def bench_jwt_verify(args):
+    """统计单核每秒可完成的JWT验证次数：python-jose、PyJWT（已安装时）与已验证token缓存命中（不连接数据库）"""
+    from jose import jwt
+    from src.core.config import config
+    from src.serves import supabase_service
+
+    secret = config.SUPABASE_JWT_SECRET or "bench-secret"
+    config.SUPABASE_JWT_SECRET = secret
+    token = jwt.encode({
+        "sub": "00000000-0000-0000-0000-000000000000", "aud": "authenticated", "role": "authenticated",
+        "email": "bench@example.com", "exp": int(time.time()) + 3600
+    }, secret, algorithm="HS256")
+
+    def decode_with_jose():
+        jwt.decode(token, secret, algorithms=["HS256"], audience="authenticated")
+
+    candidates = [("python-jose", decode_with_jose)]
+    try:
+        import jwt as pyjwt
+    except ImportError:
+        print("未安装PyJWT，跳过")
+    else:
+        candidates.append(("PyJWT", lambda: pyjwt.decode(token, secret, algorithms=["HS256"], audience="authenticated")))
+    supabase_service.token_cache.clear()
+    supabase_service.verify_supabase_token(token)
+    candidates.append(("缓存命中", lambda: supabase_service.verify_supabase_token(token)))
+
+    for name, verify in candidates:
+        count = 0
+        started = time.process_time()
+        while time.process_time() - started < args.seconds:
+            for _ in range(100):
+                verify()
+            count += 100
+        elapsed = time.process_time() - started
+        print(f"{name}: {count / elapsed:,.0f} 次/秒/核，{elapsed / count * 1e6:.1f} µs/次")
+
+
+class _JisuStubServer:
+    """在后台线程中运行的极速API本地桩服务（记录收到的请求数，可设置响应延迟）"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.requests = {}
+        self.base_url = None
+        self._server = None
+        self._thread = None
+
+    def _build_app(self):
+        from fastapi import FastAPI
+
+        app = FastAPI()
+
+        async def record(path, key):
+            self.requests[(path, key)] = self.requests.get((path, key), 0) + 1
+            if self.delay:
+                await asyncio.sleep(self.delay)
+
+        @app.get("/medicine/query")
+        async def query(name: str = "", barcode: str = "", manufacturer: str = ""):
+            await record("query", name or barcode or manufacturer)
+            return {"status": 0, "msg": "ok", "result": {"list": [
+                {"medicine_id": i, "name": f"{name}{i}", "manufacturer": "桩服务制药", "prescription": 2, "image": ""}
+                for i in range(10)
+            ]}}
+
+        @app.get("/medicine/detail")
+        async def detail(medicine_id: str):
+            await record("detail", medicine_id)
+            if medicine_id == "error":
+                return {"status": 201, "msg": "桩服务错误"}
+            return {"status": 0, "msg": "ok", "result": {
+                "medicine_id": medicine_id, "name": f"药品{medicine_id}", "manufacturer": "桩服务制药",
+                "prescription": 2, "image": "", "spec": "10mg*24片", "type": "片剂", "desc": "【适应症】桩服务"
+            }}
+
+        return app
+
+    def __enter__(self):
+        import socket
+        import threading
+        import uvicorn
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        self._server = uvicorn.Server(uvicorn.Config(self._build_app(), host="127.0.0.1", port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.should_exit = True
+        self._thread.join()
+
+    def count(self, path: str, key: str) -> int:
+        """获取指定接口与关键词收到的请求数"""
+        return self.requests.get((path, key), 0)
+
+
+def bench_jisu_client(args):
+    """对本地桩服务比较每次调用新建HTTP客户端（优化前）与共享连接池客户端的单次调用延迟（不连接数据库）"""
+    import httpx
+    from src.core.config import config
+    from src.serves import third_party_service
+
+    def percentiles(latencies):
+        latencies.sort()
+        return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+    async def fresh_client_call(url, params):
+        # 优化前的调用方式：每次调用新建客户端，重新建立TCP连接
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            response = await client.get(url, params=params)
+            response.raise_for_status()
+            return response.json()
+
+    async def shared_client_call(url, params):
+        response = await third_party_service._get_http_client().get(url, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def run(base_url):
+        url = f"{base_url}/medicine/query"
+        await third_party_service.start_http_client()
+        try:
+            for name, call in (("每次新建客户端", fresh_client_call), ("共享客户端", shared_client_call)):
+                await call(url, {"name": "预热"})
+                latencies = []
+                for i in range(args.calls):
+                    started = time.perf_counter()
+                    await call(url, {"appkey": config.JISU_API_KEY, "name": f"阿莫西林{i}"})
+                    latencies.append((time.perf_counter() - started) * 1000)
+                p50, p99 = percentiles(latencies)
+                print(f"{name}: {args.calls} 次调用，p50={p50:.2f}ms p99={p99:.2f}ms")
+        finally:
+            await third_party_service.close_http_client()
+
+    with _JisuStubServer() as stub:
+        print(f"桩服务: {stub.base_url}（纯HTTP，不含TLS握手，实际节省更多）")
+        asyncio.run(run(stub.base_url))
+
+
+def check_singleflight(args):
+    """
+    对本地桩服务并发发起相同的药品详情查询，校验只产生一次上游请求（不连接数据库）
+    经过与详情接口相同的缓存与单飞调用路径，不读写本地药品目录
+    """
+    from src.core.cache import TTLCache
+    from src.core.config import config
+    from src.serves import third_party_service
+
+    failures = []
+
+    def expect(name, condition):
+        print(f"{name}: {'通过' if condition else '失败'}")
+        if not condition:
+            failures.append(name)
+
+    async def lookup(cache, medicine_id):
+        return await third_party_service._cached_call(
+            cache, medicine_id, lambda: third_party_service._fetch_drug_detail(medicine_id)
+        )
+
+    async def run(stub):
+        cache = TTLCache(maxsize=100, ttl=60)
+        await third_party_service.start_http_client()
+        try:
+            results = await asyncio.gather(*(lookup(cache, "1001") for _ in range(args.callers)))
+            expect(f"{args.callers}个并发调用只请求上游1次", stub.count("detail", "1001") == 1)
+            expect("所有调用方得到相同结果", all(result == results[0] for result in results) and results[0])
+
+            await asyncio.gather(*(lookup(cache, "1001") for _ in range(args.callers)))
+            expect("完成后的调用命中缓存", stub.count("detail", "1001") == 1)
+
+            outcomes = await asyncio.gather(
+                *(lookup(cache, "error") for _ in range(args.callers)), return_exceptions=True
+            )
+            expect("上游失败只请求1次", stub.count("detail", "error") == 1)
+            expect("失败传递给所有调用方", all(isinstance(outcome, Exception) for outcome in outcomes))
+
+            # 首个调用方被取消不影响其余调用方
+            first = asyncio.ensure_future(lookup(cache, "1002"))
+            await asyncio.sleep(0)
+            others = [asyncio.ensure_future(lookup(cache, "1002")) for _ in range(args.callers - 1)]
+            await asyncio.sleep(stub.delay / 2)
+            first.cancel()
+            results = await asyncio.gather(*others)
+            expect("首个调用方取消后其余调用方仍得到结果", all(results))
+            expect("取消后仍只请求上游1次", stub.count("detail", "1002") == 1)
+        finally:
+            await third_party_service.close_http_client()
+
+    api_key, base_url = config.JISU_API_KEY, config.JISU_API_BASE_URL
+    with _JisuStubServer(delay=args.delay_ms / 1000) as stub:
+        config.JISU_API_KEY, config.JISU_API_BASE_URL = api_key or "stub", stub.base_url
+        try:
+            asyncio.run(run(stub))
+        finally:
+            config.JISU_API_KEY, config.JISU_API_BASE_URL = api_key, base_url
+    if failures:
+        raise SystemExit(f"以下单飞检查未通过: {', '.join(failures)}")
+
+
+def migrate_indexes(args):
+    """为已有数据库补建模型中新增的索引与提醒时段唯一约束（须在部署批量生成提醒的新代码之前执行）"""
+    from src.db.database import migrate_indexes as run_migration
+
+    started = time.perf_counter()
+    result = asyncio.run(run_migration())
+    print(f"迁移完成: 新建索引 {', '.join(result['created']) or '无'}，"
+          f"删除旧索引 {', '.join(result['dropped']) or '无'}，用时 {time.perf_counter() - started:.2f} 秒")
+    if result["duplicates"]:
+        print(f"已删除 {result['duplicates']} 条重复的提醒时段，请执行 rebuild-rollups 重建每日汇总")
+
+
+def main():
+    """命令行入口函数"""
+    parser = argparse.ArgumentParser(description="MediTrack 管理工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import-drug-catalog", help="批量导入药品目录")
+    import_parser.add_argument("path", help="药品目录文件路径（CSV或JSONL）")
+    import_parser.add_argument("--format", choices=["csv", "jsonl"], help="文件格式，默认按扩展名判断")
+    import_parser.add_argument("--batch-size", type=int, default=None, help="每批写入的记录数")
+    import_parser.set_defaults(func=import_drug_catalog)
+
+    bench_parser = subparsers.add_parser("bench-drug-search", help="本地药品搜索索引基准测试")
+    bench_parser.add_argument("--size", type=int, default=200000, help="合成药品数量")
+    bench_parser.add_argument("--queries", type=int, default=1000, help="每类查询次数")
+    bench_parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    bench_parser.set_defaults(func=bench_drug_search)
+
+    photos_parser = subparsers.add_parser("migrate-photos", help="迁移内联的Base64药品照片到照片存储")
+    photos_parser.add_argument("--batch-size", type=int, default=50, help="每批处理的药物记录数")
+    photos_parser.set_defaults(func=migrate_photos)
+
+    json_parser = subparsers.add_parser("migrate-medication-json", help="迁移药物排期与说明书列为JSONB")
+    json_parser.add_argument("--batch-size", type=int, default=500, help="每批回填的药物记录数")
+    json_parser.set_defaults(func=migrate_medication_json)
+
+    payload_parser = subparsers.add_parser("bench-medication-payload", help="药物列表各视图的响应大小基准测试")
+    payload_parser.add_argument("--medications", type=int, default=30, help="药物数量")
+    payload_parser.add_argument("--photos", type=int, default=3, help="每个药物的内联Base64照片数")
+    payload_parser.add_argument("--photo-kb", type=int, default=300, help="每张照片大小（KB）")
+    payload_parser.add_argument("--rounds", type=int, default=20, help="重复次数")
+    payload_parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    payload_parser.set_defaults(func=bench_medication_payload)
+
+    schedule_parser = subparsers.add_parser("bench-schedule-expansion", help="排期展开吞吐量基准测试")
+    schedule_parser.add_argument("--medications", type=int, default=1000, help="药物数量")
+    schedule_parser.add_argument("--days", type=int, default=90, help="展开天数")
+    schedule_parser.add_argument("--rounds", type=int, default=5, help="重复次数（取最快一次）")
+    schedule_parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    schedule_parser.set_defaults(func=bench_schedule_expansion)
+
+    serialization_parser = subparsers.add_parser("bench-list-serialization", help="列表接口序列化CPU时间基准测试")
+    serialization_parser.add_argument("--rows", type=int, default=500, help="每个列表的行数")
+    serialization_parser.add_argument("--requests", type=int, default=200, help="每个接口的请求次数")
+    serialization_parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    serialization_parser.set_defaults(func=bench_list_serialization)
+
+    compile_parser = subparsers.add_parser("compile-schedules", help="回填药物的编译排期")
+    compile_parser.add_argument("--batch-size", type=int, default=500, help="每批处理的药物记录数")
+    compile_parser.set_defaults(func=compile_schedules)
+
+    export_parser = subparsers.add_parser("check-export-memory", help="校验流式导出的内存占用")
+    export_parser.add_argument("--rows", type=int, default=1000000, help="合成记录行数")
+    export_parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson", help="导出格式")
+    export_parser.add_argument("--max-peak-mb", type=float, default=32, help="允许的峰值内存（MB）")
+    export_parser.add_argument("--synthetic", action="store_true", help="只检查编码器，不连接数据库")
+    export_parser.set_defaults(func=check_export_memory)
+
+    rebuild_parser = subparsers.add_parser("rebuild-rollups", help="回填/重建提醒每日汇总表")
+    rebuild_parser.add_argument("--user-id", default=None, help="只重建指定用户")
+    rebuild_parser.add_argument("--batch-size", type=int, default=100, help="每批处理的用户数")
+    rebuild_parser.set_defaults(func=rebuild_rollups)
+
+    check_parser = subparsers.add_parser("check-rollups", help="校验提醒每日汇总表的一致性")
+    check_parser.add_argument("--user-id", default=None, help="只校验指定用户")
+    check_parser.add_argument("--limit", type=int, default=100, help="最多显示的不一致条数")
+    check_parser.add_argument("--fix", action="store_true", help="重建不一致用户的汇总")
+    check_parser.set_defaults(func=check_rollups)
+
+    queries_parser = subparsers.add_parser("check-write-queries", help="检查各写入接口的SQL语句数（含删除仍有提醒的药物）")
+    queries_parser.set_defaults(func=check_write_queries)
+
+    etags_parser = subparsers.add_parser("check-etags", help="检查药物与提醒列表的ETag在写入后失效")
+    etags_parser.set_defaults(func=check_etags)
+
+    generation_parser = subparsers.add_parser("bench-reminder-generation", help="提醒生成耗时与SQL语句数基准测试")
+    generation_parser.add_argument("--medications", type=int, default=8, help="药物数量")
+    generation_parser.add_argument("--days", type=int, default=30, help="生成天数")
+    generation_parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    generation_parser.set_defaults(func=bench_reminder_generation)
+
+    range_parser = subparsers.add_parser("bench-reminder-range", help="预生成与虚拟模式的日期范围查询基准测试")
+    range_parser.add_argument("--medications", type=int, default=10, help="药物数量")
+    range_parser.add_argument("--days", type=int, default=90, help="查询天数")
+    range_parser.add_argument("--page-size", type=int, default=200, help="分页查询的每页数量")
+    range_parser.add_argument("--rounds", type=int, default=20, help="重复次数")
+    range_parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    range_parser.set_defaults(func=bench_reminder_range)
+
+    load_parser = subparsers.add_parser("bench-async-load", help="同步与异步数据库会话的并发延迟基准测试")
+    load_parser.add_argument("--concurrency", type=int, default=200, help="并发用户数")
+    load_parser.add_argument("--requests", type=int, default=20, help="每个用户的请求次数")
+    load_parser.add_argument("--latency-ms", type=float, default=0, help="每次请求附加的模拟往返时间（毫秒）")
+    load_parser.set_defaults(func=bench_async_load)
+
+    jwt_parser = subparsers.add_parser("bench-jwt-verify", help="JWT验证吞吐量基准测试")
+    jwt_parser.add_argument("--seconds", type=float, default=2.0, help="每种实现的测量时间（秒）")
+    jwt_parser.set_defaults(func=bench_jwt_verify)
+
+    client_parser = subparsers.add_parser("bench-jisu-client", help="极速API共享HTTP客户端延迟基准测试（本地桩服务）")
+    client_parser.add_argument("--calls", type=int, default=500, help="每种方式的调用次数")
+    client_parser.set_defaults(func=bench_jisu_client)
+
+    flight_parser = subparsers.add_parser("check-singleflight", help="检查并发的相同药品查询只请求上游一次（本地桩服务）")
+    flight_parser.add_argument("--callers", type=int, default=100, help="并发调用方数量")
+    flight_parser.add_argument("--delay-ms", type=float, default=100, help="桩服务响应延迟（毫秒）")
+    flight_parser.set_defaults(func=check_singleflight)
+
+    indexes_parser = subparsers.add_parser("migrate-indexes", help="为已有数据库补建新增的索引与唯一约束")
+    indexes_parser.set_defaults(func=migrate_indexes)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,5 +6,6 @@ from .user import router as user_router
 from .medication import router as medication_router
 from .reminder import router as reminder_router
 from .third_party import router as third_party_router
+from .internal import router as internal_router
 
-__all__ = ["user_router", "medication_router", "reminder_router", "third_party_router"]
+__all__ = ["user_router", "medication_router", "reminder_router", "third_party_router", "internal_router"]
@@ -0,0 +1,111 @@
+"""
+内部运维API路由层
+暴露后台任务等运行状态，供监控使用
+"""
+from fastapi import APIRouter, Depends, HTTPException, status, Header, UploadFile, File, Form
+from typing import Optional, Literal
+import csv
+import hmac
+import io
+import os
+from ..core.config import config
+from ..core.read_cache import read_cache
+from ..db.database import async_engine
+from ..db.pool_metrics import pool_metrics
+from ..serves import drug_catalog_service
+from ..serves.drug_search_index import get_drug_search_index, rebuild_drug_search_index
+from ..serves.scheduler_service import reminder_scheduler
+from ..serves.supabase_service import token_cache
+from ..serves.third_party_service import search_cache, detail_cache, upstream_flights
+from .user import user_cache
+
+
+def verify_internal_token(x_internal_token: Optional[str] = Header(None)):
+    """
+    校验内部接口访问令牌
+    :param x_internal_token: 请求头 X-Internal-Token
+    :raises HTTPException: 503 - 未配置INTERNAL_API_TOKEN
+    :raises HTTPException: 403 - 令牌不匹配
+    """
+    if not config.INTERNAL_API_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="未配置内部接口访问令牌"
+        )
+    if not x_internal_token or not hmac.compare_digest(x_internal_token.encode(), config.INTERNAL_API_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权访问内部接口"
+        )
+
+
+# 创建路由器
+router = APIRouter(prefix="/internal", tags=["内部接口"], dependencies=[Depends(verify_internal_token)])
+
+
+@router.get("/scheduler")
+async def get_scheduler_stats():
+    """
+    获取提醒后台调度器的运行状态
+    :return: 滞后时间、吞吐量等统计信息
+    """
+    return reminder_scheduler.stats()
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    获取数据库连接池与缓存指标
+    :return: 连接等待时间、占用数、溢出数、失效次数及缓存命中率等
+    """
+    return {
+        "pool": pool_metrics.snapshot(async_engine.sync_engine.pool),
+        "user_cache": user_cache.stats(),
+        "token_cache": token_cache.stats(),
+        "read_cache": read_cache.stats(),
+        "drug_search_cache": search_cache.stats(),
+        "drug_detail_cache": detail_cache.stats(),
+        "drug_upstream_flights": upstream_flights.stats(),
+        "drug_search_index": get_drug_search_index().stats()
+    }
+
+
+@router.post("/drug-catalog/import")
+async def import_drug_catalog(
+    file: UploadFile = File(..., description="药品目录文件（CSV或JSONL）"),
+    file_format: Optional[Literal["csv", "jsonl"]] = Form(None, description="文件格式，默认按扩展名判断")
+):
+    """
+    批量导入药品目录并重建本地搜索索引
+    索引保存在进程内存中，只重建处理本次请求的工作进程的索引；
+    多进程部署时其他进程需分别调用/internal/drug-catalog/reindex或重启
+    :param file: 药品目录文件
+    :param file_format: 文件格式（csv, jsonl）
+    :return: 导入统计与索引状态
+    :raises HTTPException: 400 - 无法识别文件格式或文件内容错误
+    """
+    file_format = file_format or ("csv" if (file.filename or "").lower().endswith(".csv") else "jsonl")
+    try:
+        # 上传文件已缓存在临时文件中，逐行读取并分批写入
+        text = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+        result = await drug_catalog_service.import_catalog_records(
+            drug_catalog_service.iter_catalog_file(text, file_format)
+        )
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"药品目录文件格式错误: {str(e)}"
+        )
+
+    index = await rebuild_drug_search_index()
+    return {"import": result, "index": index.stats(), "worker_pid": os.getpid()}
+
+
+@router.post("/drug-catalog/reindex")
+async def reindex_drug_catalog():
+    """
+    从drug_catalog表重建本地药品搜索索引（只重建处理本次请求的工作进程的索引）
+    :return: 索引状态与工作进程ID
+    """
+    index = await rebuild_drug_search_index()
+    return {**index.stats(), "worker_pid": os.getpid()}
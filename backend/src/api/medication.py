@@ -2,42 +2,31 @@
 药物API路由层
 处理药物相关的HTTP请求
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List, Optional, Any
-import json
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Literal
+from ..core.config import config
+from ..core.etag import make_etag, conditional_response
+from ..core.serialization import trusted_json
 from ..db.database import get_db
 from ..schemas.medication import (
     MedicationCreate,
     MedicationUpdate,
-    MedicationResponse
+    MedicationResponse,
+    MedicationPartialResponse,
+    PhotoResponse
 )
 from ..schemas.user import UserResponse
-from ..serves import medication_service
+from ..serves import medication_service, photo_service
 from .user import get_current_user
 
 # 创建路由器
 router = APIRouter(prefix="/medications", tags=["药物管理"])
 
 
-def _safe_json_parse(json_str: Optional[str], default: Any = None) -> Any:
-    """
-    安全解析JSON字符串
-    :param json_str: JSON字符串
-    :param default: 解析失败时的默认值
-    :return: 解析后的对象或默认值
-    """
-    if not json_str:
-        return default
-    try:
-        return json.loads(json_str)
-    except (json.JSONDecodeError, TypeError):
-        return default
-
-
 def _build_medication_response(medication) -> MedicationResponse:
     """
-    构建药物响应对象，解析JSON字段
+    构建药物响应对象
     """
     return MedicationResponse(
         id=medication.id,
@@ -46,12 +35,13 @@ def _build_medication_response(medication) -> MedicationResponse:
         dosage=medication.dosage,
         frequency_type=medication.frequency_type,
         times_per_day=medication.times_per_day,
-        daily_times=_safe_json_parse(medication.daily_times, []),
-        weekly_days=_safe_json_parse(medication.weekly_days, []),
+        daily_times=medication.daily_times or [],
+        weekly_days=medication.weekly_days or [],
         start_date=medication.start_date,
         end_date=medication.end_date,
         notes=medication.notes,
         photos=medication.photos,
+        photo_thumbnails=photo_service.get_photo_thumbnails(medication.photos),
         barcode=medication.barcode,
         is_active=medication.is_active,
         created_at=medication.created_at,
@@ -72,11 +62,72 @@ def _build_medication_response(medication) -> MedicationResponse:
     )
 
 
+# 由其他列计算得到的响应字段（字段名 -> (依赖的列, 计算函数)）
+_DERIVED_FIELDS = {
+    "daily_times": ("daily_times", lambda medication: medication.daily_times or []),
+    "weekly_days": ("weekly_days", lambda medication: medication.weekly_days or []),
+    "photo_thumbnails": ("photos", lambda medication: photo_service.get_photo_thumbnails(medication.photos))
+}
+
+
+def _resolve_fields(
+    view: Literal["summary", "list", "detail"],
+    fields: Optional[str]
+) -> tuple[List[str], List[str]]:
+    """
+    解析需要返回的字段及需要查询的列
+    :param view: 视图（summary-摘要, list-列表（不含大字段）, detail-详情）
+    :param fields: 逗号分隔的字段名（指定时优先于view）
+    :return: (响应字段列表, 查询列列表)
+    :raises HTTPException: 400 - 包含未知字段
+    """
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in MedicationResponse.model_fields]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"未知的字段: {', '.join(unknown)}"
+            )
+    else:
+        names = list(medication_service.MEDICATION_PROJECTIONS[view])
+        if view == "detail":
+            names.append("photo_thumbnails")
+
+    if "id" not in names:
+        names.insert(0, "id")
+    columns = {_DERIVED_FIELDS[name][0] if name in _DERIVED_FIELDS else name for name in names}
+    return names, sorted(columns)
+
+
+def _build_partial_dict(medication, names: List[str]) -> dict:
+    """
+    构建只包含指定字段的药物响应字典（数据来自数据库，直接序列化而不再校验）
+    :param medication: 药物对象（只加载了所需的列）
+    :param names: 响应字段列表
+    :return: 字段名 -> 值
+    """
+    return {
+        name: _DERIVED_FIELDS[name][1](medication) if name in _DERIVED_FIELDS else getattr(medication, name)
+        for name in names
+    }
+
+
+def _build_partial_response(medication, names: List[str]) -> MedicationPartialResponse:
+    """
+    构建只包含指定字段的药物响应对象
+    :param medication: 药物对象（只加载了所需的列）
+    :param names: 响应字段列表
+    :return: 药物响应对象（未包含的字段不会出现在响应中）
+    """
+    return MedicationPartialResponse(**_build_partial_dict(medication, names))
+
+
 @router.post("", response_model=MedicationResponse, status_code=status.HTTP_201_CREATED)
 async def create_medication(
     medication_data: MedicationCreate,
     current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     创建药物记录
@@ -85,39 +136,111 @@ async def create_medication(
     :param db: 数据库会话
     :return: 创建的药物信息
     """
-    medication = medication_service.create_medication(db, current_user.id, medication_data)
+    try:
+        medication = await medication_service.create_medication(db, current_user.id, medication_data)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     return _build_medication_response(medication)
 
 
-@router.get("", response_model=List[MedicationResponse])
+@router.post("/photos", response_model=PhotoResponse, status_code=status.HTTP_201_CREATED)
+async def upload_photo(
+    file: UploadFile = File(..., description="药品照片"),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """
+    上传药品照片（生成缩略图），返回的URL可写入药物记录的photos字段
+    :param file: 照片文件（jpg, png, gif, webp）
+    :param current_user: 当前登录用户
+    :return: 照片信息
+    """
+    file_ext = (file.content_type or "").split("/")[-1]
+    if file_ext == "jpeg":
+        file_ext = "jpg"
+    if file_ext not in photo_service.PHOTO_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="仅支持jpg、png、gif、webp格式的图片"
+        )
+
+    # 多读取1字节用于判断是否超过大小限制；图片内容由服务层按声明的类型解码校验
+    data = await file.read(config.PHOTO_MAX_SIZE + 1)
+    try:
+        photo = await photo_service.store_photo(data, file_ext)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return PhotoResponse(**photo)
+
+
+@router.get("", response_model=List[MedicationPartialResponse], response_model_exclude_unset=True)
 async def get_medications(
+    request: Request,
+    response: Response,
+    view: Literal["summary", "list", "detail"] = Query("detail", description="视图：summary-摘要, list-列表（不含备注、照片、说明书）, detail-详情"),
+    fields: Optional[str] = Query(None, description="逗号分隔的返回字段，指定时优先于view"),
+    limit: Optional[int] = Query(None, ge=1, le=200, description="每页数量，默认返回全部"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页响应头X-Next-Cursor的值）"),
     current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    获取当前用户的所有药物记录
+    获取当前用户的药物记录（只查询并返回所需的字段，按ID键集分页）
+    支持If-None-Match条件请求：药物未变化时返回304，不查询药物数据
+    :param request: 请求对象
+    :param response: 响应对象（下一页游标写入X-Next-Cursor响应头，ETag写入ETag响应头）
+    :param view: 视图
+    :param fields: 返回字段
+    :param limit: 每页数量
+    :param cursor: 分页游标
     :param current_user: 当前登录用户
     :param db: 数据库会话
     :return: 药物列表
     """
-    medications = medication_service.get_user_medications(db, current_user.id)
-    return [_build_medication_response(med) for med in medications]
+    names, columns = _resolve_fields(view, fields)
+    marker = await medication_service.get_medications_marker(db, current_user.id)
+    not_modified = conditional_response(request, response, make_etag(marker, names, limit, cursor))
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        medications, next_cursor = await medication_service.get_user_medications_page(
+            db, current_user.id, columns, limit, cursor, marker
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return trusted_json([_build_partial_dict(med, names) for med in medications], response)
 
 
-@router.get("/{medication_id}", response_model=MedicationResponse)
+@router.get("/{medication_id}", response_model=MedicationPartialResponse, response_model_exclude_unset=True)
 async def get_medication(
     medication_id: int,
+    view: Literal["summary", "list", "detail"] = Query("detail", description="视图：summary-摘要, list-列表（不含备注、照片、说明书）, detail-详情"),
+    fields: Optional[str] = Query(None, description="逗号分隔的返回字段，指定时优先于view"),
     current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    获取指定药物记录
+    获取指定药物记录（只查询并返回所需的字段）
     :param medication_id: 药物ID
+    :param view: 视图
+    :param fields: 返回字段
     :param current_user: 当前登录用户
     :param db: 数据库会话
     :return: 药物信息
     """
-    medication = medication_service.get_medication_by_id(db, medication_id, current_user.id)
+    names, columns = _resolve_fields(view, fields)
+    medication = await medication_service.get_medication_by_id(db, medication_id, current_user.id, columns)
     if not medication:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -128,7 +251,7 @@ async def get_medication(
                 "suggestion": "请检查药物ID是否正确，或确认该药物属于您的账户"
             }
         )
-    return _build_medication_response(medication)
+    return _build_partial_response(medication, names)
 
 
 @router.put("/{medication_id}", response_model=MedicationResponse)
@@ -136,7 +259,7 @@ async def update_medication(
     medication_id: int,
     medication_data: MedicationUpdate,
     current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     更新药物记录
@@ -146,9 +269,15 @@ async def update_medication(
     :param db: 数据库会话
     :return: 更新后的药物信息
     """
-    medication = medication_service.update_medication(
-        db, medication_id, current_user.id, medication_data
-    )
+    try:
+        medication = await medication_service.update_medication(
+            db, medication_id, current_user.id, medication_data
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     if not medication:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -166,7 +295,7 @@ async def update_medication(
 async def delete_medication(
     medication_id: int,
     current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     删除药物记录
@@ -175,7 +304,7 @@ async def delete_medication(
     :param db: 数据库会话
     :return: 无内容
     """
-    success = medication_service.delete_medication(db, medication_id, current_user.id)
+    success = await medication_service.delete_medication(db, medication_id, current_user.id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -2,14 +2,18 @@
 用药提醒API路由层
 管理用药提醒的生成、查询和完成状态
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import Optional
-from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, Literal, List
+from datetime import date, timedelta
+from ..core.config import config
+from ..core.etag import make_etag, conditional_response
+from ..core.serialization import trusted_json
 from ..db.database import get_db
 from ..schemas.user import UserResponse
-from ..schemas.reminder import RemindersRequest, ReminderResponse
-from ..serves import reminder_service
+from ..schemas.reminder import RemindersRequest, ReminderResponse, ReminderStatsResponse, ReminderBatchRequest
+from ..serves import reminder_service, export_service, stats_service
 from .user import get_current_user
 
 # 创建路由器
@@ -20,7 +24,7 @@ router = APIRouter(prefix="/reminders", tags=["用药提醒"])
 async def generate_records(
     request: RemindersRequest,
     current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     生成未来N天的用药提醒
@@ -29,7 +33,7 @@ async def generate_records(
     :param db: 数据库会话
     :return: 生成的记录数量
     """
-    count = reminder_service.generate_reminders_for_user(
+    count = await reminder_service.generate_reminders_for_user(
         db, current_user.id, request.days
     )
     return {
@@ -38,14 +42,19 @@ async def generate_records(
     }
 
 
-@router.get("")
+@router.get("", response_model=List[ReminderResponse])
 async def get_records_by_date(
+    request: Request,
+    response: Response,
     target_date: Optional[date] = Query(None, description="目标日期，默认为今天"),
     current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     获取指定日期的用药提醒
+    支持If-None-Match条件请求：提醒与药物未变化时返回304，不查询提醒数据
+    :param request: 请求对象
+    :param response: 响应对象（ETag写入ETag响应头）
     :param target_date: 目标日期
     :param current_user: 当前登录用户
     :param db: 数据库会话
@@ -54,23 +63,35 @@ async def get_records_by_date(
     if target_date is None:
         target_date = date.today()
 
-    reminders = reminder_service.get_reminders_by_date(
-        db, current_user.id, target_date
+    marker = await reminder_service.get_reminders_marker(db, current_user.id, target_date)
+    etag = make_etag(marker, target_date, config.REMINDER_READ_MODE)
+    not_modified = conditional_response(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+
+    reminders = await reminder_service.get_reminders_by_date(
+        db, current_user.id, target_date, marker
     )
-    return reminders
+    return trusted_json(reminders, response)
 
 
-@router.get("/range")
+@router.get("/range", response_model=List[ReminderResponse])
 async def get_reminders_by_range(
+    response: Response,
     start_date: date = Query(..., description="开始日期"),
     end_date: date = Query(..., description="结束日期"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="每页数量，默认返回范围内的全部记录"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页响应头X-Next-Cursor的值）"),
     current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    获取日期范围内的用药提醒
+    获取日期范围内的用药提醒（指定limit时按日期、时间、ID键集分页）
+    :param response: 响应对象（分页时下一页游标写入X-Next-Cursor响应头）
     :param start_date: 开始日期
     :param end_date: 结束日期
+    :param limit: 每页数量
+    :param cursor: 分页游标
     :param current_user: 当前登录用户
     :param db: 数据库会话
     :return: 用药记录列表
@@ -80,18 +101,127 @@ async def get_reminders_by_range(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="结束日期不能早于开始日期"
         )
+    if (end_date - start_date).days + 1 > config.REMINDER_RANGE_MAX_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"日期范围不能超过 {config.REMINDER_RANGE_MAX_DAYS} 天"
+        )
+
+    try:
+        reminders, next_cursor = await reminder_service.get_date_range_reminders(
+            db, current_user.id, start_date, end_date, limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return trusted_json(reminders, response)
+
+
+@router.get("/stats", response_model=ReminderStatsResponse)
+async def get_reminder_stats(
+    start_date: Optional[date] = Query(None, description="开始日期，默认为结束日期前29天"),
+    end_date: Optional[date] = Query(None, description="结束日期，默认为今天"),
+    on_time_window: Optional[int] = Query(None, ge=0, le=1440, description="准时判断允许的偏差（分钟）"),
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取服药依从性统计（按日、周、药物的完成率与准时率，以及连续完成天数）
+    :param start_date: 开始日期
+    :param end_date: 结束日期
+    :param on_time_window: 准时判断允许的偏差（分钟）
+    :param current_user: 当前登录用户
+    :param db: 数据库会话
+    :return: 统计结果
+    """
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=29)
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="结束日期不能早于开始日期"
+        )
+    if (end_date - start_date).days + 1 > config.REMINDER_RANGE_MAX_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"日期范围不能超过 {config.REMINDER_RANGE_MAX_DAYS} 天"
+        )
 
-    reminders = reminder_service.get_date_range_reminders(
-        db, current_user.id, start_date, end_date
+    return await stats_service.get_adherence_stats(
+        db, current_user.id, start_date, end_date, on_time_window
     )
-    return reminders
+
+
+@router.get("/export")
+async def export_reminders(
+    start_date: Optional[date] = Query(None, description="开始日期，默认不限"),
+    end_date: Optional[date] = Query(None, description="结束日期，默认不限"),
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format", description="导出格式"),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """
+    流式导出用药记录（服药历史）
+    :param start_date: 开始日期
+    :param end_date: 结束日期
+    :param export_format: 导出格式（ndjson, csv）
+    :param current_user: 当前登录用户
+    :return: NDJSON或CSV流
+    """
+    if start_date and end_date and end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="结束日期不能早于开始日期"
+        )
+
+    filename = f"reminders_{start_date or 'all'}_{end_date or 'all'}.{export_format}"
+    return StreamingResponse(
+        export_service.stream_reminder_export(current_user.id, start_date, end_date, export_format),
+        media_type=export_service.EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.post("/batch-complete", response_model=List[ReminderResponse])
+async def batch_complete_records(
+    request: ReminderBatchRequest,
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    批量标记用药记录为已完成
+    :param request: 批量请求（包含记录ID列表）
+    :param current_user: 当前登录用户
+    :param db: 数据库会话
+    :return: 更新后的提醒列表（不存在的ID被忽略）
+    """
+    return await reminder_service.set_reminders_completed(db, request.ids, current_user.id, True)
+
+
+@router.post("/batch-uncomplete", response_model=List[ReminderResponse])
+async def batch_uncomplete_records(
+    request: ReminderBatchRequest,
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    批量取消用药记录的完成状态
+    :param request: 批量请求（包含记录ID列表）
+    :param current_user: 当前登录用户
+    :param db: 数据库会话
+    :return: 更新后的提醒列表（不存在的ID被忽略）
+    """
+    return await reminder_service.set_reminders_completed(db, request.ids, current_user.id, False)
 
 
 @router.put("/{reminder_id}/complete", response_model=ReminderResponse)
 async def complete_record(
     reminder_id: int,
     current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     标记用药记录为已完成
@@ -100,7 +230,7 @@ async def complete_record(
     :param db: 数据库会话
     :return: 更新后的提醒
     """
-    reminder = reminder_service.complete_reminder(db, reminder_id, current_user.id)
+    reminder = await reminder_service.complete_reminder(db, reminder_id, current_user.id)
     # noinspection DuplicatedCode
     if not reminder:
         raise HTTPException(
@@ -108,30 +238,15 @@ async def complete_record(
             detail="用药提醒不存在"
         )
 
-    # 获取药物信息
-    from ..db.models.medication import Medication
-    medication = db.query(Medication).filter(Medication.id == reminder.medication_id).first()
-
-    return {
-        "id": reminder.id,
-        "user_id": str(reminder.user_id),
-        "medication_id": reminder.medication_id,
-        "medication_name": medication.name if medication else "",
-        "dosage": medication.dosage if medication else None,
-        "scheduled_date": reminder.scheduled_date,
-        "scheduled_time": reminder.scheduled_time,
-        "is_completed": reminder.is_completed,
-        "completed_at": reminder.completed_at,
-        "created_at": reminder.created_at,
-        "updated_at": reminder.updated_at
-    }
+    # 药物名称和剂量已由 UPDATE ... RETURNING 一并取回
+    return reminder
 
 
 @router.put("/{reminder_id}/uncomplete", response_model=ReminderResponse)
 async def uncomplete_reminder(
     reminder_id: int,
     current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     取消用药提醒的完成状态
@@ -140,7 +255,7 @@ async def uncomplete_reminder(
     :param db: 数据库会话
     :return: 更新后的提醒
     """
-    reminder = reminder_service.uncomplete_reminder(db, reminder_id, current_user.id)
+    reminder = await reminder_service.uncomplete_reminder(db, reminder_id, current_user.id)
     # noinspection DuplicatedCode
     if not reminder:
         raise HTTPException(
@@ -148,21 +263,6 @@ async def uncomplete_reminder(
             detail="用药提醒不存在"
         )
 
-    # 获取药物信息
-    from ..db.models.medication import Medication
-    medication = db.query(Medication).filter(Medication.id == reminder.medication_id).first()
-
-    return {
-        "id": reminder.id,
-        "user_id": str(reminder.user_id),
-        "medication_id": reminder.medication_id,
-        "medication_name": medication.name if medication else "",
-        "dosage": medication.dosage if medication else None,
-        "scheduled_date": reminder.scheduled_date,
-        "scheduled_time": reminder.scheduled_time,
-        "is_completed": reminder.is_completed,
-        "completed_at": reminder.completed_at,
-        "created_at": reminder.created_at,
-        "updated_at": reminder.updated_at
-    }
+    # 药物名称和剂量已由 UPDATE ... RETURNING 一并取回
+    return reminder
 
@@ -2,7 +2,7 @@
 第三方数据库药品查询API
 """
 from fastapi import APIRouter, HTTPException, status, Query
-from typing import List, Literal
+from typing import List, Literal, Optional
 from ..schemas.third_party import DrugSearchResult, DrugDetailResponse
 from ..serves.third_party_service import (
     search_drugs_from_third_party,
@@ -16,17 +16,19 @@ router = APIRouter(prefix="/third-party", tags=["第三方数据库查询服务"
 async def search_drugs(
     query: str = Query(..., min_length=1, description="搜索关键词"),
     search_type: Literal["name", "barcode", "manufacturer"] = Query("name", description="搜索类型"),
-    limit: int = Query(10, ge=1, le=50, description="返回结果数量限制")
+    limit: int = Query(10, ge=1, le=50, description="返回结果数量限制"),
+    mode: Optional[Literal["remote", "local", "auto"]] = Query(None, description="搜索模式，默认使用服务端配置")
 ):
     """
     搜索外部药物数据库
     :param query: 搜索关键词
     :param search_type: 搜索类型（name-名称, barcode-条码, manufacturer-厂家）
     :param limit: 返回结果数量限制
+    :param mode: 搜索模式（remote-极速API, local-本地目录索引, auto-本地优先）
     :return: 药物搜索结果列表
     """
     try:
-        results = await search_drugs_from_third_party(query, search_type, limit)
+        results = await search_drugs_from_third_party(query, search_type, limit, mode)
         return results
     except Exception as e:
         raise HTTPException(
@@ -3,9 +3,13 @@
 处理用户相关的HTTP请求
 """
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import base64
 import re
+import time
+from ..core.cache import TTLCache
+from ..core.config import config
 from ..db.database import get_db
 from ..db.models.user import UserProfile
 from ..schemas.user import UserResponse, UserUpdate, UserAvatarUpdate
@@ -18,9 +22,12 @@ router = APIRouter(prefix="/users", tags=["用户管理"])
 # HTTP Bearer认证
 security = HTTPBearer()
 
+# 已认证用户信息缓存（键为用户ID，条目不会存活超过token的过期时间）
+user_cache = TTLCache(maxsize=config.USER_CACHE_MAXSIZE, ttl=config.USER_CACHE_TTL)
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> UserResponse:
     """
     获取当前登录用户信息
@@ -54,8 +61,16 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # 从JWT token中提取邮箱（存储在Supabase Auth中）
+    email = payload.get("email")
+
+    # 命中缓存时跳过profile查询
+    cached_user = user_cache.get(user_id)
+    if cached_user is not None and cached_user.email == email:
+        return cached_user
+
     # 查询用户profile（扩展信息）
-    user_profile = db.query(UserProfile).filter(UserProfile.id == user_id).first()
+    user_profile = await db.get(UserProfile, user_id)
     if user_profile is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -63,9 +78,6 @@ async def get_current_user(
         )
 
     try:
-        # 从JWT token中提取邮箱（存储在Supabase Auth中）
-        email = payload.get("email")
-
         # 构建完整的用户信息响应
         user_data = {
             "id": user_id,
@@ -77,13 +89,21 @@ async def get_current_user(
             "updated_at": user_profile.updated_at
         }
 
-        return UserResponse(**user_data)
+        user = UserResponse(**user_data)
     except:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="用户数据处理失败"
         )
 
+    # 缓存有效期不超过token的剩余有效期
+    ttl = config.USER_CACHE_TTL
+    if payload.get("exp"):
+        ttl = min(ttl, payload["exp"] - time.time())
+    user_cache.set(user_id, user, ttl=ttl)
+
+    return user
+
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(current_user: UserResponse = Depends(get_current_user)):
     """
@@ -99,7 +119,7 @@ async def get_current_user_info(current_user: UserResponse = Depends(get_current
 async def update_current_user(
     user_data: UserUpdate,
     current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     更新当前用户信息
@@ -109,7 +129,7 @@ async def update_current_user(
     :return: 更新后的用户信息
     """
     # 查询用户profile
-    user_profile = db.query(UserProfile).filter(UserProfile.id == current_user.id).first()
+    user_profile = await db.get(UserProfile, current_user.id)
     if not user_profile:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -119,10 +139,10 @@ async def update_current_user(
     # 更新字段
     if user_data.username is not None:
         # 检查用户名是否已被其他用户使用
-        existing = db.query(UserProfile).filter(
+        existing = await db.scalar(select(UserProfile.id).where(
             UserProfile.username == user_data.username,
             UserProfile.id != current_user.id
-        ).first()
+        ).limit(1))
         if existing:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -134,9 +154,10 @@ async def update_current_user(
         user_profile.full_name = user_data.full_name
 
     # 保存到数据库
-    db.add(user_data)
-    db.commit()
-    db.refresh(user_profile)
+    db.add(user_profile)
+    await db.commit()
+    await db.refresh(user_profile)
+    user_cache.delete(current_user.id)
 
     # 构建包含邮箱的完整用户信息
     user_data = {
@@ -157,7 +178,7 @@ async def update_current_user(
 async def upload_avatar(
     avatar_data: UserAvatarUpdate,
     current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     上传用户头像到Supabase Storage
@@ -207,7 +228,7 @@ async def upload_avatar(
         )
 
     # 更新用户profile
-    user_profile = db.query(UserProfile).filter(UserProfile.id == current_user.id).first()
+    user_profile = await db.get(UserProfile, current_user.id)
     if not user_profile:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -216,8 +237,9 @@ async def upload_avatar(
 
     user_profile.avatar_url = avatar_url
     db.add(user_profile)
-    db.commit()
-    db.refresh(user_profile)
+    await db.commit()
+    await db.refresh(user_profile)
+    user_cache.delete(current_user.id)
 
     # 构建包含邮箱的完整用户信息
     user_data = {
@@ -0,0 +1,115 @@
+"""
+进程内缓存工具
+提供带过期时间与容量上限（LRU淘汰）的缓存，并统计命中率
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """带过期时间的LRU缓存
+
+    - 每个条目有独立的过期时间，过期后视为未命中
+    - 条目可附带过期后的陈旧窗口，供lookup实现stale-while-revalidate
+    - 超出容量时淘汰最久未使用的条目
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        :param maxsize: 最大条目数
+        :param ttl: 默认过期时间（秒）
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        获取缓存值
+        :param key: 缓存键
+        :param default: 未命中时的默认值
+        :return: 缓存值或默认值
+        """
+        found, value, stale = self.lookup(key)
+        if not found or stale:
+            return default
+        return value
+
+    def lookup(self, key: Hashable) -> Tuple[bool, Any, bool]:
+        """
+        查找缓存条目，可区分缓存的None值与未命中
+        :param key: 缓存键
+        :return: (是否命中, 缓存值, 是否已过期但仍在陈旧窗口内)
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None, False
+
+        expires_at, stale_until, value = entry
+        now = time.monotonic()
+        if stale_until <= now:
+            del self._data[key]
+            self.misses += 1
+            return False, None, False
+
+        self._data.move_to_end(key)
+        if expires_at <= now:
+            self.stale_hits += 1
+            return True, value, True
+
+        self.hits += 1
+        return True, value, False
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, stale_ttl: float = 0):
+        """
+        写入缓存值
+        :param key: 缓存键
+        :param value: 缓存值
+        :param ttl: 过期时间（秒），默认使用缓存的ttl
+        :param stale_ttl: 过期后仍可作为陈旧值返回的时间（秒）
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        expires_at = time.monotonic() + ttl
+        self._data[key] = (expires_at, expires_at + stale_ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable):
+        """
+        删除缓存值
+        :param key: 缓存键
+        """
+        self._data.pop(key, None)
+
+    def clear(self):
+        """清空缓存"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """
+        获取缓存统计信息
+        :return: 条目数、命中数、未命中数、命中率等
+        """
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0
+        }
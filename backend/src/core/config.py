@@ -1,6 +1,7 @@
 """
 配置模块，读取环境配置
 """
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Config(BaseSettings):
@@ -18,9 +19,74 @@ class Config(BaseSettings):
     # 数据库配置
     DATABASE_URL: str = None
 
+    # JWT验证配置
+    JWT_BACKEND: Literal["jose", "pyjwt"] = "jose"  # JWT解码实现，pyjwt需额外安装PyJWT
+    JWT_CACHE_TTL: int = 300  # 已验证token缓存时间（秒）
+    JWT_CACHE_MAXSIZE: int = 10000  # 最大缓存token数
+
+    # 已认证用户信息缓存配置
+    USER_CACHE_TTL: int = 60  # 缓存时间（秒）
+    USER_CACHE_MAXSIZE: int = 10000  # 最大缓存用户数
+
+    # 按用户版本化的读缓存配置（当日提醒、药物列表，用户写入后立即失效）
+    READ_CACHE_ENABLED: bool = True
+    READ_CACHE_TTL: int = 300  # 条目过期时间（秒）
+    READ_CACHE_MAXSIZE: int = 10000  # 最大缓存条目数
+
+    # 数据库连接池配置
+    DB_POOL_SIZE: int = 5  # 连接池大小（默认值较低以适配Supabase连接数限制）
+    DB_MAX_OVERFLOW: int = 10  # 最大溢出连接数
+    DB_POOL_RECYCLE: int = 1800  # 连接回收时间（秒），-1表示不回收
+    DB_POOL_TIMEOUT: float = 30.0  # 获取连接超时时间（秒）
+    DB_POOL_PRE_PING: bool = True  # 取出连接前预检查（关闭时依赖回收时间淘汰失效连接）
+    DB_PGBOUNCER_MODE: bool = False  # 经PgBouncer/Supabase事务池连接时关闭预编译语句
+
     # 极速API配置（药品数据库）
     JISU_API_KEY: str = None
     JISU_API_BASE_URL: str = "https://api.jisuapi.com"
+    JISU_HTTP_TIMEOUT: float = 10.0  # 请求超时时间（秒）
+    JISU_HTTP_CONNECT_TIMEOUT: float = 5.0  # 建立连接超时时间（秒）
+    JISU_HTTP_MAX_CONNECTIONS: int = 20  # 最大连接数
+    JISU_HTTP_MAX_KEEPALIVE: int = 10  # 最大保持连接数
+    JISU_HTTP_KEEPALIVE_EXPIRY: float = 60.0  # 空闲连接保持时间（秒）
+    JISU_HTTP2: bool = True  # 已安装h2时启用HTTP/2
+
+    # 药品查询结果缓存配置
+    DRUG_SEARCH_CACHE_TTL: int = 3600  # 搜索结果缓存时间（秒）
+    DRUG_SEARCH_CACHE_MAXSIZE: int = 5000  # 最大缓存搜索条目数
+    DRUG_DETAIL_CACHE_TTL: int = 86400  # 药品详情缓存时间（秒）
+    DRUG_DETAIL_CACHE_MAXSIZE: int = 5000  # 最大缓存详情条目数
+    DRUG_NEGATIVE_CACHE_TTL: int = 300  # 未找到结果的缓存时间（秒）
+    DRUG_CACHE_STALE_TTL: int = 86400  # 过期后仍可返回旧值并后台刷新的时间（秒）
+    DRUG_CATALOG_MAX_AGE_DAYS: int = 30  # 本地药品目录记录的刷新周期（天）
+
+    # 药品搜索模式（remote-调用极速API, local-仅使用本地目录索引, auto-本地索引有结果时优先使用）
+    DRUG_SEARCH_MODE: Literal["remote", "local", "auto"] = "remote"
+    DRUG_CATALOG_IMPORT_BATCH_SIZE: int = 1000  # 批量导入药品目录时每批写入的记录数
+
+    # 药品照片存储配置（local-本地文件系统, supabase-Supabase Storage）
+    PHOTO_STORAGE_BACKEND: Literal["local", "supabase"] = "local"
+    PHOTO_LOCAL_DIR: str = "uploads/photos"  # 本地存储目录
+    PHOTO_PUBLIC_BASE_URL: str = "/photos"  # 本地存储时照片的访问地址前缀（与后端静态文件挂载路径一致）
+    PHOTO_SUPABASE_BUCKET: str = "medication-photos"  # Supabase Storage存储桶
+    PHOTO_MAX_SIZE: int = 5 * 1024 * 1024  # 单张照片大小上限（字节）
+    PHOTO_THUMBNAIL_SIZE: int = 256  # 缩略图最大边长（像素，需要安装Pillow）
+
+    # 提醒读取模式（materialized-读取预生成的记录, virtual-按药物排期实时计算，仅在完成服药时落库）
+    REMINDER_READ_MODE: Literal["materialized", "virtual"] = "materialized"
+    REMINDER_RANGE_MAX_DAYS: int = 366  # 日期范围查询允许的最大天数
+    REMINDER_ON_TIME_WINDOW_MINUTES: int = 30  # 统计准时服药时允许与计划时间相差的分钟数（修改后需重建每日汇总）
+    REMINDER_STATS_USE_ROLLUP: bool = True  # 统计接口读取每日汇总表（使用默认准时窗口时）
+
+    # 提醒后台生成配置（多个工作进程通过PostgreSQL咨询锁互斥；
+    # 经PgBouncer事务池连接时会话级锁不可靠，应只在一个进程中启用）
+    REMINDER_SCHEDULER_ENABLED: bool = True
+    REMINDER_HORIZON_DAYS: int = 14  # 滚动保持的提醒天数
+    REMINDER_SCHEDULER_INTERVAL: int = 300  # 两次运行之间的间隔（秒）
+    REMINDER_SCHEDULER_BATCH_SIZE: int = 100  # 每批处理的用户数
+
+    # 内部接口访问令牌（未配置时拒绝所有内部接口请求）
+    INTERNAL_API_TOKEN: Optional[str] = None
 
     model_config = SettingsConfigDict(env_file='.env', extra='allow')
 
@@ -0,0 +1,49 @@
+"""
+条件请求（ETag / If-None-Match）工具
+ETag由廉价的数据变更标记（行数、最大更新时间等）与请求参数计算，
+客户端缓存仍然有效时直接返回304，不查询也不序列化数据行
+"""
+import hashlib
+import json
+from typing import Any, Optional
+from fastapi import Request, Response, status
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    由变更标记与请求参数计算强ETag
+    :param parts: 参与计算的值（日期、时间等会转换为字符串）
+    :return: 带引号的ETag字符串
+    """
+    raw = json.dumps(list(parts), default=str, separators=(",", ":"))
+    return '"' + hashlib.sha256(raw.encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    判断If-None-Match请求头是否与ETag匹配（按弱比较，忽略W/前缀）
+    :param if_none_match: If-None-Match请求头的值
+    :param etag: 当前ETag
+    :return: 是否匹配
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (value.strip() for value in if_none_match.split(","))
+    return any(value.removeprefix("W/") == etag for value in candidates)
+
+
+def conditional_response(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    处理条件请求：客户端缓存有效时返回304响应，否则在响应上写入ETag
+    :param request: 请求对象
+    :param response: 路由的响应对象
+    :param etag: 当前ETag
+    :return: 304响应，需要返回完整数据时为None
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,36 @@
+"""
+键集（keyset）分页工具
+游标为排序键的不透明编码（URL安全的Base64 JSON），客户端只需原样传回
+"""
+import base64
+import binascii
+import json
+from typing import Any, List
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    将排序键编码为游标
+    :param values: 最后一条记录的排序键（日期等会转换为字符串）
+    :return: 游标字符串
+    """
+    raw = json.dumps(list(values), default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """
+    解析游标
+    :param cursor: 游标字符串
+    :param size: 排序键的个数
+    :return: 排序键列表
+    :raises ValueError: 游标无效
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise ValueError("无效的分页游标")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("无效的分页游标")
+    return values
@@ -0,0 +1,138 @@
+"""
+按用户版本化的读缓存
+缓存键包含用户当前的版本号，用户的任何写入提交后递增版本号，旧版本的条目不再命中并随LRU淘汰
+存储后端可替换：默认进程内存储，多进程部署时可实现共享存储后端
+"""
+import itertools
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Hashable, Tuple
+from .cache import TTLCache
+from .config import config
+
+
+class ReadCacheBackend(ABC):
+    """读缓存存储后端接口（方法均为异步，便于接入网络存储）"""
+
+    @abstractmethod
+    async def get_version(self, user_id: str) -> int:
+        """
+        获取用户当前的缓存版本号
+        :param user_id: 用户ID
+        :return: 版本号
+        """
+
+    @abstractmethod
+    async def bump_version(self, user_id: str):
+        """
+        递增用户的缓存版本号，使该用户已缓存的条目全部失效
+        :param user_id: 用户ID
+        """
+
+    @abstractmethod
+    async def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        获取缓存值
+        :param key: 缓存键
+        :return: (是否命中, 缓存值)
+        """
+
+    @abstractmethod
+    async def set(self, key: Hashable, value: Any):
+        """
+        写入缓存值
+        :param key: 缓存键
+        :param value: 缓存值
+        """
+
+    def stats(self) -> dict:
+        """获取统计信息"""
+        return {}
+
+
+class MemoryReadCacheBackend(ReadCacheBackend):
+    """进程内读缓存后端
+
+    - 条目与版本号都保存在带容量上限的LRU缓存中
+    - 版本号取自进程内全局递增计数器，版本号被淘汰后重新分配的值不会与旧值重复，
+      因此淘汰只会造成未命中，不会读到旧数据
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        :param maxsize: 最大条目数（版本号与条目分别计算）
+        :param ttl: 条目过期时间（秒）
+        """
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._counter = itertools.count(1)
+
+    async def get_version(self, user_id: str) -> int:
+        version = self._versions.get(user_id)
+        if version is None:
+            version = next(self._counter)
+            self._versions.set(user_id, version)
+        return version
+
+    async def bump_version(self, user_id: str):
+        self._versions.set(user_id, next(self._counter))
+
+    async def get(self, key: Hashable) -> Tuple[bool, Any]:
+        found, value, _ = self._entries.lookup(key)
+        return found, value
+
+    async def set(self, key: Hashable, value: Any):
+        self._entries.set(key, value)
+
+    def stats(self) -> dict:
+        return {**self._entries.stats(), "users": len(self._versions)}
+
+
+class ReadCache:
+    """按用户版本化的读缓存"""
+
+    def __init__(self, backend: ReadCacheBackend, enabled: bool = True):
+        """
+        :param backend: 存储后端
+        :param enabled: 是否启用（关闭时直接调用加载函数）
+        """
+        self.backend = backend
+        self.enabled = enabled
+
+    async def get_or_load(self, user_id: str, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        获取用户的缓存值，未命中时调用加载函数并写入缓存
+        先读取版本号再加载数据：加载期间发生的写入会递增版本号，本次写入的条目随即失效
+        :param user_id: 用户ID
+        :param key: 用户内的缓存键
+        :param loader: 加载数据的协程函数
+        :return: 缓存值或加载结果
+        """
+        if not self.enabled:
+            return await loader()
+
+        cache_key = (user_id, await self.backend.get_version(user_id), key)
+        found, value = await self.backend.get(cache_key)
+        if found:
+            return value
+        value = await loader()
+        await self.backend.set(cache_key, value)
+        return value
+
+    async def invalidate(self, user_id: str):
+        """
+        使用户的全部缓存失效（须在写入提交之后调用，否则并发读取可能以新版本号缓存提交前的数据）
+        :param user_id: 用户ID
+        """
+        if self.enabled:
+            await self.backend.bump_version(user_id)
+
+    def stats(self) -> dict:
+        """获取统计信息"""
+        return {"enabled": self.enabled, **self.backend.stats()}
+
+
+# 定义唯一的读缓存实例
+read_cache = ReadCache(
+    MemoryReadCacheBackend(maxsize=config.READ_CACHE_MAXSIZE, ttl=config.READ_CACHE_TTL),
+    enabled=config.READ_CACHE_ENABLED
+)
@@ -0,0 +1,30 @@
+"""
+响应序列化工具
+由pydantic-core在Rust中直接序列化为JSON字节（原生处理datetime、date、UUID），
+可信的ORM输出不再经过响应模型校验和jsonable_encoder逐字段转换
+"""
+from typing import Any, Optional
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+
+class FastJSONResponse(JSONResponse):
+    """使用pydantic-core序列化的JSON响应（应用的默认响应类）"""
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
+
+
+def trusted_json(content: Any, response: Optional[Response] = None) -> FastJSONResponse:
+    """
+    直接序列化服务层返回的可信数据（字典、列表等），跳过响应模型校验与jsonable_encoder
+    路由上的response_model仍用于生成接口文档
+    :param content: 响应数据
+    :param response: 路由注入的响应对象，其上设置的响应头（分页游标、ETag等）会一并返回
+    :return: JSON响应
+    """
+    headers = None
+    if response is not None:
+        headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    return FastJSONResponse(content, headers=headers)
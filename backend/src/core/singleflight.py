@@ -0,0 +1,55 @@
+"""
+并发请求合并工具
+同一个键同时只执行一次调用，其余并发调用方等待并共享同一个结果
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """单飞（single-flight）调用合并
+
+    - 首个调用方创建独立任务执行调用，调用方被取消不会中断该任务
+    - 调用完成前到达的相同键调用直接等待同一个任务
+    - 任务完成后立即移除，之后的调用会重新执行
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行调用或加入正在进行的相同调用
+        :param key: 调用键
+        :param fn: 执行调用的协程函数
+        :return: 调用结果（异常同样会传递给所有调用方）
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.calls += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        """任务完成回调：移除进行中的记录，并标记异常已读取"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        """
+        获取调用合并统计信息
+        :return: 实际调用次数、共享结果次数、进行中调用数
+        """
+        return {
+            "calls": self.calls,
+            "shared": self.shared,
+            "inflight": len(self._inflight)
+        }
@@ -1,30 +1,138 @@
 from ..core import config
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url, URL
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
+from typing import AsyncIterator
+from uuid import uuid4
+from .pool_metrics import InstrumentedAsyncQueuePool, instrument_pool
 
-# 连接PostgreSQL数据库并创建ORM基类
-engine = create_engine(
-    config.DATABASE_URL,
-    pool_pre_ping=True,  # 连接池预检查
-    pool_size=5,  # 连接池大小（降低以适配Supabase连接池限制）
-    max_overflow=10  # 最大溢出连接数（降低以避免连接耗尽）
-)
+# 连接池参数（通过配置调整以适配Supabase连接数上限）
+_pool_options = {
+    "pool_pre_ping": config.DB_POOL_PRE_PING,  # 连接池预检查
+    "pool_size": config.DB_POOL_SIZE,  # 连接池大小
+    "max_overflow": config.DB_MAX_OVERFLOW,  # 最大溢出连接数
+    "pool_recycle": config.DB_POOL_RECYCLE,  # 连接回收时间（秒）
+    "pool_timeout": config.DB_POOL_TIMEOUT  # 获取连接超时时间（秒）
+}
+
+# 连接PostgreSQL数据库并创建ORM基类（同步引擎仅用于建表和命令行脚本）
+engine = create_engine(config.DATABASE_URL, **_pool_options)
 Base = declarative_base()
 
 # 定义数据库会话工厂函数
 sessions = sessionmaker(bind=engine)
 
-def get_db():
+
+def _build_async_url(database_url: str) -> URL:
+    """
+    将同步数据库连接串转换为asyncpg驱动的连接串
+    :param database_url: 数据库连接串（postgresql://...）
+    :return: 使用postgresql+asyncpg驱动的URL
+    """
+    url = make_url(database_url).set(drivername="postgresql+asyncpg")
+    # asyncpg不识别libpq的sslmode参数，转换为ssl参数
+    sslmode = url.query.get("sslmode")
+    if sslmode:
+        url = url.difference_update_query(["sslmode"]).update_query_dict({"ssl": sslmode})
+    return url
+
+
+def _build_async_connect_args() -> dict:
+    """
+    构建asyncpg连接参数
+    PgBouncer/Supabase事务池模式下连接会在事务间切换，需要关闭预编译语句缓存
+    :return: 连接参数字典
+    """
+    if not config.DB_PGBOUNCER_MODE:
+        return {}
+    return {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        # 使用唯一的预编译语句名，避免在共享的服务端连接上冲突
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__"
+    }
+
+
+# 异步引擎，供所有API路由使用，避免数据库IO阻塞事件循环
+async_engine = create_async_engine(
+    _build_async_url(config.DATABASE_URL),
+    poolclass=InstrumentedAsyncQueuePool,  # 统计获取连接的等待时间
+    connect_args=_build_async_connect_args(),
+    **_pool_options
+)
+instrument_pool(async_engine.sync_engine.pool)
+
+# 定义异步数据库会话工厂函数（提交后不过期对象，避免访问属性时隐式IO）
+async_sessions = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+async def get_db() -> AsyncIterator[AsyncSession]:
     """获取数据库会话"""
-    db = sessions()
-    try:
+    async with async_sessions() as db:
         yield db
-    finally:
-        db.close()
+
+# 已有数据库需要补建的索引（create_all只创建缺失的表，不会为已存在的表补建索引）
+# (索引名, 被其替代的旧索引名, 建立索引的语句)
+INDEX_MIGRATIONS = (
+    ("idx_user_date_time_id", "idx_user_date",
+     "CREATE INDEX CONCURRENTLY idx_user_date_time_id ON reminder (user_id, scheduled_date, scheduled_time, id)"),
+    ("idx_user_id_id", None,
+     "CREATE INDEX CONCURRENTLY idx_user_id_id ON medication (user_id, id)"),
+)
 
 # 定义数据库初始化方法
 def init_db():
     """数据库初始化方法"""
-    from .models import UserProfile, Medication, Reminder # noqa
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    from .models import UserProfile, Medication, Reminder, ReminderHorizon, ReminderDailyRollup, DrugCatalog # noqa
+    Base.metadata.create_all(bind=engine)
+
+
+async def migrate_indexes() -> dict:
+    """
+    为已有数据库补建索引并删除被替代的旧索引（CONCURRENTLY方式，不阻塞读写），
+    并建立提醒时段唯一约束（批量生成提醒的ON CONFLICT依赖该约束）
+    可以重复执行：已存在且有效的索引跳过，中断后残留的无效索引会删除重建
+    :return: 迁移统计（新建的索引、删除的旧索引、删除的重复提醒数）
+    """
+    from sqlalchemy import text
+
+    stats = {"created": [], "dropped": [], "duplicates": 0}
+    # CREATE/DROP INDEX CONCURRENTLY不能在事务中执行
+    async with async_engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for name, replaces, ddl in INDEX_MIGRATIONS:
+            valid = await conn.scalar(text(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+            ), {"name": name})
+            if valid is False:
+                await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            if not valid:
+                await conn.execute(text(ddl))
+                stats["created"].append(name)
+            if replaces and (await conn.scalar(text("SELECT to_regclass(:name)"), {"name": replaces})) is not None:
+                await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {replaces}"))
+                stats["dropped"].append(replaces)
+
+        if await conn.scalar(text("SELECT 1 FROM pg_constraint WHERE conname = 'uq_reminder_slot'")) is None:
+            # 删除重复的时段（保留已完成的、其次ID最小的记录），NULL时间在分区中视为相同值
+            result = await conn.execute(text(
+                "DELETE FROM reminder r USING ("
+                "  SELECT id, row_number() OVER ("
+                "    PARTITION BY medication_id, scheduled_date, scheduled_time"
+                "    ORDER BY is_completed DESC NULLS LAST, id"
+                "  ) AS n FROM reminder"
+                ") d WHERE r.id = d.id AND d.n > 1"
+            ))
+            stats["duplicates"] = result.rowcount
+            await conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS uq_reminder_slot"))
+            await conn.execute(text(
+                "CREATE UNIQUE INDEX CONCURRENTLY uq_reminder_slot "
+                "ON reminder (medication_id, scheduled_date, scheduled_time) NULLS NOT DISTINCT"
+            ))
+            await conn.execute(text(
+                "ALTER TABLE reminder ADD CONSTRAINT uq_reminder_slot UNIQUE USING INDEX uq_reminder_slot"
+            ))
+            stats["created"].append("uq_reminder_slot")
+    return stats
@@ -4,5 +4,8 @@
 from .user import UserProfile
 from .medication import Medication
 from .reminder import Reminder
+from .reminder_horizon import ReminderHorizon
+from .reminder_rollup import ReminderDailyRollup
+from .drug_catalog import DrugCatalog
 
-__all__ = ['UserProfile', 'Medication', 'Reminder']
\ No newline at end of file
+__all__ = ['UserProfile', 'Medication', 'Reminder', 'ReminderHorizon', 'ReminderDailyRollup', 'DrugCatalog']
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""
+药品目录数据表定义
+缓存外部药物数据库（极速API）查询到的药品信息，供所有进程共享
+由详情查询和搜索结果读穿（read-through）写入，或从药品目录文件批量导入
+"""
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean
+from datetime import datetime
+from ..database import Base
+
+
+class DrugCatalog(Base):
+    """药品目录模型类"""
+    __tablename__ = 'drug_catalog'
+
+    # 主键ID
+    id = Column(Integer, primary_key=True, autoincrement=True, comment="目录ID")
+
+    # 外部数据库药物ID（如jisu_123）
+    external_drug_id = Column(String(100), unique=True, nullable=False, index=True, comment="外部数据库药物ID")
+
+    # 药品名称
+    name = Column(String(200), nullable=False, comment="药品名称")
+
+    # 通用名
+    generic_name = Column(String(200), nullable=True, comment="通用名")
+
+    # 商品名
+    trade_name = Column(String(200), nullable=True, comment="商品名")
+
+    # 生产厂家
+    manufacturer = Column(String(200), nullable=True, comment="生产厂家")
+
+    # 包装规格
+    specification = Column(String(100), nullable=True, comment="包装规格")
+
+    # 产品剂型
+    dosage_form = Column(String(50), nullable=True, comment="产品剂型")
+
+    # 是否为处方药
+    is_prescription = Column(Boolean, default=False, comment="是否为处方药")
+
+    # 药品官方图片URL
+    drug_image_url = Column(String(500), nullable=True, comment="药品官方图片URL")
+
+    # 药品本位码
+    drug_code = Column(String(100), nullable=True, comment="药品本位码")
+
+    # 批准文号
+    approval_number = Column(String(100), nullable=True, index=True, comment="批准文号")
+
+    # 条形码
+    barcode = Column(String(100), nullable=True, index=True, comment="药品条形码")
+
+    # 说明书内容（JSON格式存储）
+    instruction_manual = Column(Text, nullable=True, comment="说明书内容JSON格式")
+
+    # 详情获取时间（为空表示仅来自搜索结果，尚未获取详情）
+    detail_fetched_at = Column(DateTime, nullable=True, comment="详情获取时间")
+
+    # 创建时间
+    created_at = Column(DateTime, default=datetime.now, comment="创建时间")
+
+    # 更新时间
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, comment="更新时间")
+
+    def __repr__(self):
+        return f"<DrugCatalog(id={self.id}, external_drug_id={self.external_drug_id}, name={self.name})>"
@@ -1,10 +1,16 @@
 """
 药物数据表定义
 """
-from sqlalchemy import Column, Integer, String, Date, DateTime, Text, ForeignKey, Index, Boolean
+from sqlalchemy import Column, Integer, SmallInteger, String, Date, DateTime, Text, ForeignKey, Index, Boolean, JSON
+from sqlalchemy.dialects.postgresql import JSONB, ARRAY
+from sqlalchemy.orm import deferred
 from datetime import datetime
 from ..database import Base
 
+# JSON列类型：PostgreSQL使用JSONB（驱动直接返回Python对象，可建GIN索引），SQLite退化为JSON
+# Python的None存为SQL NULL而不是JSON null（旧库的Text列由medication_service.migrate_json_columns迁移）
+JSONColumn = JSONB(none_as_null=True).with_variant(JSON(none_as_null=True), "sqlite")
+
 
 class Medication(Base):
     """药物模型类"""
@@ -29,10 +35,18 @@ class Medication(Base):
     times_per_day = Column(Integer, nullable=True, comment="每日服用次数")
 
     # 具体服用时间（JSON数组，如 ["08:00", "12:00", "18:00"]，仅当frequency_type=daily时有效）
-    daily_times = Column(Text, nullable=True, comment="每日具体服用时间JSON数组")
+    daily_times = Column(JSONColumn, nullable=True, comment="每日具体服用时间JSON数组")
 
     # 每周服用的星期几（JSON数组，如 [1, 3, 5] 表示周一、周三、周五，仅当frequency_type=weekly时有效）
-    weekly_days = Column(Text, nullable=True, comment="每周服用的星期几JSON数组")
+    weekly_days = Column(JSONColumn, nullable=True, comment="每周服用的星期几JSON数组")
+
+    # 编译后的排期（创建、更新时由medication_schedule编译，展开时段时不再解析JSON与时间字符串）
+    # 星期位掩码（bit0=周一 ... bit6=周日，没有有效时段时为0）
+    schedule_weekdays = Column(SmallInteger, nullable=True, comment="编译后的排期星期位掩码")
+
+    # 升序的当日服药分钟数（weekly类型为空数组）
+    schedule_minutes = Column(ARRAY(SmallInteger).with_variant(JSON(), "sqlite"), nullable=True,
+                              comment="编译后的排期当日分钟数")
 
     # 开始日期
     start_date = Column(Date, nullable=False, comment="开始日期")
@@ -40,11 +54,11 @@ class Medication(Base):
     # 结束日期
     end_date = Column(Date, nullable=True, comment="结束日期")
 
-    # 备注
-    notes = Column(Text, nullable=True, comment="备注")
+    # 备注（备注、照片、说明书为大字段，延迟加载，需要时通过undefer_group("heavy")一并查询）
+    notes = deferred(Column(Text, nullable=True, comment="备注"), group="heavy")
 
-    # 药品照片（JSON数组格式存储多张照片的Base64）
-    photos = Column(Text, nullable=True, comment="药品照片JSON数组")
+    # 药品照片（JSON数组格式存储多张照片的URL）
+    photos = deferred(Column(Text, nullable=True, comment="药品照片JSON数组"), group="heavy")
 
     # 条形码
     barcode = Column(String(100), nullable=True, comment="药品条形码")
@@ -69,7 +83,7 @@ class Medication(Base):
     drug_image_url = Column(String(500), nullable=True, comment="药品官方图片URL")
 
     # 说明书内容（JSON格式存储）
-    instruction_manual = Column(Text, nullable=True, comment="说明书内容JSON格式")
+    instruction_manual = deferred(Column(JSONColumn, nullable=True, comment="说明书内容JSON格式"), group="heavy")
 
     # 批准文号
     approval_number = Column(String(100), nullable=True, comment="批准文号")
@@ -98,6 +112,11 @@ class Medication(Base):
     # 创建索引以优化查询性能
     __table_args__ = (
         Index('idx_user_id_is_active', 'user_id', 'is_active'),
+        # 药物列表的键集分页索引
+        Index('idx_user_id_id', 'user_id', 'id'),
+        # 按星期几查询服药安排（weekly_days @> '[3]'）
+        Index('idx_medication_weekly_days', 'weekly_days',
+              postgresql_using='gin', postgresql_ops={'weekly_days': 'jsonb_path_ops'}),
     )
 
     def __repr__(self):
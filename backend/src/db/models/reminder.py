@@ -2,7 +2,7 @@
 用药提醒数据表定义
 记录每次用药的计划时间和完成状态
 """
-from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, ForeignKey, Index
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, ForeignKey, Index, UniqueConstraint
 from datetime import datetime
 from ..database import Base
 
@@ -40,8 +40,15 @@ class Reminder(Base):
 
     # 创建索引以优化查询性能
     __table_args__ = (
-        Index('idx_user_date', 'user_id', 'scheduled_date'),
+        # 按日期查询及日期范围键集分页（与排序 scheduled_date, scheduled_time NULLS LAST, id 一致）
+        Index('idx_user_date_time_id', 'user_id', 'scheduled_date', 'scheduled_time', 'id'),
         Index('idx_medication_date', 'medication_id', 'scheduled_date'),
+        # 提醒时段唯一约束（weekly类型的scheduled_time为空，需将NULL视为相同值）
+        UniqueConstraint(
+            'medication_id', 'scheduled_date', 'scheduled_time',
+            name='uq_reminder_slot',
+            postgresql_nulls_not_distinct=True
+        ),
     )
 
     def __repr__(self):
@@ -0,0 +1,24 @@
+"""
+提醒物化水位数据表定义
+记录每个用户的用药提醒已生成到哪一天
+"""
+from sqlalchemy import Column, String, Date, DateTime, ForeignKey
+from datetime import datetime
+from ..database import Base
+
+
+class ReminderHorizon(Base):
+    """提醒物化水位模型类"""
+    __tablename__ = 'reminder_horizon'
+
+    # 用户ID（主键，外键）
+    user_id = Column(String(36), ForeignKey('user_profiles.id'), primary_key=True, comment="用户ID")
+
+    # 已生成到的日期（该日期（含）之前的提醒已全部生成）
+    materialized_through = Column(Date, nullable=False, comment="提醒已生成到的日期（含）")
+
+    # 水位计算时间（药物在此之后有修改则水位失效）
+    updated_at = Column(DateTime, default=datetime.now, comment="水位计算时间")
+
+    def __repr__(self):
+        return f"<ReminderHorizon(user_id={self.user_id}, materialized_through={self.materialized_through})>"
@@ -0,0 +1,42 @@
+"""
+用药提醒每日汇总数据表定义
+按用户、药物、日期记录计划/完成/准时次数，随提醒的生成、完成状态变化和药物删除增量维护
+"""
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Index
+from datetime import datetime
+from ..database import Base
+
+
+class ReminderDailyRollup(Base):
+    """提醒每日汇总模型类"""
+    __tablename__ = 'reminder_daily_rollup'
+
+    # 用户ID（主键，外键）
+    user_id = Column(String(36), ForeignKey('user_profiles.id'), primary_key=True, comment="用户ID")
+
+    # 药物ID（主键）
+    medication_id = Column(Integer, ForeignKey('medication.id'), primary_key=True, comment="药物ID")
+
+    # 计划日期（主键）
+    scheduled_date = Column(Date, primary_key=True, comment="计划服用日期")
+
+    # 计划次数（当天已存储的提醒数）
+    scheduled = Column(Integer, nullable=False, default=0, comment="计划次数")
+
+    # 完成次数
+    completed = Column(Integer, nullable=False, default=0, comment="完成次数")
+
+    # 准时完成次数（按REMINDER_ON_TIME_WINDOW_MINUTES判断）
+    on_time = Column(Integer, nullable=False, default=0, comment="准时完成次数")
+
+    # 更新时间
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, comment="更新时间")
+
+    __table_args__ = (
+        # 按日期范围统计
+        Index('idx_rollup_user_date', 'user_id', 'scheduled_date'),
+    )
+
+    def __repr__(self):
+        return (f"<ReminderDailyRollup(user_id={self.user_id}, medication_id={self.medication_id}, "
+                f"date={self.scheduled_date})>")
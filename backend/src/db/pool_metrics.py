@@ -0,0 +1,111 @@
+"""
+数据库连接池监控
+通过连接池事件和自定义连接池类统计等待时间、占用数、溢出数和失效次数
+"""
+import time
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event, exc
+from sqlalchemy.pool import Pool, AsyncAdaptedQueuePool
+
+
+class PoolMetrics:
+    """连接池累计指标"""
+
+    def __init__(self):
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float):
+        """记录一次获取连接的等待时间"""
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+        holder = _request_pool_wait.get()
+        if holder is not None:
+            holder[0] += seconds
+            holder[1] += 1
+
+    def snapshot(self, pool: Pool) -> dict:
+        """
+        获取连接池当前状态与累计指标
+        :param pool: 连接池
+        :return: 指标字典（时间单位为毫秒）
+        """
+        return {
+            "pool_size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "in_use": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "invalidations": self.invalidations,
+            "soft_invalidations": self.soft_invalidations,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+            "wait_total_ms": round(self.wait_total * 1000, 3)
+        }
+
+
+# 定义唯一的指标实例
+pool_metrics = PoolMetrics()
+
+# 当前请求累计的连接等待 [等待秒数, 获取次数]
+_request_pool_wait: ContextVar[Optional[list]] = ContextVar("request_pool_wait", default=None)
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """记录获取连接等待时间的异步连接池"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - started)
+
+
+def instrument_pool(pool: Pool):
+    """
+    为连接池注册事件监听
+    :param pool: 连接池
+    """
+    @event.listens_for(pool, "connect")
+    def _on_connect(_dbapi_connection, _connection_record):
+        pool_metrics.connects += 1
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(_dbapi_connection, _connection_record, _connection_proxy):
+        pool_metrics.checkouts += 1
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(_dbapi_connection, _connection_record):
+        pool_metrics.checkins += 1
+
+    @event.listens_for(pool, "invalidate")
+    def _on_invalidate(_dbapi_connection, _connection_record, _exception):
+        pool_metrics.invalidations += 1
+
+    @event.listens_for(pool, "soft_invalidate")
+    def _on_soft_invalidate(_dbapi_connection, _connection_record, _exception):
+        pool_metrics.soft_invalidations += 1
+
+
+def begin_request_pool_timing() -> list:
+    """
+    开始统计当前请求的连接等待时间
+    :return: 统计容器 [等待秒数, 获取次数]
+    """
+    holder = [0.0, 0]
+    _request_pool_wait.set(holder)
+    return holder
@@ -3,9 +3,24 @@
 用于请求验证和响应序列化
 """
 from pydantic import BaseModel, Field, field_validator
-from typing import Optional, List, Literal
+from typing import Optional, List, Literal, Union
 from datetime import date, datetime
 from uuid import UUID
+import json
+
+
+def _parse_instruction_manual(v):
+    """
+    说明书内容接受对象或JSON字符串，JSON对象字符串解析为对象后存储（其他字符串原样保存）
+    """
+    if isinstance(v, str):
+        try:
+            parsed = json.loads(v)
+        except json.JSONDecodeError:
+            return v
+        return parsed if isinstance(parsed, dict) else v
+    return v
+
 
 # noinspection PyUnusedLocal,PyMethodParameters
 class MedicationBase(BaseModel):
@@ -19,7 +34,7 @@ class MedicationBase(BaseModel):
     start_date: date = Field(..., description="开始日期")
     end_date: Optional[date] = Field(None, description="结束日期")
     notes: Optional[str] = Field(None, description="备注")
-    photos: Optional[str] = Field(None, description="药品照片JSON数组")
+    photos: Optional[str] = Field(None, description="药品照片JSON数组（照片URL，或待转存的Base64图片）")
     barcode: Optional[str] = Field(None, max_length=100, description="药品条形码")
 
     # 外部药物数据库相关字段
@@ -29,7 +44,7 @@ class MedicationBase(BaseModel):
     dosage_form: Optional[str] = Field(None, max_length=50, description="产品剂型")
     is_prescription: Optional[bool] = Field(None, description="是否为处方药")
     drug_image_url: Optional[str] = Field(None, max_length=500, description="药品官方图片URL")
-    instruction_manual: Optional[str] = Field(None, description="说明书内容JSON格式")
+    instruction_manual: Optional[Union[dict, str]] = Field(None, description="说明书内容（对象或JSON字符串）")
     approval_number: Optional[str] = Field(None, max_length=100, description="批准文号")
     generic_name: Optional[str] = Field(None, max_length=200, description="通用名")
     trade_name: Optional[str] = Field(None, max_length=200, description="商品名")
@@ -57,6 +72,11 @@ class MedicationBase(BaseModel):
                 raise ValueError("星期几必须在1-7之间")
         return v
 
+    @field_validator('instruction_manual')
+    def validate_instruction_manual(cls, v):
+        """解析JSON字符串形式的说明书内容"""
+        return _parse_instruction_manual(v)
+
 
 class MedicationCreate(MedicationBase):
     """药物创建请求模式"""
@@ -85,13 +105,18 @@ class MedicationUpdate(BaseModel):
     dosage_form: Optional[str] = Field(None, max_length=50, description="产品剂型")
     is_prescription: Optional[int] = Field(None, description="是否为处方药")
     drug_image_url: Optional[str] = Field(None, max_length=500, description="药品官方图片URL")
-    instruction_manual: Optional[str] = Field(None, description="说明书内容")
+    instruction_manual: Optional[Union[dict, str]] = Field(None, description="说明书内容（对象或JSON字符串）")
     approval_number: Optional[str] = Field(None, max_length=100, description="批准文号")
     generic_name: Optional[str] = Field(None, max_length=200, description="通用名")
     trade_name: Optional[str] = Field(None, max_length=200, description="商品名")
     data_source: Optional[str] = Field(None, max_length=20, description="数据来源")
     external_drug_id: Optional[str] = Field(None, max_length=100, description="外部数据库药物ID")
 
+    @field_validator('instruction_manual')
+    def validate_instruction_manual(cls, v):
+        """解析JSON字符串形式的说明书内容"""
+        return _parse_instruction_manual(v)
+
 
 class MedicationResponse(BaseModel):
     """药物信息响应模式"""
@@ -106,7 +131,8 @@ class MedicationResponse(BaseModel):
     start_date: date = Field(..., description="开始日期")
     end_date: Optional[date] = Field(None, description="结束日期")
     notes: Optional[str] = Field(None, description="备注")
-    photos: Optional[str] = Field(None, description="药品照片")
+    photos: Optional[str] = Field(None, description="药品照片URL的JSON数组")
+    photo_thumbnails: Optional[List[str]] = Field(None, description="药品照片缩略图URL")
     barcode: Optional[str] = Field(None, description="条形码")
     is_active: bool = Field(..., description="是否激活")
     created_at: datetime = Field(..., description="创建时间")
@@ -119,7 +145,7 @@ class MedicationResponse(BaseModel):
     dosage_form: Optional[str] = Field(None, description="产品剂型")
     is_prescription: Optional[bool] = Field(None, description="是否为处方药")
     drug_image_url: Optional[str] = Field(None, description="药品官方图片URL")
-    instruction_manual: Optional[str] = Field(None, description="说明书内容")
+    instruction_manual: Optional[Union[dict, str]] = Field(None, description="说明书内容")
     approval_number: Optional[str] = Field(None, description="批准文号")
     generic_name: Optional[str] = Field(None, description="通用名")
     trade_name: Optional[str] = Field(None, description="商品名")
@@ -127,4 +153,45 @@ class MedicationResponse(BaseModel):
     external_drug_id: Optional[str] = Field(None, description="外部数据库药物ID")
 
     class Config:
-        from_attributes = True  # 允许从ORM模型创建
\ No newline at end of file
+        from_attributes = True  # 允许从ORM模型创建
+
+class MedicationPartialResponse(BaseModel):
+    """药物信息部分字段响应模式（用于fields参数和摘要/列表视图，只返回查询的字段）"""
+    id: int = Field(..., description="药物ID")
+    user_id: Optional[UUID] = Field(None, description="用户UUID")
+    name: Optional[str] = Field(None, description="药物名称")
+    dosage: Optional[str] = Field(None, description="剂量")
+    frequency_type: Optional[str] = Field(None, description="频率类型")
+    times_per_day: Optional[int] = Field(None, description="每日服用次数")
+    daily_times: Optional[List[str]] = Field(None, description="每日具体服用时间")
+    weekly_days: Optional[List[int]] = Field(None, description="每周服用的星期几")
+    start_date: Optional[date] = Field(None, description="开始日期")
+    end_date: Optional[date] = Field(None, description="结束日期")
+    notes: Optional[str] = Field(None, description="备注")
+    photos: Optional[str] = Field(None, description="药品照片URL的JSON数组")
+    photo_thumbnails: Optional[List[str]] = Field(None, description="药品照片缩略图URL")
+    barcode: Optional[str] = Field(None, description="条形码")
+    is_active: Optional[bool] = Field(None, description="是否激活")
+    created_at: Optional[datetime] = Field(None, description="创建时间")
+    updated_at: Optional[datetime] = Field(None, description="更新时间")
+
+    # 外部药物数据库相关字段
+    drug_code: Optional[str] = Field(None, description="药品编码")
+    manufacturer: Optional[str] = Field(None, description="生产厂家")
+    specification: Optional[str] = Field(None, description="包装规格")
+    dosage_form: Optional[str] = Field(None, description="产品剂型")
+    is_prescription: Optional[bool] = Field(None, description="是否为处方药")
+    drug_image_url: Optional[str] = Field(None, description="药品官方图片URL")
+    instruction_manual: Optional[Union[dict, str]] = Field(None, description="说明书内容")
+    approval_number: Optional[str] = Field(None, description="批准文号")
+    generic_name: Optional[str] = Field(None, description="通用名")
+    trade_name: Optional[str] = Field(None, description="商品名")
+    data_source: Optional[str] = Field(None, description="数据来源")
+    external_drug_id: Optional[str] = Field(None, description="外部数据库药物ID")
+
+
+class PhotoResponse(BaseModel):
+    """照片上传响应模式"""
+    id: str = Field(..., description="照片ID（内容SHA-256摘要）")
+    url: str = Field(..., description="原图URL")
+    thumbnail_url: str = Field(..., description="缩略图URL")
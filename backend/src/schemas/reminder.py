@@ -3,7 +3,7 @@
 用于请求验证和响应序列化
 """
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List
 from datetime import date, datetime
 
 class ReminderResponse(BaseModel):
@@ -26,3 +26,51 @@ class ReminderResponse(BaseModel):
 class RemindersRequest(BaseModel):
     """生成用药记录请求模式"""
     days: int = Field(default=7, ge=1, le=90, description="生成未来N天的记录（1-90天）")
+
+
+class ReminderBatchRequest(BaseModel):
+    """批量修改用药记录完成状态请求模式"""
+    ids: List[int] = Field(..., min_length=1, max_length=200, description="记录ID列表（最多200个，负数为虚拟提醒ID）")
+
+
+class AdherenceRates(BaseModel):
+    """依从性计数与比率"""
+    scheduled: int = Field(..., description="计划服药次数")
+    completed: int = Field(..., description="已完成次数")
+    on_time: int = Field(..., description="准时完成次数")
+    completion_rate: float = Field(..., description="完成率")
+    on_time_rate: float = Field(..., description="准时率（占已完成次数）")
+
+
+class DailyAdherence(AdherenceRates):
+    """按日依从性"""
+    day: date = Field(..., description="日期")
+
+
+class WeeklyAdherence(AdherenceRates):
+    """按周依从性"""
+    week_start: date = Field(..., description="周一日期")
+
+
+class MedicationAdherence(AdherenceRates):
+    """按药物依从性"""
+    medication_id: int = Field(..., description="药物ID")
+    medication_name: str = Field(..., description="药物名称")
+
+
+class AdherenceStreak(BaseModel):
+    """连续全部完成的天数"""
+    current: int = Field(..., description="当前连续天数")
+    longest: int = Field(..., description="最长连续天数")
+
+
+class ReminderStatsResponse(BaseModel):
+    """服药依从性统计响应模式"""
+    start_date: date = Field(..., description="开始日期")
+    end_date: date = Field(..., description="结束日期")
+    on_time_window_minutes: int = Field(..., description="准时判断允许的偏差（分钟）")
+    summary: AdherenceRates = Field(..., description="汇总")
+    daily: List[DailyAdherence] = Field(..., description="按日统计")
+    weekly: List[WeeklyAdherence] = Field(..., description="按周统计")
+    medications: List[MedicationAdherence] = Field(..., description="按药物统计")
+    streak: AdherenceStreak = Field(..., description="连续完成天数")
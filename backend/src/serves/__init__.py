@@ -6,10 +6,24 @@ from . import medication_service
 from . import reminder_service
 from . import third_party_service
 from . import supabase_service
+from . import scheduler_service
+from . import drug_catalog_service
+from . import drug_search_index
+from . import photo_service
+from . import export_service
+from . import stats_service
+from . import rollup_service
 
 __all__ = [
         "medication_service",
         "reminder_service",
         "third_party_service",
-        "supabase_service"
+        "supabase_service",
+        "scheduler_service",
+        "drug_catalog_service",
+        "drug_search_index",
+        "photo_service",
+        "export_service",
+        "stats_service",
+        "rollup_service"
         ]
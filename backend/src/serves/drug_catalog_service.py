@@ -0,0 +1,298 @@
+"""
+本地药品目录服务层
+将外部药物数据库的查询结果持久化到drug_catalog表，作为读穿（read-through）存储，
+并支持从CSV/JSONL格式的药品目录文件批量导入
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional, Iterable, Iterator, TextIO, Literal
+import csv
+import json
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from ..core.config import config
+from ..db.database import async_sessions
+from ..db.models.drug_catalog import DrugCatalog
+
+
+def _fresh_since() -> datetime:
+    """
+    获取目录记录仍视为新鲜的最早时间
+    :return: 时间戳
+    """
+    return datetime.now() - timedelta(days=config.DRUG_CATALOG_MAX_AGE_DAYS)
+
+
+def _row_to_detail(row: DrugCatalog) -> dict:
+    """
+    将目录记录转换为药品详情字典（与外部接口详情结构一致）
+    :param row: 目录记录
+    :return: 药品详情
+    """
+    instruction_manual = None
+    if row.instruction_manual:
+        try:
+            instruction_manual = json.loads(row.instruction_manual)
+        except (json.JSONDecodeError, TypeError):
+            instruction_manual = None
+
+    return {
+        "external_drug_id": row.external_drug_id,
+        "name": row.name,
+        "generic_name": row.generic_name,
+        "trade_name": row.trade_name,
+        "manufacturer": row.manufacturer,
+        "specification": row.specification,
+        "dosage_form": row.dosage_form,
+        "is_prescription": row.is_prescription,
+        "drug_image_url": row.drug_image_url,
+        "drug_code": row.drug_code,
+        "approval_number": row.approval_number,
+        "barcode": row.barcode,
+        "instruction_manual": instruction_manual
+    }
+
+
+def _row_to_search_result(row: DrugCatalog) -> dict:
+    """
+    将目录记录转换为搜索结果字典（与外部接口搜索结构一致）
+    :param row: 目录记录
+    :return: 搜索结果
+    """
+    return {
+        "external_drug_id": row.external_drug_id,
+        "name": row.name,
+        "generic_name": row.generic_name,
+        "trade_name": row.trade_name,
+        "manufacturer": row.manufacturer,
+        "specification": row.specification,
+        "dosage_form": row.dosage_form,
+        "is_prescription": row.is_prescription,
+        "drug_image_url": row.drug_image_url,
+        "drug_code": row.drug_code,
+        "approval_number": row.approval_number,
+        "medicine_id": row.external_drug_id.replace("jisu_", "")
+    }
+
+
+async def get_catalog_detail(external_drug_id: str) -> tuple[Optional[dict], bool]:
+    """
+    从本地目录获取药品详情
+    :param external_drug_id: 外部数据库药物ID（jisu_前缀格式）
+    :return: (药品详情或None, 是否仍在刷新周期内)
+    """
+    async with async_sessions() as db:
+        row = await db.scalar(select(DrugCatalog).where(
+            DrugCatalog.external_drug_id == external_drug_id,
+            DrugCatalog.detail_fetched_at.is_not(None)
+        ))
+    if row is None:
+        return None, False
+    return _row_to_detail(row), row.detail_fetched_at >= _fresh_since()
+
+
+async def find_catalog_by_barcode(barcode: str) -> List[dict]:
+    """
+    按条形码从本地目录查找仍在刷新周期内的药品
+    :param barcode: 条形码
+    :return: 搜索结果列表
+    """
+    async with async_sessions() as db:
+        result = await db.execute(select(DrugCatalog).where(
+            DrugCatalog.barcode == barcode,
+            DrugCatalog.updated_at >= _fresh_since()
+        ).order_by(DrugCatalog.id))
+        rows = result.scalars().all()
+    return [_row_to_search_result(row) for row in rows]
+
+
+async def save_catalog_detail(detail: dict):
+    """
+    写入药品详情（已存在则整行更新）
+    :param detail: 外部接口返回的药品详情
+    """
+    now = datetime.now()
+    values = {
+        "external_drug_id": detail["external_drug_id"],
+        "name": detail["name"],
+        "generic_name": detail.get("generic_name"),
+        "trade_name": detail.get("trade_name"),
+        "manufacturer": detail.get("manufacturer"),
+        "specification": detail.get("specification"),
+        "dosage_form": detail.get("dosage_form"),
+        "is_prescription": bool(detail.get("is_prescription")),
+        "drug_image_url": detail.get("drug_image_url"),
+        "drug_code": detail.get("drug_code"),
+        "approval_number": detail.get("approval_number"),
+        "barcode": detail.get("barcode") or None,
+        "instruction_manual": json.dumps(detail["instruction_manual"], ensure_ascii=False)
+        if detail.get("instruction_manual") else None,
+        "detail_fetched_at": now,
+        "updated_at": now
+    }
+    stmt = pg_insert(DrugCatalog).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DrugCatalog.external_drug_id],
+        set_={key: stmt.excluded[key] for key in values if key != "external_drug_id"}
+    )
+    async with async_sessions() as db:
+        await db.execute(stmt)
+        await db.commit()
+
+
+async def save_catalog_search_results(results: List[dict], barcode: Optional[str] = None):
+    """
+    写入搜索结果（仅更新搜索接口提供的字段，不覆盖已获取的详情）
+    :param results: 外部接口返回的搜索结果
+    :param barcode: 按条形码搜索时的条形码
+    """
+    if not results:
+        return
+
+    now = datetime.now()
+    rows = {}
+    for item in results:
+        rows[item["external_drug_id"]] = {
+            "external_drug_id": item["external_drug_id"],
+            "name": item["name"],
+            "generic_name": item.get("generic_name"),
+            "trade_name": item.get("trade_name"),
+            "manufacturer": item.get("manufacturer"),
+            "is_prescription": bool(item.get("is_prescription")),
+            "drug_image_url": item.get("drug_image_url"),
+            "barcode": barcode,
+            "updated_at": now
+        }
+
+    stmt = pg_insert(DrugCatalog).values(list(rows.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DrugCatalog.external_drug_id],
+        set_={
+            "name": stmt.excluded.name,
+            "manufacturer": stmt.excluded.manufacturer,
+            "is_prescription": stmt.excluded.is_prescription,
+            "drug_image_url": stmt.excluded.drug_image_url,
+            "barcode": func.coalesce(stmt.excluded.barcode, DrugCatalog.barcode),
+            "updated_at": stmt.excluded.updated_at
+        }
+    )
+    async with async_sessions() as db:
+        await db.execute(stmt)
+        await db.commit()
+
+
+# ========== 批量导入 ==========
+# 导入文件中可识别的字段（与drug_catalog表列名一致）
+CATALOG_IMPORT_FIELDS = (
+    "name", "generic_name", "trade_name", "manufacturer", "specification", "dosage_form",
+    "is_prescription", "drug_image_url", "drug_code", "approval_number", "barcode", "instruction_manual"
+)
+
+
+def iter_catalog_file(file: TextIO, file_format: Literal["csv", "jsonl"]) -> Iterator[dict]:
+    """
+    逐行读取药品目录文件（不会一次性载入整个文件）
+    :param file: 文本文件对象
+    :param file_format: 文件格式（csv-带表头的CSV, jsonl-每行一个JSON对象）
+    :return: 原始记录迭代器
+    """
+    if file_format == "csv":
+        yield from csv.DictReader(file)
+        return
+
+    for line in file:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _parse_bool(value) -> bool:
+    """
+    解析导入文件中的布尔值（支持true/1/是/处方等写法）
+    :param value: 原始值
+    :return: 布尔值
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value == 1
+    return str(value or "").strip().lower() in ("true", "1", "yes", "y", "是", "处方", "处方药")
+
+
+def _normalize_import_record(record: dict, now: datetime) -> Optional[dict]:
+    """
+    将导入记录转换为drug_catalog行
+    external_drug_id缺失时使用medicine_id生成（jisu_前缀），名称或ID缺失的记录视为无效
+    :param record: 原始记录
+    :param now: 导入时间
+    :return: 行数据或None（无效记录）
+    """
+    external_drug_id = (record.get("external_drug_id") or "").strip()
+    if not external_drug_id and record.get("medicine_id"):
+        external_drug_id = f"jisu_{record['medicine_id']}"
+    name = (record.get("name") or "").strip()
+    if not external_drug_id or not name:
+        return None
+
+    row = {"external_drug_id": external_drug_id}
+    for field in CATALOG_IMPORT_FIELDS:
+        value = record.get(field)
+        if isinstance(value, str):
+            value = value.strip() or None
+        row[field] = value
+    row["name"] = name
+    row["is_prescription"] = _parse_bool(row["is_prescription"])
+    if row["instruction_manual"] is not None and not isinstance(row["instruction_manual"], str):
+        row["instruction_manual"] = json.dumps(row["instruction_manual"], ensure_ascii=False)
+    # 导入的目录视为完整详情
+    row["detail_fetched_at"] = now
+    row["updated_at"] = now
+    return row
+
+
+async def _upsert_catalog_rows(rows: List[dict]):
+    """
+    批量写入目录行（已存在则整行更新）
+    :param rows: 行数据列表（external_drug_id不重复）
+    """
+    stmt = pg_insert(DrugCatalog).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DrugCatalog.external_drug_id],
+        set_={key: stmt.excluded[key] for key in rows[0] if key != "external_drug_id"}
+    )
+    async with async_sessions() as db:
+        await db.execute(stmt)
+        await db.commit()
+
+
+async def import_catalog_records(records: Iterable[dict], batch_size: Optional[int] = None) -> dict:
+    """
+    流式批量导入药品目录，每批一条INSERT ... ON CONFLICT语句
+    :param records: 原始记录迭代器
+    :param batch_size: 每批写入的记录数，默认使用DRUG_CATALOG_IMPORT_BATCH_SIZE
+    :return: 导入统计（读取数、写入数、跳过数、批次数）
+    """
+    batch_size = batch_size or config.DRUG_CATALOG_IMPORT_BATCH_SIZE
+    now = datetime.now()
+    stats = {"read": 0, "imported": 0, "skipped": 0, "batches": 0}
+    batch = {}
+
+    for record in records:
+        stats["read"] += 1
+        row = _normalize_import_record(record, now)
+        if row is None:
+            stats["skipped"] += 1
+            continue
+        # 同一批次内重复的ID以最后一条为准（ON CONFLICT不允许同一语句内重复）
+        batch[row["external_drug_id"]] = row
+        if len(batch) >= batch_size:
+            await _upsert_catalog_rows(list(batch.values()))
+            stats["imported"] += len(batch)
+            stats["batches"] += 1
+            batch = {}
+
+    if batch:
+        await _upsert_catalog_rows(list(batch.values()))
+        stats["imported"] += len(batch)
+        stats["batches"] += 1
+
+    return stats
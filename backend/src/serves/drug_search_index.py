@@ -0,0 +1,276 @@
+"""
+本地药品搜索索引
+基于drug_catalog表在内存中构建字符n-gram倒排索引，支持中文药名的毫秒级模糊搜索，
+以及条形码、批准文号的精确查找
+"""
+import asyncio
+import heapq
+import time
+from array import array
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Literal
+from sqlalchemy import select
+from ..db.database import async_sessions
+from ..db.models.drug_catalog import DrugCatalog
+from .drug_catalog_service import _row_to_search_result
+
+
+# 最少需要命中的查询n-gram比例
+MIN_GRAM_MATCH_RATIO = 0.6
+
+# 构建索引时每批读取的记录数
+INDEX_LOAD_BATCH_SIZE = 5000
+
+
+def _normalize_text(text: Optional[str]) -> str:
+    """
+    规范化待索引文本（统一小写并去除空白）
+    :param text: 原始文本
+    :return: 规范化后的文本
+    """
+    if not text:
+        return ""
+    return "".join(text.lower().split())
+
+
+def _ngrams(text: str) -> set:
+    """
+    生成文本的字符n-gram（单字与双字），中文无需分词
+    :param text: 规范化后的文本
+    :return: n-gram集合
+    """
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def _query_grams(text: str) -> set:
+    """
+    生成查询的n-gram：单字查询使用单字，其余使用双字以减少候选数量
+    :param text: 规范化后的查询
+    :return: n-gram集合
+    """
+    if len(text) == 1:
+        return {text}
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class _GramTable:
+    """n-gram倒排表
+
+    以去重后的规范化文本为单位建立倒排（同名药品通常有大量不同厂家），
+    每个文本再映射到包含它的文档列表，查询时只需对不同文本计分
+    """
+
+    def __init__(self):
+        self.keys: Dict[tuple, int] = {}
+        self.texts: List[str] = []
+        self.docs: List[array] = []
+        self.postings: Dict[str, array] = defaultdict(lambda: array('I'))
+
+    def add(self, texts: tuple, doc_id: int):
+        """
+        添加文档
+        :param texts: 文档的规范化文本（第一项用于相关度加分）
+        :param doc_id: 文档ID
+        """
+        key_id = self.keys.get(texts)
+        if key_id is None:
+            key_id = len(self.texts)
+            self.keys[texts] = key_id
+            self.texts.append(texts[0])
+            self.docs.append(array('I'))
+            grams = set()
+            for text in texts:
+                grams |= _ngrams(text)
+            for gram in grams:
+                self.postings[gram].append(key_id)
+        self.docs[key_id].append(doc_id)
+
+    def freeze(self):
+        """构建完成后转换为普通字典，避免查询时插入空倒排项"""
+        self.postings = dict(self.postings)
+
+    def search(self, text: str, rank_by_text: bool, limit: int) -> List[int]:
+        """
+        按n-gram命中比例计分，返回相关度最高的文档ID
+        :param text: 规范化后的查询
+        :param rank_by_text: 是否按文本完全匹配、前缀匹配、包含关系加分
+        :param limit: 返回数量
+        :return: 文档ID列表
+        """
+        grams = _query_grams(text)
+
+        # 统计每个候选文本命中的n-gram数量
+        counts: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for key_id in self.postings.get(gram, ()):
+                counts[key_id] += 1
+
+        required = max(1, int(len(grams) * MIN_GRAM_MATCH_RATIO + 0.5))
+        scored = []
+        for key_id, hits in counts.items():
+            if hits < required:
+                continue
+            score = hits / len(grams)
+            if rank_by_text:
+                key_text = self.texts[key_id]
+                if key_text == text:
+                    score += 3
+                elif key_text.startswith(text):
+                    score += 2
+                elif text in key_text:
+                    score += 1
+                # 同分时文本越短越相关
+                score -= len(key_text) * 0.001
+            scored.append((score, -key_id))
+
+        doc_ids = []
+        for _, neg_key_id in heapq.nlargest(limit, scored):
+            doc_ids.extend(self.docs[-neg_key_id][:limit - len(doc_ids)])
+            if len(doc_ids) >= limit:
+                break
+        return doc_ids
+
+
+class DrugSearchIndex:
+    """药品搜索索引
+
+    - 药名（名称、通用名、商品名）与生产厂家分别建立n-gram倒排表
+    - 条形码、批准文号建立精确映射
+    - 索引构建完成后整体替换，查询期间无需加锁
+    """
+
+    def __init__(self):
+        self.docs: List[dict] = []
+        self._names = _GramTable()
+        self._manufacturers = _GramTable()
+        self._barcodes: Dict[str, List[int]] = {}
+        self._approval_numbers: Dict[str, List[int]] = {}
+        self.built_at: Optional[datetime] = None
+        self.build_seconds = 0.0
+
+    @property
+    def ready(self) -> bool:
+        """索引是否已构建且非空"""
+        return bool(self.docs)
+
+    @classmethod
+    def build(cls, rows) -> "DrugSearchIndex":
+        """
+        从目录记录构建索引
+        :param rows: 可迭代的DrugCatalog记录或搜索结果字典
+        :return: 新索引
+        """
+        started = time.perf_counter()
+        index = cls()
+        barcodes = defaultdict(list)
+        approval_numbers = defaultdict(list)
+
+        for row in rows:
+            doc = row if isinstance(row, dict) else _row_to_search_result(row)
+            doc_id = len(index.docs)
+            index.docs.append(doc)
+
+            index._names.add((
+                _normalize_text(doc["name"]),
+                _normalize_text(doc.get("generic_name")),
+                _normalize_text(doc.get("trade_name"))
+            ), doc_id)
+            index._manufacturers.add((_normalize_text(doc.get("manufacturer")),), doc_id)
+
+            barcode = row.get("barcode") if isinstance(row, dict) else row.barcode
+            if barcode:
+                barcodes[barcode].append(doc_id)
+            if doc.get("approval_number"):
+                approval_numbers[_normalize_text(doc["approval_number"])].append(doc_id)
+
+        index._names.freeze()
+        index._manufacturers.freeze()
+        index._barcodes = dict(barcodes)
+        index._approval_numbers = dict(approval_numbers)
+        index.built_at = datetime.now()
+        index.build_seconds = time.perf_counter() - started
+        return index
+
+    def search(
+            self,
+            query: str,
+            search_type: Literal["name", "barcode", "manufacturer"] = "name",
+            limit: int = 10
+    ) -> List[dict]:
+        """
+        搜索药品
+        :param query: 搜索关键词
+        :param search_type: 搜索类型（name-名称, barcode-条码, manufacturer-厂家）
+        :param limit: 返回结果数量限制
+        :return: 按相关度排序的搜索结果
+        """
+        text = _normalize_text(query)
+        if not text:
+            return []
+
+        if search_type == "barcode":
+            doc_ids = self._barcodes.get(query.strip(), [])[:limit]
+        elif search_type == "name" and text in self._approval_numbers:
+            # 批准文号直接精确匹配
+            doc_ids = self._approval_numbers[text][:limit]
+        elif search_type == "manufacturer":
+            doc_ids = self._manufacturers.search(text, False, limit)
+        else:
+            doc_ids = self._names.search(text, True, limit)
+
+        return [self.docs[doc_id] for doc_id in doc_ids]
+
+    def stats(self) -> dict:
+        """
+        获取索引统计信息
+        :return: 文档数、倒排项数、构建时间等
+        """
+        return {
+            "ready": self.ready,
+            "documents": len(self.docs),
+            "distinct_names": len(self._names.texts),
+            "name_grams": len(self._names.postings),
+            "distinct_manufacturers": len(self._manufacturers.texts),
+            "manufacturer_grams": len(self._manufacturers.postings),
+            "barcodes": len(self._barcodes),
+            "approval_numbers": len(self._approval_numbers),
+            "built_at": self.built_at,
+            "build_seconds": round(self.build_seconds, 3)
+        }
+
+
+# 当前使用的索引（重建后整体替换）
+drug_search_index = DrugSearchIndex()
+
+# 同一进程内同时只进行一次重建
+_rebuild_lock = asyncio.Lock()
+
+
+async def rebuild_drug_search_index() -> DrugSearchIndex:
+    """
+    从drug_catalog表流式读取全部记录，在线程中重建索引，避免构建期间阻塞事件循环
+    索引保存在进程内存中，只替换当前工作进程的索引
+    :return: 新索引
+    """
+    global drug_search_index
+    async with _rebuild_lock:
+        rows = []
+        async with async_sessions() as db:
+            result = await db.stream_scalars(
+                select(DrugCatalog).order_by(DrugCatalog.id).execution_options(yield_per=INDEX_LOAD_BATCH_SIZE)
+            )
+            async for row in result:
+                rows.append(row)
+        drug_search_index = await asyncio.to_thread(DrugSearchIndex.build, rows)
+    return drug_search_index
+
+
+def get_drug_search_index() -> DrugSearchIndex:
+    """
+    获取当前使用的索引
+    :return: 索引
+    """
+    return drug_search_index
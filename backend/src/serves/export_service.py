@@ -0,0 +1,168 @@
+"""
+用药记录导出服务层
+以服务端游标分批读取用药记录，流式输出NDJSON或CSV，内存占用与导出范围无关
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, List, Literal, Optional
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import config
+from ..db.database import async_sessions
+from ..db.models.medication import Medication
+from ..db.models.reminder import Reminder
+from . import reminder_service
+
+
+# 导出的字段（与提醒接口返回的字段一致）
+EXPORT_COLUMNS = (
+    "id", "user_id", "medication_id", "medication_name", "dosage", "scheduled_date",
+    "scheduled_time", "is_completed", "completed_at", "created_at", "updated_at"
+)
+
+# 服务端游标每批读取的行数
+EXPORT_BATCH_SIZE = 1000
+
+# 虚拟模式下每次按排期计算的天数
+EXPORT_VIRTUAL_WINDOW_DAYS = 31
+
+# 导出格式对应的媒体类型
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8"
+}
+
+
+def _json_default(value):
+    """JSON序列化日期时间"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+async def encode_export_stream(
+    partitions: AsyncIterator[List[dict]],
+    export_format: Literal["ndjson", "csv"]
+) -> AsyncIterator[bytes]:
+    """
+    将分批读取的记录编码为NDJSON或CSV字节流（每批输出一个块）
+    :param partitions: 记录批次迭代器
+    :param export_format: 导出格式
+    :return: 字节块迭代器
+    """
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        # 带BOM以便Excel正确识别中文
+        yield ("\ufeff" + ",".join(EXPORT_COLUMNS) + "\r\n").encode("utf-8")
+        async for rows in partitions:
+            for row in rows:
+                writer.writerow([
+                    value.isoformat() if isinstance(value, (date, datetime)) else value
+                    for value in (row[column] for column in EXPORT_COLUMNS)
+                ])
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        return
+
+    async for rows in partitions:
+        yield "".join(
+            json.dumps({column: row[column] for column in EXPORT_COLUMNS},
+                       ensure_ascii=False, default=_json_default) + "\n"
+            for row in rows
+        ).encode("utf-8")
+
+
+async def _iter_stored_partitions(
+    db: AsyncSession,
+    user_id: str,
+    start_date: Optional[date],
+    end_date: Optional[date]
+) -> AsyncIterator[List[dict]]:
+    """
+    使用服务端游标分批读取已存储的用药记录
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param start_date: 开始日期（为空表示不限）
+    :param end_date: 结束日期（为空表示不限）
+    :return: 记录批次迭代器
+    """
+    query = select(
+        Reminder.id, Reminder.user_id, Reminder.medication_id,
+        Medication.name.label("medication_name"), Medication.dosage,
+        Reminder.scheduled_date, Reminder.scheduled_time, Reminder.is_completed,
+        Reminder.completed_at, Reminder.created_at, Reminder.updated_at
+    ).join(
+        Medication, Reminder.medication_id == Medication.id
+    ).where(
+        Reminder.user_id == user_id
+    ).order_by(
+        Reminder.scheduled_date.asc(),
+        Reminder.scheduled_time.asc().nullslast(),
+        Reminder.id.asc()
+    ).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    if start_date is not None:
+        query = query.where(Reminder.scheduled_date >= start_date)
+    if end_date is not None:
+        query = query.where(Reminder.scheduled_date <= end_date)
+
+    result = await db.stream(query)
+    async for partition in result.mappings().partitions():
+        yield partition
+
+
+async def _iter_virtual_partitions(
+    db: AsyncSession,
+    user_id: str,
+    start_date: Optional[date],
+    end_date: Optional[date]
+) -> AsyncIterator[List[dict]]:
+    """
+    虚拟模式下按时间窗口计算用药记录（未指定范围时从最早的药物开始日期到今天）
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param start_date: 开始日期
+    :param end_date: 结束日期
+    :return: 记录批次迭代器
+    """
+    if start_date is None:
+        start_date = await db.scalar(select(func.min(Medication.start_date)).where(Medication.user_id == user_id))
+        if start_date is None:
+            return
+    end_date = end_date or date.today()
+
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min(end_date, window_start + timedelta(days=EXPORT_VIRTUAL_WINDOW_DAYS - 1))
+        rows, _ = await reminder_service.get_date_range_reminders(db, user_id, window_start, window_end)
+        if rows:
+            yield rows
+        # 释放本窗口加载的对象
+        db.expunge_all()
+        window_start = window_end + timedelta(days=1)
+
+
+async def stream_reminder_export(
+    user_id: str,
+    start_date: Optional[date],
+    end_date: Optional[date],
+    export_format: Literal["ndjson", "csv"]
+) -> AsyncIterator[bytes]:
+    """
+    流式导出用药记录（使用独立的数据库会话，响应发送期间保持打开）
+    :param user_id: 用户ID
+    :param start_date: 开始日期（为空表示不限）
+    :param end_date: 结束日期（为空表示不限）
+    :param export_format: 导出格式（ndjson, csv）
+    :return: 字节块迭代器
+    """
+    async with async_sessions() as db:
+        if config.REMINDER_READ_MODE == "virtual":
+            partitions = _iter_virtual_partitions(db, user_id, start_date, end_date)
+        else:
+            partitions = _iter_stored_partitions(db, user_id, start_date, end_date)
+        async for chunk in encode_export_stream(partitions, export_format):
+            yield chunk
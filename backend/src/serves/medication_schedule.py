@@ -0,0 +1,136 @@
+"""
+药物排期的编译表示
+排期在创建/更新药物时编译为星期位掩码（bit0=周一 ... bit6=周日）与升序的当日分钟数数组，
+展开时段时只做整数运算，不解析也不生成中间字符串
+"""
+from datetime import date, timedelta
+from typing import Iterable, Iterator, Optional, Tuple
+
+
+# 每天都服用的星期位掩码
+ALL_WEEKDAYS = 0b1111111
+
+# 当日分钟数 -> "HH:MM"（预先生成，展开时段时直接取用）
+_MINUTE_LABELS = tuple(f"{minute // 60:02d}:{minute % 60:02d}" for minute in range(24 * 60))
+
+_ONE_DAY = timedelta(days=1)
+
+
+def parse_minutes(time_str: Optional[str]) -> Optional[int]:
+    """
+    将HH:MM格式时间转换为当日分钟数
+    :param time_str: 时间字符串
+    :return: 分钟数，无时间或格式错误返回None
+    """
+    if not time_str:
+        return None
+    try:
+        hour, minute = map(int, time_str.split(':'))
+    except (ValueError, AttributeError):
+        return None
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        return None
+    return hour * 60 + minute
+
+
+def minute_label(minutes: Optional[int]) -> Optional[str]:
+    """
+    将当日分钟数转换为HH:MM格式时间（不分配新字符串）
+    :param minutes: 分钟数，None表示没有具体时间
+    :return: 时间字符串或None
+    """
+    return None if minutes is None else _MINUTE_LABELS[minutes]
+
+
+def compile_schedule(
+    frequency_type: Optional[str],
+    daily_times: Optional[Iterable[str]],
+    weekly_days: Optional[Iterable[int]]
+) -> Tuple[int, Tuple[int, ...]]:
+    """
+    编译药物排期
+    :param frequency_type: 频率类型（daily/weekly）
+    :param daily_times: 每日服用时间（HH:MM）
+    :param weekly_days: 每周服用的星期几（1=周一, 7=周日）
+    :return: (星期位掩码, 升序去重的当日分钟数)；weekly类型没有具体时间，分钟数为空；没有有效时段时掩码为0
+    """
+    if frequency_type == "daily":
+        minutes = tuple(sorted({
+            value for value in map(parse_minutes, daily_times or ()) if value is not None
+        }))
+        return (ALL_WEEKDAYS if minutes else 0), minutes
+    if frequency_type == "weekly":
+        mask = 0
+        for day in weekly_days or ():
+            if isinstance(day, int) and 1 <= day <= 7:
+                mask |= 1 << (day - 1)
+        return mask, ()
+    return 0, ()
+
+
+class MedicationSchedule:
+    """编译后的药物排期"""
+
+    __slots__ = ("weekday_mask", "minutes", "start_date", "end_date")
+
+    def __init__(self, weekday_mask: int, minutes: Tuple[int, ...], start_date: date, end_date: Optional[date]):
+        """
+        :param weekday_mask: 星期位掩码
+        :param minutes: 升序的当日分钟数（为空表示没有具体时间，每个服药日一个时段）
+        :param start_date: 开始日期
+        :param end_date: 结束日期（为空表示长期）
+        """
+        self.weekday_mask = weekday_mask
+        self.minutes = minutes
+        self.start_date = start_date
+        self.end_date = end_date
+
+    @classmethod
+    def of(cls, medication) -> "MedicationSchedule":
+        """
+        获取药物的编译排期（优先使用已保存的编译结果，尚未回填的记录现场编译）
+        :param medication: 药物对象
+        :return: 编译后的排期
+        """
+        if medication.schedule_weekdays is not None:
+            mask, minutes = medication.schedule_weekdays, tuple(medication.schedule_minutes or ())
+        else:
+            mask, minutes = compile_schedule(medication.frequency_type, medication.daily_times, medication.weekly_days)
+        return cls(mask, minutes, medication.start_date, medication.end_date)
+
+    def occurrences(self, start: date, end: date) -> Iterator[Tuple[date, Optional[int]]]:
+        """
+        展开日期区间内的所有服药时段
+        :param start: 开始日期（包含）
+        :param end: 结束日期（包含）
+        :return: (计划日期, 当日分钟数) 迭代器，没有具体时间的时段分钟数为None
+        """
+        # 截取到药物有效期内
+        first = max(start, self.start_date)
+        last = min(end, self.end_date) if self.end_date else end
+        mask = self.weekday_mask
+        if first > last or not mask:
+            return
+
+        times = self.minutes or (None,)
+        current = first
+        weekday = first.weekday()
+        while current <= last:
+            if mask >> weekday & 1:
+                for minutes in times:
+                    yield current, minutes
+            current += _ONE_DAY
+            weekday = 0 if weekday == 6 else weekday + 1
+
+    def is_scheduled(self, slot_date: date, minutes: Optional[int]) -> bool:
+        """
+        判断时段是否属于排期
+        :param slot_date: 计划日期
+        :param minutes: 当日分钟数，None表示没有具体时间
+        :return: 是否属于排期
+        """
+        if slot_date < self.start_date or (self.end_date and slot_date > self.end_date):
+            return False
+        if not self.weekday_mask >> slot_date.weekday() & 1:
+            return False
+        return minutes is None if not self.minutes else minutes in self.minutes
@@ -2,44 +2,104 @@
 药物业务逻辑层
 处理药物相关的业务逻辑
 """
-from datetime import datetime, timezone
-from typing import Optional, List
-from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Any, Optional, List, Sequence, Tuple
+from sqlalchemy import select, insert, update, delete, func, or_, text, table, column, bindparam, SmallInteger
+from sqlalchemy.dialects.postgresql import JSONB, ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only, undefer_group
 import json
+from ..core.pagination import encode_cursor, decode_cursor
+from ..core.read_cache import read_cache
+from ..db.database import async_engine, async_sessions
 from ..db.models.medication import Medication
+from ..db.models.reminder import Reminder
 from ..schemas.medication import MedicationCreate, MedicationUpdate
+from . import photo_service
+from . import rollup_service
+from .medication_schedule import compile_schedule
 
 
-def create_medication(db: Session, user_id: str, medication_data: MedicationCreate) -> Medication:
+# 药物表的全部列（包括延迟加载的大字段）
+MEDICATION_COLUMNS = tuple(attr.key for attr in Medication.__mapper__.column_attrs)
+
+# 大字段（延迟加载）
+MEDICATION_HEAVY_COLUMNS = ("notes", "photos", "instruction_manual")
+
+# 内部列（编译后的排期，不出现在响应中）
+MEDICATION_INTERNAL_COLUMNS = ("schedule_weekdays", "schedule_minutes")
+
+# 决定编译排期的字段（顺序与compile_schedule的参数一致）
+SCHEDULE_FIELDS = ("frequency_type", "daily_times", "weekly_days")
+
+# 由Text迁移为JSONB的列
+MEDICATION_JSON_COLUMNS = ("daily_times", "weekly_days", "instruction_manual")
+
+# 查询投影（返回的列）
+MEDICATION_PROJECTIONS = {
+    # 列表摘要：名称、剂量与排期
+    "summary": (
+        "id", "user_id", "name", "dosage", "frequency_type", "times_per_day",
+        "daily_times", "weekly_days", "start_date", "end_date", "is_active"
+    ),
+    # 列表：除大字段外的所有列
+    "list": tuple(
+        column for column in MEDICATION_COLUMNS
+        if column not in MEDICATION_HEAVY_COLUMNS and column not in MEDICATION_INTERNAL_COLUMNS
+    ),
+    # 详情：所有列
+    "detail": tuple(column for column in MEDICATION_COLUMNS if column not in MEDICATION_INTERNAL_COLUMNS)
+}
+
+
+def _projection_options(columns: Optional[Sequence[str]]) -> list:
+    """
+    构建只查询指定列的加载选项
+    :param columns: 列名列表，None表示查询所有列（包括大字段）
+    :return: 查询选项（未加载的列被访问时直接报错，避免在异步会话中隐式查询）
+    """
+    if columns is None:
+        return [undefer_group("heavy")]
+    return [load_only(*(getattr(Medication, column) for column in columns), raiseload=True)]
+
+
+async def create_medication(db: AsyncSession, user_id: str, medication_data: MedicationCreate) -> Medication:
     """
     创建新药物记录
     :param db: 数据库会话
     :param user_id: 用户ID
     :param medication_data: 药物创建数据
     :return: 创建的药物对象
+    :raises ValueError: 照片格式错误
     """
-    # 处理JSON字段
-    daily_times_json = None
-    weekly_days_json = None
+    # 只保存与频率类型对应的排期字段（JSONB列直接写入列表）
+    daily_times = None
+    weekly_days = None
 
     if medication_data.frequency_type == "daily" and medication_data.daily_times:
-        daily_times_json = json.dumps(medication_data.daily_times)
+        daily_times = medication_data.daily_times
     elif medication_data.frequency_type == "weekly" and medication_data.weekly_days:
-        weekly_days_json = json.dumps(medication_data.weekly_days)
+        weekly_days = medication_data.weekly_days
+    schedule_weekdays, schedule_minutes = compile_schedule(medication_data.frequency_type, daily_times, weekly_days)
+
+    # Base64照片转存到照片存储，记录中只保存URL
+    photos_json = await photo_service.externalize_photos(medication_data.photos)
 
-    # 创建药物对象
-    db_medication = Medication(
+    # 插入并以RETURNING取回整行（包括默认值），一次往返完成
+    medication = await _execute_returning(db, insert(Medication).values(
         user_id=user_id,
         name=medication_data.name,
         dosage=medication_data.dosage,
         frequency_type=medication_data.frequency_type,
         times_per_day=medication_data.times_per_day,
-        daily_times=daily_times_json,
-        weekly_days=weekly_days_json,
+        daily_times=daily_times,
+        weekly_days=weekly_days,
+        schedule_weekdays=schedule_weekdays,
+        schedule_minutes=list(schedule_minutes),
         start_date=medication_data.start_date,
         end_date=medication_data.end_date,
         notes=medication_data.notes,
-        photos=medication_data.photos,
+        photos=photos_json,
         barcode=medication_data.barcode,
         # 外部药物数据库相关字段
         drug_code=medication_data.drug_code,
@@ -54,42 +114,152 @@ def create_medication(db: Session, user_id: str, medication_data: MedicationCrea
         trade_name=medication_data.trade_name,
         data_source=medication_data.data_source or "manual",
         external_drug_id=medication_data.external_drug_id
-    )
+    ))
+    await db.commit()
+    await read_cache.invalidate(user_id)
+
+    return medication
 
-    # 保存到数据库
-    db.add(db_medication)
-    db.commit()
-    db.refresh(db_medication)
 
-    return db_medication
+async def _execute_returning(db: AsyncSession, stmt) -> Optional[Medication]:
+    """
+    执行写入语句，以RETURNING取回整行（包括延迟加载的大字段），无需提交后再refresh
+    :param db: 数据库会话
+    :param stmt: INSERT或UPDATE语句
+    :return: 不关联会话的药物对象，没有匹配的行时返回None
+    """
+    result = await db.execute(stmt.returning(*Medication.__table__.columns))
+    row = result.mappings().first()
+    return Medication(**row) if row is not None else None
 
 
-def get_user_medications(db: Session, user_id: str) -> List[Medication]:
+async def get_user_medications(
+    db: AsyncSession,
+    user_id: str,
+    columns: Optional[Sequence[str]] = None
+) -> List[Medication]:
     """
     获取用户的所有药物记录
     :param db: 数据库会话
     :param user_id: 用户ID
+    :param columns: 需要查询的列（见MEDICATION_PROJECTIONS），默认查询所有列
     :return: 药物列表
     """
-    return db.query(Medication).filter(Medication.user_id == user_id).all() # noqa
+    result = await db.execute(
+        select(Medication)
+        .where(Medication.user_id == user_id)
+        .options(*_projection_options(columns))
+    )
+    return list(result.scalars().all())
+
+
+async def get_user_medications_page(
+    db: AsyncSession,
+    user_id: str,
+    columns: Optional[Sequence[str]] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    marker: Optional[tuple] = None
+) -> Tuple[List[Medication], Optional[str]]:
+    """
+    按ID键集分页获取用户的药物记录（按用户版本缓存，用户的任何写入都会使其失效）
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param columns: 需要查询的列（见MEDICATION_PROJECTIONS），默认查询所有列
+    :param limit: 每页数量，None表示返回全部
+    :param cursor: 上一页返回的游标
+    :param marker: get_medications_marker返回的变更标记，计入缓存键，其他进程的写入也会使条目失效
+    :return: (不关联会话的药物列表（只包含查询的列）, 下一页游标，没有更多数据时为None)
+    :raises ValueError: 游标无效
+    """
+    columns = tuple(columns) if columns is not None else MEDICATION_COLUMNS
+    # 缓存只保存列值，命中与未命中时都返回由列值构建的药物对象
+    rows, next_cursor = await read_cache.get_or_load(
+        user_id, ("medications", columns, limit, cursor, marker),
+        lambda: _load_user_medications_page(db, user_id, columns, limit, cursor)
+    )
+    return [Medication(**row) for row in rows], next_cursor
+
+
+async def get_medications_marker(db: AsyncSession, user_id: str) -> Tuple[int, Optional[datetime]]:
+    """
+    获取用户药物的变更标记，用于计算ETag
+    新增、修改会推进最大更新时间，删除会减少数量；
+    不经过进程内读缓存，任何工作进程提交的写入都会立即反映在标记中
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :return: (药物数量, 最大更新时间)
+    """
+    row = (await db.execute(
+        select(func.count(), func.max(Medication.updated_at)).where(Medication.user_id == user_id)
+    )).one()
+    return tuple(row)
 
 
-def get_medication_by_id(db: Session, medication_id: int, user_id: str) -> Optional[Medication]:
+async def _load_user_medications_page(
+    db: AsyncSession,
+    user_id: str,
+    columns: Sequence[str],
+    limit: Optional[int],
+    cursor: Optional[str]
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    从数据库按ID键集分页查询用户的药物记录
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param columns: 需要查询的列
+    :param limit: 每页数量，None表示返回全部
+    :param cursor: 上一页返回的游标
+    :return: (药物列值字典列表, 下一页游标)
+    :raises ValueError: 游标无效
+    """
+    query = (
+        select(Medication)
+        .where(Medication.user_id == user_id)
+        .options(*_projection_options(columns))
+        .order_by(Medication.id)
+    )
+    if cursor:
+        after_id, = decode_cursor(cursor, 1)
+        if not isinstance(after_id, int):
+            raise ValueError("无效的分页游标")
+        query = query.where(Medication.id > after_id)
+    if limit is not None:
+        query = query.limit(limit + 1)
+
+    medications = list((await db.execute(query)).scalars().all())
+    next_cursor = None
+    if limit is not None and len(medications) > limit:
+        medications = medications[:limit]
+        next_cursor = encode_cursor(medications[-1].id)
+
+    return [{column: getattr(medication, column) for column in columns} for medication in medications], next_cursor
+
+
+async def get_medication_by_id(
+    db: AsyncSession,
+    medication_id: int,
+    user_id: str,
+    columns: Optional[Sequence[str]] = None
+) -> Optional[Medication]:
     """
     获取指定药物记录（验证所有权）
     :param db: 数据库会话
     :param medication_id: 药物ID
     :param user_id: 用户ID
+    :param columns: 需要查询的列（见MEDICATION_PROJECTIONS），默认查询所有列
     :return: 药物对象或None
     """
-    return db.query(Medication).filter(
-        Medication.id == medication_id,
-        Medication.user_id == user_id
-    ).first()
+    result = await db.execute(
+        select(Medication)
+        .where(Medication.id == medication_id, Medication.user_id == user_id)
+        .options(*_projection_options(columns))
+    )
+    return result.scalars().first()
 
 
-def update_medication(
-    db: Session,
+async def update_medication(
+    db: AsyncSession,
     medication_id: int,
     user_id: str,
     medication_data: MedicationUpdate
@@ -101,47 +271,233 @@ def update_medication(
     :param user_id: 用户ID
     :param medication_data: 更新数据
     :return: 更新后的药物对象或None
+    :raises ValueError: 照片格式错误
     """
-    medication = get_medication_by_id(db, medication_id, user_id)
-    if not medication:
-        return None
-
     # 只获取实际提供的字段（排除未设置的字段）
     update_dict = medication_data.model_dump(exclude_unset=True)
 
-    # 处理需要JSON序列化的字段
-    if 'daily_times' in update_dict and update_dict['daily_times'] is not None:
-        update_dict['daily_times'] = json.dumps(update_dict['daily_times'])
-    if 'weekly_days' in update_dict and update_dict['weekly_days'] is not None:
-        update_dict['weekly_days'] = json.dumps(update_dict['weekly_days'])
+    if update_dict.get('photos'):
+        update_dict['photos'] = await photo_service.externalize_photos(update_dict['photos'])
 
-    # 批量更新所有字段
-    for key, value in update_dict.items():
-        setattr(medication, key, value)
+    # 排期字段全部提交时直接在同一条UPDATE中写入编译结果，只提交部分时需按更新后的整行重新编译
+    recompile = any(field in update_dict for field in SCHEDULE_FIELDS)
+    if all(field in update_dict for field in SCHEDULE_FIELDS):
+        mask, minutes = compile_schedule(*(update_dict[field] for field in SCHEDULE_FIELDS))
+        update_dict['schedule_weekdays'] = mask
+        update_dict['schedule_minutes'] = list(minutes)
+        recompile = False
 
-    # 更新时间戳
-    medication.updated_at = datetime.now(timezone.utc)
+    # 更新时间戳（与列默认值保持一致使用本地时间，提醒物化水位依赖该时间判断失效）
+    update_dict['updated_at'] = datetime.now()
 
-    # 保存到数据库
-    db.commit()
-    db.refresh(medication)
+    # 一条 UPDATE ... RETURNING 同时校验所有权、更新并取回整行
+    medication = await _execute_returning(db, update(Medication).where(
+        Medication.id == medication_id,
+        Medication.user_id == user_id
+    ).values(**update_dict).execution_options(synchronize_session=False))
+    if medication is None:
+        return None
 
+    if recompile:
+        mask, minutes = compile_schedule(medication.frequency_type, medication.daily_times, medication.weekly_days)
+        await db.execute(update(Medication).where(Medication.id == medication.id).values(
+            schedule_weekdays=mask, schedule_minutes=list(minutes), updated_at=Medication.updated_at
+        ).execution_options(synchronize_session=False))
+        medication.schedule_weekdays = mask
+        medication.schedule_minutes = list(minutes)
+
+    await db.commit()
+    await read_cache.invalidate(user_id)
     return medication
 
 
-def delete_medication(db: Session, medication_id: int, user_id: str) -> bool:
+async def delete_medication(db: AsyncSession, medication_id: int, user_id: str) -> bool:
     """
-    删除药物记录
+    删除药物记录（同时删除其用药提醒与每日汇总）
     :param db: 数据库会话
     :param medication_id: 药物ID
     :param user_id: 用户ID
     :return: 删除成功返回True，失败返回False
     """
-    medication = get_medication_by_id(db, medication_id, user_id)
-    if not medication:
+    # 关联的提醒与汇总行作为数据修改CTE附加在同一条语句中一并删除
+    # （各子语句共享同一快照，外键在整条语句结束时检查，此时引用药物的行已被删除）
+    reminders = delete(Reminder).where(
+        Reminder.medication_id == medication_id, Reminder.user_id == user_id
+    ).returning(Reminder.id).cte("deleted_reminders")
+    rollup = rollup_service.delete_medication_rollup(medication_id, user_id).cte("deleted_rollup")
+    result = await db.execute(
+        delete(Medication)
+        .where(Medication.id == medication_id, Medication.user_id == user_id)
+        .returning(Medication.id)
+        .add_cte(reminders, rollup)
+    )
+    if result.scalar() is None:
         return False
 
-    db.delete(medication)
-    db.commit()
-
+    await db.commit()
+    await read_cache.invalidate(user_id)
     return True
+
+
+def _parse_legacy_json(column: str, value: Optional[str]) -> Any:
+    """
+    解析旧版以Text存储的JSON字符串
+    :param column: 列名
+    :param value: 原始字符串
+    :return: 解析后的对象；排期列解析失败或不是数组时为None，说明书解析失败时保留原字符串
+    """
+    if value is None or not value.strip():
+        return None
+    try:
+        parsed = json.loads(value)
+    except json.JSONDecodeError:
+        return value if column == "instruction_manual" else None
+    if column != "instruction_manual" and not isinstance(parsed, list):
+        return None
+    return parsed
+
+
+async def _convert_legacy_rows(db: AsyncSession, legacy, columns: List[str], rows) -> int:
+    """
+    将一批记录的Text列解析后写入对应的JSONB影子列（executemany）
+    :param db: 数据库会话
+    :param legacy: 迁移期间的medication表结构
+    :param columns: 待迁移的列名
+    :param rows: (ID, 各列原始值...) 行
+    :return: 写入的记录数
+    """
+    if not rows:
+        return 0
+    stmt = update(legacy).where(legacy.c.id == bindparam("_id")).values(
+        {f"{name}_jsonb": bindparam(f"_{name}") for name in columns}
+    )
+    await db.execute(stmt, [
+        {"_id": row[0], **{f"_{name}": _parse_legacy_json(name, value) for name, value in zip(columns, row[1:])}}
+        for row in rows
+    ])
+    return len(rows)
+
+
+async def migrate_json_columns(batch_size: int = 500) -> dict:
+    """
+    将药物的排期与说明书列由Text（JSON字符串）迁移为JSONB，并建立weekly_days的GIN索引
+    1. 为每个仍为Text的列添加JSONB影子列
+    2. 按ID键集分页解析并回填影子列，每批单独提交，不长时间锁表
+    3. 在一个短事务中锁表，重新转换回填开始后修改过的记录，删除旧列并将影子列改名
+    4. 以CONCURRENTLY方式建立GIN索引
+    中断后可以重新执行；须在部署使用JSONB列的新代码之前执行
+    :param batch_size: 每批处理的记录数
+    :return: 迁移统计（迁移的列、回填记录数、切换时重新转换的记录数）
+    """
+    stats = {"columns": [], "medications": 0, "reconverted": 0}
+
+    async with async_sessions() as db:
+        result = await db.execute(text(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = 'medication' "
+            "AND column_name = ANY(:names) AND data_type = 'text'"
+        ), {"names": list(MEDICATION_JSON_COLUMNS)})
+        columns = [name for name in MEDICATION_JSON_COLUMNS if name in set(result.scalars())]
+        for name in columns:
+            await db.execute(text(f"ALTER TABLE medication ADD COLUMN IF NOT EXISTS {name}_jsonb JSONB"))
+        await db.commit()
+    stats["columns"] = columns
+
+    if columns:
+        legacy = table(
+            "medication", column("id"), column("updated_at"),
+            *(column(name) for name in columns),
+            *(column(f"{name}_jsonb", JSONB(none_as_null=True)) for name in columns)
+        )
+        source = select(legacy.c.id, *(legacy.c[name] for name in columns))
+        # 回填期间旧版本服务仍在写入Text列，切换时重新转换此后修改过的记录（留出时钟偏差余量）
+        started_at = datetime.now() - timedelta(minutes=5)
+        last_id = 0
+
+        while True:
+            async with async_sessions() as db:
+                rows = (await db.execute(
+                    source.where(legacy.c.id > last_id).order_by(legacy.c.id).limit(batch_size)
+                )).all()
+                if not rows:
+                    break
+                stats["medications"] += await _convert_legacy_rows(db, legacy, columns, rows)
+                await db.commit()
+            last_id = rows[-1][0]
+            print(f"已回填 {stats['medications']} 条药物记录（最后ID {last_id}）")
+
+        async with async_sessions() as db:
+            await db.execute(text("LOCK TABLE medication IN ACCESS EXCLUSIVE MODE"))
+            rows = (await db.execute(
+                source.where(or_(legacy.c.updated_at >= started_at, legacy.c.id > last_id))
+            )).all()
+            stats["reconverted"] = await _convert_legacy_rows(db, legacy, columns, rows)
+            for name in columns:
+                comment = Medication.__table__.c[name].comment.replace("'", "''")
+                await db.execute(text(f"ALTER TABLE medication DROP COLUMN {name}"))
+                await db.execute(text(f"ALTER TABLE medication RENAME COLUMN {name}_jsonb TO {name}"))
+                await db.execute(text(f"COMMENT ON COLUMN medication.{name} IS '{comment}'"))
+            await db.commit()
+        print(f"已切换为JSONB: {', '.join(columns)}（重新转换 {stats['reconverted']} 条）")
+
+    # CREATE INDEX CONCURRENTLY不能在事务中执行
+    async with async_engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_medication_weekly_days "
+            "ON medication USING gin (weekly_days jsonb_path_ops)"
+        ))
+
+    return stats
+
+
+async def compile_schedules(batch_size: int = 500) -> dict:
+    """
+    为已有药物记录添加并回填编译后的排期列（按ID键集分页，每批单独提交）
+    可以重复执行，只处理尚未编译的记录；须在部署读取编译排期的新代码之前执行
+    :param batch_size: 每批处理的记录数
+    :return: 回填统计（处理记录数）
+    """
+    stats = {"medications": 0}
+
+    async with async_sessions() as db:
+        await db.execute(text("ALTER TABLE medication ADD COLUMN IF NOT EXISTS schedule_weekdays SMALLINT"))
+        await db.execute(text("ALTER TABLE medication ADD COLUMN IF NOT EXISTS schedule_minutes SMALLINT[]"))
+        await db.commit()
+
+    # 以表结构直接UPDATE，同时推进updated_at使ETag标记改变（已物化的提醒水位随之失效并重新补齐）
+    target = table(
+        "medication", column("id"), column("schedule_weekdays"),
+        column("schedule_minutes", ARRAY(SmallInteger)), column("updated_at")
+    )
+    last_id = 0
+
+    while True:
+        async with async_sessions() as db:
+            rows = (await db.execute(
+                select(Medication.id, Medication.frequency_type, Medication.daily_times, Medication.weekly_days)
+                .where(Medication.id > last_id, Medication.schedule_weekdays.is_(None))
+                .order_by(Medication.id)
+                .limit(batch_size)
+            )).all()
+            if not rows:
+                break
+
+            params = []
+            for row in rows:
+                mask, minutes = compile_schedule(row.frequency_type, row.daily_times, row.weekly_days)
+                params.append({"_id": row.id, "_weekdays": mask, "_minutes": list(minutes)})
+            await db.execute(
+                update(target).where(target.c.id == bindparam("_id")).values(
+                    schedule_weekdays=bindparam("_weekdays"), schedule_minutes=bindparam("_minutes"),
+                    updated_at=datetime.now()
+                ),
+                params
+            )
+            await db.commit()
+
+        last_id = rows[-1].id
+        stats["medications"] += len(rows)
+        print(f"已编译 {stats['medications']} 条药物排期（最后ID {last_id}）")
+
+    return stats
@@ -0,0 +1,294 @@
+"""
+药品照片存储服务层
+照片以内容寻址（SHA-256）方式保存到本地文件系统或Supabase Storage，并生成缩略图，
+药物记录的photos字段只保存照片URL的JSON数组
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+import json
+import os
+import re
+from typing import List, Optional
+from sqlalchemy import select, update
+from ..core.config import config
+from ..db.database import async_sessions
+from ..db.models.medication import Medication
+
+
+# 支持的图片类型（扩展名 -> Content-Type）
+PHOTO_CONTENT_TYPES = {
+    "jpg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+    "webp": "image/webp"
+}
+
+# Pillow保存缩略图时使用的格式
+_PIL_FORMATS = {"jpg": "JPEG", "png": "PNG", "gif": "GIF", "webp": "WEBP"}
+
+# 各图片类型的文件头（扩展名 -> 文件头判断函数）
+_MAGIC_CHECKS = {
+    "jpg": lambda data: data.startswith(b"\xff\xd8\xff"),
+    "png": lambda data: data.startswith(b"\x89PNG\r\n\x1a\n"),
+    "gif": lambda data: data[:6] in (b"GIF87a", b"GIF89a"),
+    "webp": lambda data: data[:4] == b"RIFF" and data[8:12] == b"WEBP"
+}
+
+# Base64数据URL格式
+_DATA_URL_PATTERN = re.compile(r'^data:image/(jpeg|jpg|png|gif|webp);base64,(.+)$', re.DOTALL)
+
+# 内容寻址的照片文件名（用于推导缩略图地址）
+_PHOTO_NAME_PATTERN = re.compile(r'([0-9a-f]{64})\.(jpg|png|gif|webp)(?=\?|$)')
+
+
+def parse_data_url(data_url: str) -> tuple[bytes, str]:
+    """
+    解析Base64数据URL
+    :param data_url: data:image/...;base64,... 格式的字符串
+    :return: (图片二进制数据, 文件扩展名)
+    :raises ValueError: 格式错误
+    """
+    match = _DATA_URL_PATTERN.match(data_url)
+    if not match:
+        raise ValueError("无效的Base64图片格式")
+    file_ext = "jpg" if match.group(1) == "jpeg" else match.group(1)
+    try:
+        return base64.b64decode(match.group(2), validate=True), file_ext
+    except (binascii.Error, ValueError):
+        raise ValueError("无效的Base64图片数据")
+
+
+def _verify_image(data: bytes, file_ext: str):
+    """
+    校验图片内容与声明的类型一致（检查文件头，安装Pillow时再完整解码校验）
+    :param data: 图片数据
+    :param file_ext: 声明的文件扩展名
+    :raises ValueError: 内容不是有效的该类型图片
+    """
+    if not _MAGIC_CHECKS[file_ext](data):
+        raise ValueError("图片内容与类型不符")
+    try:
+        from PIL import Image
+    except ImportError:
+        return
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.format != _PIL_FORMATS[file_ext]:
+                raise ValueError("图片内容与类型不符")
+            image.verify()
+    except ValueError:
+        raise
+    except Exception:
+        raise ValueError("无法解析的图片数据")
+
+
+def _object_paths(digest: str, file_ext: str) -> tuple[str, str]:
+    """
+    获取原图与缩略图的存储路径（按摘要前两位分目录）
+    :param digest: 图片SHA-256摘要
+    :param file_ext: 文件扩展名
+    :return: (原图路径, 缩略图路径)
+    """
+    return f"{digest[:2]}/{digest}.{file_ext}", f"{digest[:2]}/{digest}_thumb.{file_ext}"
+
+
+def _make_thumbnail(data: bytes, file_ext: str) -> bytes:
+    """
+    生成缩略图（需要安装Pillow，未安装或无法解码时返回原图）
+    :param data: 原图数据
+    :param file_ext: 文件扩展名
+    :return: 缩略图数据
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return data
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            if file_ext == "jpg" and image.mode != "RGB":
+                image = image.convert("RGB")
+            image.thumbnail((config.PHOTO_THUMBNAIL_SIZE, config.PHOTO_THUMBNAIL_SIZE))
+            output = io.BytesIO()
+            image.save(output, format=_PIL_FORMATS[file_ext])
+            return output.getvalue()
+    except Exception as e:
+        print(f"生成缩略图失败: {str(e)}")
+        return data
+
+
+def _write_local(path: str, data: bytes):
+    """
+    写入本地文件（内容寻址，已存在则跳过）
+    :param path: 相对于PHOTO_LOCAL_DIR的路径
+    :param data: 文件数据
+    """
+    full_path = os.path.join(config.PHOTO_LOCAL_DIR, path)
+    if os.path.exists(full_path):
+        return
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    temp_path = f"{full_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(data)
+    os.replace(temp_path, full_path)
+
+
+def _upload_supabase(path: str, data: bytes, file_ext: str) -> str:
+    """
+    上传到Supabase Storage（内容寻址，重复上传会覆盖为相同内容）
+    :param path: 存储路径
+    :param data: 文件数据
+    :param file_ext: 文件扩展名
+    :return: 公开访问URL
+    """
+    from .supabase_service import supabase
+
+    bucket = supabase.storage.from_(config.PHOTO_SUPABASE_BUCKET)
+    bucket.upload(
+        path,
+        data,
+        file_options={"content-type": PHOTO_CONTENT_TYPES[file_ext], "upsert": "true"}  # noqa
+    )
+    return bucket.get_public_url(path)
+
+
+def _store_photo_sync(data: bytes, file_ext: str) -> dict:
+    """
+    保存照片及缩略图（同步实现，在线程池中执行）
+    :param data: 图片数据
+    :param file_ext: 文件扩展名
+    :return: 照片信息（id, url, thumbnail_url）
+    :raises ValueError: 图片内容无效
+    """
+    _verify_image(data, file_ext)
+    digest = hashlib.sha256(data).hexdigest()
+    photo_path, thumbnail_path = _object_paths(digest, file_ext)
+    thumbnail = _make_thumbnail(data, file_ext)
+
+    if config.PHOTO_STORAGE_BACKEND == "supabase":
+        url = _upload_supabase(photo_path, data, file_ext)
+        thumbnail_url = _upload_supabase(thumbnail_path, thumbnail, file_ext)
+    else:
+        _write_local(photo_path, data)
+        _write_local(thumbnail_path, thumbnail)
+        base_url = config.PHOTO_PUBLIC_BASE_URL.rstrip("/")
+        url = f"{base_url}/{photo_path}"
+        thumbnail_url = f"{base_url}/{thumbnail_path}"
+
+    return {"id": digest, "url": url, "thumbnail_url": thumbnail_url}
+
+
+async def store_photo(data: bytes, file_ext: str) -> dict:
+    """
+    保存照片并生成缩略图
+    :param data: 图片数据
+    :param file_ext: 文件扩展名（jpg, png, gif, webp）
+    :return: 照片信息（id-内容摘要, url-原图地址, thumbnail_url-缩略图地址）
+    :raises ValueError: 类型不支持、超过大小限制或图片内容无效
+    """
+    if file_ext not in PHOTO_CONTENT_TYPES:
+        raise ValueError(f"不支持的图片类型: {file_ext}")
+    if len(data) > config.PHOTO_MAX_SIZE:
+        raise ValueError(f"图片大小超过{config.PHOTO_MAX_SIZE // (1024 * 1024)}MB限制")
+    return await asyncio.to_thread(_store_photo_sync, data, file_ext)
+
+
+async def externalize_photos(photos: Optional[str]) -> Optional[str]:
+    """
+    将照片JSON数组中的Base64图片转存到存储，替换为URL
+    :param photos: 照片JSON数组（元素为Base64数据URL或已有URL）
+    :return: 仅包含URL的照片JSON数组
+    :raises ValueError: 照片格式错误
+    """
+    if not photos:
+        return photos
+    try:
+        items = json.loads(photos)
+    except (json.JSONDecodeError, TypeError):
+        raise ValueError("照片必须为JSON数组")
+    if not isinstance(items, list):
+        raise ValueError("照片必须为JSON数组")
+
+    urls = []
+    for item in items:
+        if isinstance(item, str) and item.startswith("data:"):
+            data, file_ext = parse_data_url(item)
+            item = (await store_photo(data, file_ext))["url"]
+        urls.append(item)
+    return json.dumps(urls)
+
+
+def get_thumbnail_url(url: str) -> str:
+    """
+    根据照片URL推导缩略图URL（非本服务保存的照片返回原URL）
+    :param url: 照片URL
+    :return: 缩略图URL
+    """
+    return _PHOTO_NAME_PATTERN.sub(r'\1_thumb.\2', url) if isinstance(url, str) else url
+
+
+def get_photo_thumbnails(photos: Optional[str]) -> List[str]:
+    """
+    获取照片JSON数组对应的缩略图URL列表
+    尚未迁移的Base64照片返回空字符串，避免在响应中重复传输图片数据
+    :param photos: 照片JSON数组
+    :return: 缩略图URL列表
+    """
+    if not photos:
+        return []
+    try:
+        items = json.loads(photos)
+    except (json.JSONDecodeError, TypeError):
+        return []
+    if not isinstance(items, list):
+        return []
+    return ["" if isinstance(item, str) and item.startswith("data:") else get_thumbnail_url(item) for item in items]
+
+
+async def migrate_inline_photos(batch_size: int = 50) -> dict:
+    """
+    将药物记录中内联的Base64照片分批转存到存储（按ID键集分页，每批单独提交）
+    :param batch_size: 每批处理的药物记录数
+    :return: 迁移统计（处理记录数、转存照片数、失败记录数）
+    """
+    stats = {"medications": 0, "photos": 0, "failed": 0}
+    last_id = 0
+
+    while True:
+        async with async_sessions() as db:
+            result = await db.execute(
+                select(Medication.id, Medication.photos)
+                .where(Medication.id > last_id, Medication.photos.like('%data:image/%'))
+                .order_by(Medication.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+
+            for medication_id, photos in rows:
+                last_id = medication_id
+                try:
+                    converted = await externalize_photos(photos)
+                except Exception as e:
+                    print(f"迁移药物 {medication_id} 的照片失败: {str(e)}")
+                    stats["failed"] += 1
+                    continue
+                # 由onupdate推进updated_at：运行中服务的读缓存键与客户端ETag均包含该标记，无需跨进程清除缓存
+                await db.execute(
+                    update(Medication)
+                    .where(Medication.id == medication_id)
+                    .values(photos=converted)
+                )
+                stats["medications"] += 1
+                stats["photos"] += photos.count("data:image/")
+
+            await db.commit()
+        print(f"已迁移 {stats['medications']} 条药物记录（最后ID {last_id}）")
+
+    return stats
@@ -3,229 +3,749 @@
 处理用药提醒的生成、查询和更新
 """
 from datetime import datetime, date, timedelta
-from typing import List
-from sqlalchemy.orm import Session
-from typing import Any
-import json
+from typing import List, Optional, Tuple, Set, Dict
+from sqlalchemy import select, update, func, cast, literal, or_, and_, true, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from ..core.config import config
+from ..core.pagination import encode_cursor, decode_cursor
+from ..core.read_cache import read_cache
 from ..db.models.medication import Medication
 from ..db.models.reminder import Reminder
+from ..db.models.reminder_horizon import ReminderHorizon
+from . import rollup_service
+from .medication_schedule import MedicationSchedule, parse_minutes, minute_label
 
 
-def generate_reminders_for_user(db: Session, user_id: str, days: int = 7) -> int:
+# 批量插入时每条INSERT语句包含的最大行数
+REMINDER_INSERT_BATCH_SIZE = 1000
+
+# 用药记录响应包含的字段
+REMINDER_RESPONSE_COLUMNS = (
+    "id", "user_id", "medication_id", "medication_name", "dosage", "scheduled_date",
+    "scheduled_time", "is_completed", "completed_at", "created_at", "updated_at"
+)
+
+
+async def generate_reminders_for_user(db: AsyncSession, user_id: str, days: int = 7) -> int:
     """
     为用户生成未来N天的用药提醒
+
+    已被后台调度器覆盖的用户直接返回0，否则只补齐水位之后的新日期。
+
     :param db: 数据库会话
     :param user_id: 用户ID
     :param days: 生成天数
     :return: 生成的记录数量
     """
+    # 按需计算模式下不预生成提醒
+    if config.REMINDER_READ_MODE == "virtual":
+        return 0
+
+    through = date.today() + timedelta(days=days - 1)
+    generated_count = await materialize_user_horizon(db, user_id, through)
+    await db.commit()
+    if generated_count:
+        await read_cache.invalidate(user_id)
+    return generated_count
+
+
+async def materialize_user_horizon(db: AsyncSession, user_id: str, through: date) -> int:
+    """
+    将用户的提醒生成到指定日期，并推进物化水位（不提交事务）
+
+    水位有效（药物在水位计算后未修改）时只生成水位之后的日期，
+    失效时从今天开始重新生成整个窗口。
+
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param through: 需要覆盖到的日期（含）
+    :return: 生成的记录数量
+    """
+    # 在读取药物之前记录时间戳，之后修改的药物会使水位失效
+    computed_at = datetime.now()
+    today = date.today()
+
+    horizon = (await db.execute(select(
+        ReminderHorizon.materialized_through, ReminderHorizon.updated_at
+    ).where(ReminderHorizon.user_id == user_id))).one_or_none()
+    is_fresh = horizon is not None and await db.scalar(select(Medication.id).where(
+        Medication.user_id == user_id,
+        Medication.updated_at > horizon.updated_at
+    ).limit(1)) is None
+
+    if is_fresh and horizon.materialized_through >= through:
+        return 0
+
+    start = max(today, horizon.materialized_through + timedelta(days=1)) if is_fresh else today
+    generated_count = await generate_reminders_for_range(db, user_id, start, through)
+
+    # 推进水位（调度器与生成接口可能并发写入同一用户，以UPSERT代替先查后插）
+    materialized_through = max(horizon.materialized_through, through) if is_fresh else through
+    values = {"user_id": user_id, "materialized_through": materialized_through, "updated_at": computed_at}
+    upsert = pg_insert(ReminderHorizon).values(values)
+    await db.execute(upsert.on_conflict_do_update(
+        index_elements=[ReminderHorizon.user_id],
+        set_={
+            "materialized_through": upsert.excluded.materialized_through,
+            "updated_at": upsert.excluded.updated_at
+        },
+        # 只保留最新一次计算的水位
+        where=ReminderHorizon.updated_at <= upsert.excluded.updated_at
+    ))
+
+    return generated_count
+
+
+async def generate_reminders_for_range(db: AsyncSession, user_id: str, start: date, end: date) -> int:
+    """
+    为用户生成日期区间内的用药提醒（不提交事务）
+
+    先在内存中展开所有候选时段，再用一次范围查询取出已存在的时段，
+    最后通过 INSERT ... ON CONFLICT DO NOTHING 批量插入缺失的记录。
+
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param start: 开始日期（包含）
+    :param end: 结束日期（包含）
+    :return: 生成的记录数量
+    """
+    if start > end:
+        return 0
+
     # 获取用户所有激活的药物
-    medications:List[Any] = db.query(Medication).filter(
+    medications = await _get_active_medications(db, user_id)
+
+    # 按编译后的排期展开所有候选时段（时间以当日分钟数表示）
+    candidates = [
+        (med.id, slot_date, minutes)
+        for med in medications
+        for slot_date, minutes in MedicationSchedule.of(med).occurrences(start, end)
+    ]
+    if not candidates:
+        return 0
+
+    # 一次范围查询获取窗口内已存在的时段
+    existing = await _load_existing_slot_keys(db, user_id, start, end)
+
+    rows = [
+        {
+            "user_id": user_id,
+            "medication_id": medication_id,
+            "scheduled_date": slot_date,
+            "scheduled_time": minute_label(minutes),
+            "is_completed": False
+        }
+        for medication_id, slot_date, minutes in candidates
+        if (medication_id, slot_date, minutes) not in existing
+    ]
+
+    return await _bulk_insert_reminders(db, rows)
+
+
+async def _get_active_medications(db: AsyncSession, user_id: str, weekday: Optional[int] = None) -> List[Medication]:
+    """
+    获取用户所有激活的药物
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param weekday: 只查询当天（1=周一, 7=周日）需要服用的药物，weekly类型按weekly_days @> [weekday]过滤
+    :return: 药物列表
+    """
+    query = select(Medication).where(
         Medication.user_id == user_id,
         Medication.is_active == True
-    ).all()
+    )
+    if weekday is not None:
+        query = query.where(or_(
+            Medication.frequency_type != "weekly",
+            Medication.weekly_days.contains([weekday])
+        ))
+    result = await db.execute(query)
+    return list(result.scalars().all())
 
-    today = date.today() # 获取当前时间
-    generated_count = 0 # 初始化记录数量
 
-    for med in medications:
-        # 为每一天生成记录
-        for day_offset in range(days):
-            target_date = today + timedelta(days=day_offset)
-
-            # 检查是否在药物有效期内
-            if target_date < med.start_date or target_date > med.end_date:
-                continue
-
-            # 根据频率类型生成记录
-            if med.frequency_type == "daily":
-                # 每日类型：为每个时间点生成记录
-                daily_times = []
-                if med.daily_times:
-                    try:
-                        daily_times = json.loads(med.daily_times) # noqa
-                    except: # noqa
-                        pass
-
-                for time_str in daily_times:
-                    # 检查是否已存在该记录
-                    existing = db.query(Reminder).filter(
-                        Reminder.user_id == user_id,
-                        Reminder.medication_id == med.id,
-                        Reminder.scheduled_date == target_date,
-                        Reminder.scheduled_time == time_str
-                    ).first()
-
-                    # 如果存在则添加相关记录
-                    if not existing:
-                        reminder = Reminder(
-                            user_id=user_id,
-                            medication_id=med.id,
-                            scheduled_date=target_date,
-                            scheduled_time=time_str,
-                            is_completed=False
-                        )
-                        db.add(reminder)
-                        generated_count += 1
-
-            elif med.frequency_type == "weekly":
-                # 每周类型：检查今天是否在服用日期中
-                weekly_days = []
-                if med.weekly_days:
-                    try:
-                        weekly_days = json.loads(med.weekly_days)
-                    except: # noqa
-                        pass
-
-                target_weekday = target_date.isoweekday()  # 1=周一, 7=周日
-                if target_weekday in weekly_days:
-                    # 检查是否已存在该记录
-                    existing = db.query(Reminder).filter(
-                        Reminder.user_id == user_id,
-                        Reminder.medication_id == med.id,
-                        Reminder.scheduled_date == target_date
-                    ).first()
-
-                    if not existing:
-                        record = Reminder(
-                            user_id=user_id,
-                            medication_id=med.id,
-                            scheduled_date=target_date,
-                            scheduled_time=None,  # 每周类型没有具体时间 # noqa
-                            is_completed=False
-                        )
-                        db.add(record)
-                        generated_count += 1
-
-    db.commit()
-    return generated_count
+async def _load_existing_slot_keys(db: AsyncSession, user_id: str, start: date, end: date) -> Set[Tuple[int, date, Optional[int]]]:
+    """
+    获取日期窗口内已存在的提醒时段
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param start: 开始日期
+    :param end: 结束日期
+    :return: (药物ID, 计划日期, 当日分钟数) 集合
+    """
+    result = await db.execute(select(
+        Reminder.medication_id,
+        Reminder.scheduled_date,
+        Reminder.scheduled_time
+    ).where(
+        Reminder.user_id == user_id,
+        Reminder.scheduled_date >= start,
+        Reminder.scheduled_date <= end
+    ))
+    return {(row.medication_id, row.scheduled_date, parse_minutes(row.scheduled_time)) for row in result}
 
 
-def get_reminders_by_date(db: Session, user_id: str, target_date: date) -> List[dict]:
+async def _bulk_insert_reminders(db: AsyncSession, rows: List[dict]) -> int:
     """
-    获取指定日期的用药提醒
+    批量插入提醒记录，已存在的时段由唯一约束跳过
+
+    每批为一条语句：插入的记录经RETURNING进入CTE，同一语句中为其累加每日汇总并返回插入数量。
+
+    :param db: 数据库会话
+    :param rows: 待插入的记录字典列表
+    :return: 实际插入的记录数量
+    """
+    # 多行VALUES作为CTE时无法使用列的Python默认值，时间戳显式给出
+    now = datetime.now()
+    inserted_count = 0
+    for offset in range(0, len(rows), REMINDER_INSERT_BATCH_SIZE):
+        chunk = [
+            {**row, "created_at": now, "updated_at": now}
+            for row in rows[offset:offset + REMINDER_INSERT_BATCH_SIZE]
+        ]
+        inserted = pg_insert(Reminder).values(chunk).on_conflict_do_nothing(
+            constraint="uq_reminder_slot"
+        ).returning(Reminder.user_id, Reminder.medication_id, Reminder.scheduled_date).cte("inserted")
+
+        slot_key = (inserted.c.user_id, inserted.c.medication_id, inserted.c.scheduled_date)
+        rollup = rollup_service.upsert_rollup_deltas(
+            select(*slot_key, func.count(), literal(0), literal(0)).group_by(*slot_key)
+        ).cte("rollup")
+
+        inserted_count += await db.scalar(select(func.count()).select_from(inserted).add_cte(rollup))
+    return inserted_count
+
+
+async def get_reminders_by_date(
+    db: AsyncSession,
+    user_id: str,
+    target_date: date,
+    marker: Optional[tuple] = None
+) -> List[dict]:
+    """
+    获取指定日期的用药提醒（按用户版本缓存，用户的任何写入都会使其失效）
     :param db: 数据库会话
     :param user_id: 用户ID
     :param target_date: 目标日期
+    :param marker: get_reminders_marker返回的变更标记，计入缓存键，其他进程的写入也会使条目失效
     :return: 用药记录列表
     """
+    return await read_cache.get_or_load(
+        user_id, ("reminders", target_date, marker),
+        lambda: _load_reminders_by_date(db, user_id, target_date)
+    )
+
+
+async def get_reminders_marker(db: AsyncSession, user_id: str, target_date: date) -> tuple:
+    """
+    获取指定日期提醒的变更标记，用于计算ETag（一次查询，不经过进程内读缓存）
+    包含用户药物的标记：提醒响应带药物名称与剂量，虚拟模式下提醒直接由药物排期展开
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param target_date: 目标日期
+    :return: (药物数量, 药物最大更新时间, 提醒数量, 提醒最大更新时间)
+    """
+    medications = select(
+        func.count().label("count"), func.max(Medication.updated_at).label("updated_at")
+    ).where(Medication.user_id == user_id).subquery("medications")
+    reminders = select(
+        func.count().label("count"), func.max(Reminder.updated_at).label("updated_at")
+    ).where(Reminder.user_id == user_id, Reminder.scheduled_date == target_date).subquery("reminders")
+    # 两个聚合子查询各返回一行，以ON TRUE连接为一行
+    row = (await db.execute(
+        select(medications.c.count, medications.c.updated_at, reminders.c.count, reminders.c.updated_at)
+        .select_from(medications.join(reminders, true()))
+    )).one()
+    return tuple(row)
+
+
+async def _load_reminders_by_date(db: AsyncSession, user_id: str, target_date: date) -> List[dict]:
+    """
+    从数据库查询指定日期的用药提醒
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param target_date: 目标日期
+    :return: 用药记录列表
+    """
+    if config.REMINDER_READ_MODE == "virtual":
+        return await _get_virtual_reminders(db, user_id, target_date, target_date)
+
     # 获取查询记录 [(药物记录, 药物数据)] (nulls last-空值排在前面)
-    reminders = db.query(Reminder, Medication).join(
+    reminders = await db.execute(select(Reminder, Medication).join(
         Medication, Reminder.medication_id == Medication.id
-    ).filter(
+    ).where(
         Reminder.user_id == user_id,
         Reminder.scheduled_date == target_date
     ).order_by(
         Reminder.scheduled_time.asc().nullslast()
-    ).all()
-
-    # noinspection DuplicatedCode
-    result = []
-    for reminder, medication in reminders:
-        result.append({
-            "id": reminder.id,
-            "user_id": reminder.user_id,
-            "medication_id": reminder.medication_id,
-            "medication_name": medication.name,
-            "dosage": medication.dosage,
-            "scheduled_date": reminder.scheduled_date,
-            "scheduled_time": reminder.scheduled_time,
-            "is_completed": reminder.is_completed,
-            "completed_at": reminder.completed_at,
-            "created_at": reminder.created_at,
-            "updated_at": reminder.updated_at
-        })
-
-    return result
-
-
-def complete_reminder(db: Session, reminder_id: int, user_id: str) -> type[Reminder] | None:
+    ))
+
+    return [_build_reminder_dict(reminder, medication) for reminder, medication in reminders]
+
+
+async def complete_reminder(db: AsyncSession, reminder_id: int, user_id: str) -> Optional[dict]:
     """
     标记用药提醒为已完成
     :param db: 数据库会话
-    :param reminder_id: 记录ID
+    :param reminder_id: 记录ID（负数为按需计算的虚拟提醒ID）
     :param user_id: 用户UUID
-    :return: 更新后的记录或None
+    :return: 更新后的提醒字典或None
     """
-    reminder = db.query(Reminder).filter(
-        Reminder.id == reminder_id,
-        Reminder.user_id == user_id
-    ).first()
-
-    if not reminder:
-        return None
-
-    reminder.is_completed = True
-    reminder.completed_at = datetime.now()
-    reminder.updated_at = datetime.now()
-
-    db.commit()
-    db.refresh(reminder)
-
-    return reminder
+    reminders = await set_reminders_completed(db, [reminder_id], user_id, True)
+    return reminders[0] if reminders else None
 
 
-def uncomplete_reminder(db: Session, reminder_id: int, user_id: str) -> type[Reminder] | None:
+async def uncomplete_reminder(db: AsyncSession, reminder_id: int, user_id: str) -> Optional[dict]:
     """
     取消用药记录的完成状态
     :param db: 数据库会话
-    :param reminder_id: 记录ID
+    :param reminder_id: 记录ID（负数为按需计算的虚拟提醒ID）
     :param user_id: 用户ID
-    :return: 更新后的记录或None
+    :return: 更新后的提醒字典或None
     """
-    reminder = db.query(Reminder).filter(
-        Reminder.id == reminder_id,
-        Reminder.user_id == user_id
-    ).first()
-
-    if not reminder:
-        return None
-
-    reminder.is_completed = False
-    reminder.completed_at = None
-    reminder.updated_at = datetime.now()
+    reminders = await set_reminders_completed(db, [reminder_id], user_id, False)
+    return reminders[0] if reminders else None
 
-    db.commit()
-    db.refresh(reminder)
 
-    return reminder
+async def set_reminders_completed(
+    db: AsyncSession,
+    reminder_ids: List[int],
+    user_id: str,
+    completed: bool
+) -> List[dict]:
+    """
+    批量修改用药记录的完成状态（单个事务）
 
+    已存储的记录只需一条语句：
+    - FROM子句中以 SELECT ... FOR UPDATE 锁定记录并读取修改前的状态；
+    - UPDATE ... FROM medication ... RETURNING 校验归属、修改状态并取回药物名称和剂量；
+    - 数据修改CTE根据修改前后的状态增量更新每日汇总。
+    虚拟提醒ID需要先落库。
 
-def get_date_range_reminders(db: Session, user_id: str, start_date: date, end_date: date) -> List[dict]:
+    :param db: 数据库会话
+    :param reminder_ids: 记录ID列表（负数为按需计算的虚拟提醒ID）
+    :param user_id: 用户ID
+    :param completed: True-标记为已完成, False-取消完成
+    :return: 更新后的用药记录列表（按请求顺序，不存在或不属于该用户的ID被忽略）
+    """
+    virtual_ids = [i for i in reminder_ids if i < 0]
+    materialized = await _materialize_virtual_reminders(db, user_id, virtual_ids) if virtual_ids else {}
+    ids = list(dict.fromkeys(materialized.get(i, i) for i in reminder_ids if i >= 0 or i in materialized))
+    if not ids:
+        return []
+
+    previous = select(
+        Reminder.id, Reminder.is_completed, Reminder.completed_at
+    ).where(
+        Reminder.id.in_(ids),
+        Reminder.user_id == user_id
+    ).with_for_update().subquery("previous")
+
+    now = datetime.now()
+    updated = (
+        update(Reminder)
+        .where(Reminder.id == previous.c.id, Medication.id == Reminder.medication_id)
+        .values(is_completed=completed, completed_at=now if completed else None, updated_at=now)
+        .returning(
+            Reminder.id, Reminder.user_id, Reminder.medication_id,
+            Medication.name.label("medication_name"), Medication.dosage,
+            Reminder.scheduled_date, Reminder.scheduled_time, Reminder.is_completed,
+            Reminder.completed_at, Reminder.created_at, Reminder.updated_at,
+            previous.c.is_completed.label("was_completed"), previous.c.completed_at.label("was_completed_at")
+        )
+        .cte("updated")
+    )
+
+    # 修改前后的完成/准时状态之差即汇总增量
+    window = rollup_service.on_time_window()
+    columns = updated.c
+    was_on_time = rollup_service.on_time_expression(
+        window, columns.scheduled_date, columns.scheduled_time, columns.was_completed, columns.was_completed_at
+    )
+    is_on_time = rollup_service.on_time_expression(
+        window, columns.scheduled_date, columns.scheduled_time, columns.is_completed, columns.completed_at
+    )
+    completed_delta = func.sum(_as_int(columns.is_completed) - _as_int(columns.was_completed))
+    on_time_delta = func.sum(_as_int(is_on_time) - _as_int(was_on_time))
+    slot_key = (columns.user_id, columns.medication_id, columns.scheduled_date)
+    rollup = rollup_service.upsert_rollup_deltas(
+        select(*slot_key, literal(0), completed_delta, on_time_delta)
+        .group_by(*slot_key)
+        .having(or_(completed_delta != 0, on_time_delta != 0))
+    ).cte("rollup")
+
+    result = await db.execute(
+        select(*(columns[column] for column in REMINDER_RESPONSE_COLUMNS)).add_cte(rollup)
+    )
+    rows = {row["id"]: dict(row) for row in result.mappings()}
+    await db.commit()
+    await read_cache.invalidate(user_id)
+
+    return [rows[i] for i in ids if i in rows]
+
+
+def _as_int(expression):
+    """将布尔SQL表达式转换为0/1（NULL视为0）"""
+    return func.coalesce(cast(expression, Integer), 0)
+
+
+async def get_date_range_reminders(
+    db: AsyncSession,
+    user_id: str,
+    start_date: date,
+    end_date: date,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> Tuple[List[dict], Optional[str]]:
     """
-    获取日期范围内的用药记录
+    获取日期范围内的用药记录（按日期、时间、ID键集分页）
     :param db: 数据库会话
     :param user_id: 用户ID
     :param start_date: 开始日期
     :param end_date: 结束日期
-    :return: 用药记录列表
+    :param limit: 每页数量，None表示返回全部
+    :param cursor: 上一页返回的游标
+    :return: (用药记录列表, 下一页游标，没有更多数据时为None)
+    :raises ValueError: 游标无效
     """
-    reminders = db.query(Reminder, Medication).join(
+    if config.REMINDER_READ_MODE == "virtual":
+        return await _get_virtual_reminders_page(db, user_id, start_date, end_date, limit, cursor)
+
+    query = select(Reminder, Medication).join(
         Medication, Reminder.medication_id == Medication.id
-    ).filter(
+    ).where(
         Reminder.user_id == user_id,
         Reminder.scheduled_date >= start_date,
         Reminder.scheduled_date <= end_date
-    ).order_by(
+    )
+    if cursor:
+        query = query.where(_after_reminder_key(*_parse_reminder_cursor(cursor)))
+    query = query.order_by(
         Reminder.scheduled_date.asc(),
-        Reminder.scheduled_time.asc().nullslast()
-    ).all()
-
-    # noinspection DuplicatedCode
-    result = []
-    for reminder, medication in reminders:
-        result.append({
-            "id": reminder.id,
-            "user_id": reminder.user_id,
-            "medication_id": reminder.medication_id,
-            "medication_name": medication.name,
-            "dosage": medication.dosage,
-            "scheduled_date": reminder.scheduled_date,
-            "scheduled_time": reminder.scheduled_time,
-            "is_completed": reminder.is_completed,
-            "completed_at": reminder.completed_at,
-            "created_at": reminder.created_at,
-            "updated_at": reminder.updated_at
-        })
-
-    return result
+        Reminder.scheduled_time.asc().nullslast(),
+        Reminder.id.asc()
+    )
+    if limit is not None:
+        query = query.limit(limit + 1)
+
+    reminders = [_build_reminder_dict(reminder, medication) for reminder, medication in await db.execute(query)]
+    if limit is None or len(reminders) <= limit:
+        return reminders, None
+
+    reminders = reminders[:limit]
+    last = reminders[-1]
+    return reminders, encode_cursor(last["scheduled_date"], last["scheduled_time"], last["id"])
+
+
+def _parse_reminder_cursor(cursor: str) -> Tuple[date, Optional[str], int]:
+    """
+    解析提醒分页游标
+    :param cursor: 游标字符串
+    :return: (日期, 时间, ID)
+    :raises ValueError: 游标无效
+    """
+    after_date, after_time, after_id = decode_cursor(cursor, 3)
+    try:
+        return date.fromisoformat(after_date), after_time and str(after_time), int(after_id)
+    except (TypeError, ValueError):
+        raise ValueError("无效的分页游标")
+
+
+def _after_reminder_key(after_date: date, after_time: Optional[str], after_id: int):
+    """
+    构建键集分页条件：排序键 (scheduled_date, scheduled_time NULLS LAST, id) 大于游标
+    可使用 (user_id, scheduled_date, scheduled_time, id) 索引，无需OFFSET扫描
+    :param after_date: 游标日期
+    :param after_time: 游标时间（可能为空）
+    :param after_id: 游标ID
+    :return: 查询条件
+    """
+    if after_time is None:
+        # 空时间排在当天最后，同一天只剩ID更大的空时间记录
+        same_date = and_(Reminder.scheduled_time.is_(None), Reminder.id > after_id)
+    else:
+        same_date = or_(
+            Reminder.scheduled_time > after_time,
+            Reminder.scheduled_time.is_(None),
+            and_(Reminder.scheduled_time == after_time, Reminder.id > after_id)
+        )
+    return and_(
+        Reminder.scheduled_date >= after_date,
+        or_(Reminder.scheduled_date > after_date, and_(Reminder.scheduled_date == after_date, same_date))
+    )
+
+
+def _build_reminder_dict(reminder: Reminder, medication: Medication) -> dict:
+    """
+    构建用药提醒响应字典
+    :param reminder: 提醒记录
+    :param medication: 对应的药物
+    :return: 提醒字典
+    """
+    return {
+        "id": reminder.id,
+        "user_id": reminder.user_id,
+        "medication_id": reminder.medication_id,
+        "medication_name": medication.name,
+        "dosage": medication.dosage,
+        "scheduled_date": reminder.scheduled_date,
+        "scheduled_time": reminder.scheduled_time,
+        "is_completed": reminder.is_completed,
+        "completed_at": reminder.completed_at,
+        "created_at": reminder.created_at,
+        "updated_at": reminder.updated_at
+    }
+
+
+# ========== 按需计算（虚拟）提醒 ==========
+# 虚拟提醒ID编码：-(药物ID << 27 | 日期距1970-01-01的天数 << 11 | 当日分钟数)，没有具体时间的分钟数记为1440
+# 绝对值小于2^53，前端以JavaScript数值处理不会丢失精度（药物ID上限2^26-1，日期上限2149年）
+_VIRTUAL_ID_MINUTE_BITS = 11
+_VIRTUAL_ID_DAY_BITS = 16
+_VIRTUAL_ID_NO_TIME = 24 * 60
+_VIRTUAL_ID_EPOCH = date(1970, 1, 1).toordinal()
+_VIRTUAL_ID_MAX_MEDICATION_ID = (1 << (53 - _VIRTUAL_ID_DAY_BITS - _VIRTUAL_ID_MINUTE_BITS)) - 1
+
+
+def _encode_virtual_id(medication_id: int, slot_date: date, minutes: Optional[int]) -> int:
+    """
+    为按需计算的提醒时段生成稳定的负数ID
+    :param medication_id: 药物ID
+    :param slot_date: 计划日期
+    :param minutes: 当日分钟数，None表示没有具体时间
+    :return: 虚拟提醒ID
+    :raises ValueError: 药物ID或日期超出可编码范围
+    """
+    day = slot_date.toordinal() - _VIRTUAL_ID_EPOCH
+    if not (0 < medication_id <= _VIRTUAL_ID_MAX_MEDICATION_ID and 0 <= day < 1 << _VIRTUAL_ID_DAY_BITS):
+        raise ValueError("药物ID或日期超出虚拟提醒ID的编码范围")
+    if minutes is None:
+        minutes = _VIRTUAL_ID_NO_TIME
+    return -((medication_id << _VIRTUAL_ID_DAY_BITS | day) << _VIRTUAL_ID_MINUTE_BITS | minutes)
+
+
+def _decode_virtual_id(reminder_id: int) -> Tuple[int, date, Optional[int]]:
+    """
+    解析虚拟提醒ID
+    :param reminder_id: 虚拟提醒ID（负数）
+    :return: (药物ID, 计划日期, 当日分钟数)
+    :raises ValueError: 不是有效的虚拟提醒ID
+    """
+    value = -reminder_id
+    minutes = value & ((1 << _VIRTUAL_ID_MINUTE_BITS) - 1)
+    day = (value >> _VIRTUAL_ID_MINUTE_BITS) & ((1 << _VIRTUAL_ID_DAY_BITS) - 1)
+    medication_id = value >> (_VIRTUAL_ID_MINUTE_BITS + _VIRTUAL_ID_DAY_BITS)
+    if medication_id <= 0 or minutes > _VIRTUAL_ID_NO_TIME:
+        raise ValueError("无效的虚拟提醒ID")
+    return medication_id, date.fromordinal(_VIRTUAL_ID_EPOCH + day), None if minutes == _VIRTUAL_ID_NO_TIME else minutes
+
+
+def _build_virtual_reminder_dict(medication: Medication, slot_date: date, minutes: Optional[int]) -> dict:
+    """
+    构建未落库的虚拟提醒响应字典（与已存储提醒结构一致）
+    :param medication: 药物
+    :param slot_date: 计划日期
+    :param minutes: 当日分钟数，None表示没有具体时间
+    :return: 提醒字典
+    """
+    return {
+        "id": _encode_virtual_id(medication.id, slot_date, minutes),
+        "user_id": medication.user_id,
+        "medication_id": medication.id,
+        "medication_name": medication.name,
+        "dosage": medication.dosage,
+        "scheduled_date": slot_date,
+        "scheduled_time": minute_label(minutes),
+        "is_completed": False,
+        "completed_at": None,
+        "created_at": medication.created_at,
+        "updated_at": medication.updated_at
+    }
+
+
+async def _get_virtual_reminders(db: AsyncSession, user_id: str, start: date, end: date) -> List[dict]:
+    """
+    根据药物排期按需计算日期区间内的提醒，并合并已落库的记录
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param start: 开始日期
+    :param end: 结束日期
+    :return: 按日期、时间排序的提醒列表
+    """
+    # 单日查询时在数据库中按星期几过滤weekly类型的药物（可使用weekly_days的GIN索引）
+    weekday = start.isoweekday() if start == end else None
+    medications = await _get_active_medications(db, user_id, weekday)
+    return await _merge_virtual_reminders(db, user_id, medications, start, end)
+
+
+async def _merge_virtual_reminders(
+    db: AsyncSession,
+    user_id: str,
+    medications: List[Medication],
+    start: date,
+    end: date
+) -> List[dict]:
+    """
+    展开药物在日期区间内的时段，并以已落库的记录（完成过的剂量）覆盖
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param medications: 激活的药物列表
+    :param start: 开始日期
+    :param end: 结束日期
+    :return: 按日期、时间排序的提醒列表
+    """
+    slots = {}
+    for med in medications:
+        for slot_date, minutes in MedicationSchedule.of(med).occurrences(start, end):
+            slots[(med.id, slot_date, minutes)] = _build_virtual_reminder_dict(med, slot_date, minutes)
+
+    stored = await db.execute(select(Reminder, Medication).join(
+        Medication, Reminder.medication_id == Medication.id
+    ).where(
+        Reminder.user_id == user_id,
+        Reminder.scheduled_date >= start,
+        Reminder.scheduled_date <= end
+    ))
+    for reminder, medication in stored:
+        slots[(reminder.medication_id, reminder.scheduled_date, parse_minutes(reminder.scheduled_time))] = \
+            _build_reminder_dict(reminder, medication)
+
+    # 按日期、时间（空值排在最后）排序
+    return sorted(slots.values(), key=_virtual_sort_key)
+
+
+def _virtual_sort_key(reminder: dict) -> tuple:
+    """
+    虚拟提醒的排序键：日期、时间（空值排在最后）、药物ID
+    :param reminder: 提醒字典
+    :return: 排序键
+    """
+    return _slot_sort_key(reminder["scheduled_date"], parse_minutes(reminder["scheduled_time"]), reminder["medication_id"])
+
+
+def _slot_sort_key(slot_date: date, minutes: Optional[int], medication_id: int) -> tuple:
+    """
+    时段的排序键（与_virtual_sort_key一致）
+    :param slot_date: 计划日期
+    :param minutes: 当日分钟数，None表示没有具体时间
+    :param medication_id: 药物ID
+    :return: 排序键
+    """
+    return slot_date, minutes is None, minutes or 0, medication_id
+
+
+async def _get_virtual_reminders_page(
+    db: AsyncSession,
+    user_id: str,
+    start: date,
+    end: date,
+    limit: Optional[int],
+    cursor: Optional[str]
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    分页获取按需计算的提醒（虚拟提醒没有稳定的存储ID，游标使用日期、时间、药物ID）
+    从游标日期开始逐日展开排期，累计超过一页时停止，只合并这些日期内已落库的记录，
+    每页的开销与页大小成正比，与剩余的日期范围无关
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param start: 开始日期
+    :param end: 结束日期
+    :param limit: 每页数量，None表示返回全部
+    :param cursor: 上一页返回的游标
+    :return: (提醒列表, 下一页游标)
+    :raises ValueError: 游标无效
+    """
+    after_key = None
+    if cursor:
+        after_date, after_time, after_medication_id = _parse_reminder_cursor(cursor)
+        after_key = _slot_sort_key(after_date, parse_minutes(after_time), after_medication_id)
+        start = max(start, after_date)
+    if start > end:
+        return [], None
+
+    medications = await _get_active_medications(db, user_id)
+
+    # 确定本页的最后日期：排期时段在游标之后累计超过limit条的那一天
+    # （已落库的记录只会覆盖或增加时段，合并后这些日期内的记录同样超过limit条）
+    last = end
+    if limit is not None:
+        schedules = [(med.id, MedicationSchedule.of(med)) for med in medications]
+        count = 0
+        current = start
+        while current <= end:
+            for medication_id, schedule in schedules:
+                for slot_date, minutes in schedule.occurrences(current, current):
+                    if after_key is None or _slot_sort_key(slot_date, minutes, medication_id) > after_key:
+                        count += 1
+            if count > limit:
+                last = current
+                break
+            current += timedelta(days=1)
+
+    reminders = await _merge_virtual_reminders(db, user_id, medications, start, last)
+    if after_key is not None:
+        reminders = [r for r in reminders if _virtual_sort_key(r) > after_key]
+    if limit is None or len(reminders) <= limit:
+        # 未取满一页时说明已到达结束日期
+        return reminders, None
+
+    reminders = reminders[:limit]
+    last_reminder = reminders[-1]
+    return reminders, encode_cursor(
+        last_reminder["scheduled_date"], last_reminder["scheduled_time"], last_reminder["medication_id"]
+    )
+
+
+async def _materialize_virtual_reminders(db: AsyncSession, user_id: str, reminder_ids: List[int]) -> Dict[int, int]:
+    """
+    将虚拟提醒ID对应的时段批量落库（已存在的时段由唯一约束跳过）
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param reminder_ids: 虚拟提醒ID列表
+    :return: 虚拟提醒ID -> 已存储的记录ID（无效或不属于该用户的ID不包含在内）
+    """
+    slots = {}
+    for reminder_id in reminder_ids:
+        try:
+            slots[reminder_id] = _decode_virtual_id(reminder_id)
+        except (ValueError, OverflowError):
+            continue
+    if not slots:
+        return {}
+
+    result = await db.execute(select(Medication).where(
+        Medication.id.in_({medication_id for medication_id, _, _ in slots.values()}),
+        Medication.user_id == user_id
+    ))
+    medications = {medication.id: medication for medication in result.scalars()}
+
+    # 校验时段确实属于药物排期
+    schedules = {medication_id: MedicationSchedule.of(medication) for medication_id, medication in medications.items()}
+    keys = {
+        reminder_id: slot
+        for reminder_id, slot in slots.items()
+        if slot[0] in schedules and schedules[slot[0]].is_scheduled(slot[1], slot[2])
+    }
+    if not keys:
+        return {}
+
+    await _bulk_insert_reminders(db, [
+        {
+            "user_id": user_id,
+            "medication_id": medication_id,
+            "scheduled_date": slot_date,
+            "scheduled_time": minute_label(minutes),
+            "is_completed": False
+        }
+        for medication_id, slot_date, minutes in dict.fromkeys(keys.values())
+    ])
+
+    # 按 (药物, 日期) 取回记录，再按当日分钟数匹配时段
+    result = await db.execute(select(
+        Reminder.id, Reminder.medication_id, Reminder.scheduled_date, Reminder.scheduled_time
+    ).where(or_(*(
+        and_(Reminder.medication_id == medication_id, Reminder.scheduled_date == slot_date)
+        for medication_id, slot_date in {(key[0], key[1]) for key in keys.values()}
+    ))))
+    stored = {(row.medication_id, row.scheduled_date, parse_minutes(row.scheduled_time)): row.id for row in result}
+    return {reminder_id: stored[key] for reminder_id, key in keys.items() if key in stored}
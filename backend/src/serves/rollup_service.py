@@ -0,0 +1,228 @@
+"""
+用药提醒每日汇总服务层
+提醒生成、完成状态变化和药物删除时，以数据修改CTE在同一条SQL中增量更新reminder_daily_rollup，
+并提供按用户重建与一致性校验，统计接口读取按天汇总的行而不是逐条提醒
+"""
+import re
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional
+from sqlalchemy import select, delete, func, case, cast, and_, or_, Date, Time
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from ..core.config import config
+from ..db.database import async_sessions
+from ..db.models.reminder import Reminder
+from ..db.models.reminder_rollup import ReminderDailyRollup
+from ..db.models.user import UserProfile
+
+
+# 有效的计划时间（H:MM或HH:MM，00:00-23:59），SQL与Python按同一规则判断，格式错误的时间视为不准时
+SCHEDULED_TIME_PATTERN = r'^([01]?[0-9]|2[0-3]):[0-5][0-9]$'
+_SCHEDULED_TIME_REGEX = re.compile(SCHEDULED_TIME_PATTERN)
+
+
+def on_time_window() -> timedelta:
+    """获取汇总使用的准时判断时间偏差（REMINDER_ON_TIME_WINDOW_MINUTES）"""
+    return timedelta(minutes=config.REMINDER_ON_TIME_WINDOW_MINUTES)
+
+
+def on_time_expression(
+    window: timedelta,
+    scheduled_date=Reminder.scheduled_date,
+    scheduled_time=Reminder.scheduled_time,
+    is_completed=Reminder.is_completed,
+    completed_at=Reminder.completed_at
+):
+    """
+    构建"准时完成"的SQL表达式
+    有具体时间的提醒：完成时间在计划时间前后window内；weekly类型（无具体时间）：当天完成即为准时；
+    计划时间格式错误时为不准时（先以正则判断再转换为time，避免转换失败导致整条语句出错）
+    :param window: 允许的时间偏差
+    :param scheduled_date: 计划日期列（默认为提醒表的列，也可以是CTE中的列）
+    :param scheduled_time: 计划时间列
+    :param is_completed: 完成状态列
+    :param completed_at: 完成时间列
+    :return: SQL布尔表达式
+    """
+    due_at = scheduled_date + cast(scheduled_time, Time)
+    return and_(
+        is_completed.is_(True),
+        case(
+            (scheduled_time.is_(None), cast(completed_at, Date) == scheduled_date),
+            (scheduled_time.regexp_match(SCHEDULED_TIME_PATTERN), completed_at.between(due_at - window, due_at + window)),
+            else_=False
+        )
+    )
+
+
+def is_on_time(
+    scheduled_date: date,
+    scheduled_time: Optional[str],
+    is_completed: bool,
+    completed_at: Optional[datetime],
+    window: timedelta
+) -> bool:
+    """
+    判断提醒是否准时完成（与on_time_expression规则一致）
+    :param scheduled_date: 计划日期
+    :param scheduled_time: 计划时间（HH:MM，weekly类型为空）
+    :param is_completed: 是否已完成
+    :param completed_at: 完成时间
+    :param window: 允许的时间偏差
+    :return: 是否准时完成
+    """
+    if not is_completed or completed_at is None:
+        return False
+    if scheduled_time is None:
+        return completed_at.date() == scheduled_date
+    if not isinstance(scheduled_time, str) or not _SCHEDULED_TIME_REGEX.fullmatch(scheduled_time):
+        return False
+    hour, minute = map(int, scheduled_time.split(':'))
+    due_at = datetime.combine(scheduled_date, time(hour, minute))
+    return abs(completed_at - due_at) <= window
+
+
+def upsert_rollup_deltas(deltas):
+    """
+    构建将增量累加到汇总表的语句（INSERT ... SELECT ... ON CONFLICT DO UPDATE）
+    带RETURNING以便作为数据修改CTE附加到提醒的写入语句上，与之在同一次往返中执行
+    :param deltas: 查询，依次返回 用户ID、药物ID、计划日期、计划次数、完成次数、准时次数，
+                   同一 (用户, 药物, 日期) 只能出现一次（单条语句不能重复更新同一行）
+    :return: INSERT语句
+    """
+    stmt = pg_insert(ReminderDailyRollup).from_select(
+        ["user_id", "medication_id", "scheduled_date", "scheduled", "completed", "on_time"],
+        deltas
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "medication_id", "scheduled_date"],
+        set_={
+            "scheduled": ReminderDailyRollup.scheduled + stmt.excluded.scheduled,
+            "completed": ReminderDailyRollup.completed + stmt.excluded.completed,
+            "on_time": ReminderDailyRollup.on_time + stmt.excluded.on_time,
+            "updated_at": datetime.now()
+        }
+    ).returning(ReminderDailyRollup.medication_id)
+
+
+def delete_medication_rollup(medication_id: int, user_id: str):
+    """
+    构建删除药物对应汇总行的语句（带RETURNING，可作为数据修改CTE）
+    :param medication_id: 药物ID
+    :param user_id: 用户ID
+    :return: DELETE语句
+    """
+    return delete(ReminderDailyRollup).where(
+        ReminderDailyRollup.medication_id == medication_id,
+        ReminderDailyRollup.user_id == user_id
+    ).returning(ReminderDailyRollup.medication_id)
+
+
+def _aggregate_reminders(user_id: Optional[str] = None):
+    """
+    按 (用户, 药物, 日期) 从提醒表直接聚合，用于重建与校验
+    :param user_id: 只聚合指定用户，为空表示全部
+    :return: 查询语句
+    """
+    query = select(
+        Reminder.user_id,
+        Reminder.medication_id,
+        Reminder.scheduled_date,
+        func.count().label("scheduled"),
+        func.count().filter(Reminder.is_completed.is_(True)).label("completed"),
+        func.count().filter(on_time_expression(on_time_window())).label("on_time")
+    ).group_by(
+        Reminder.user_id, Reminder.medication_id, Reminder.scheduled_date
+    )
+    if user_id is not None:
+        query = query.where(Reminder.user_id == user_id)
+    return query
+
+
+async def rebuild_user_rollup(db: AsyncSession, user_id: str) -> int:
+    """
+    从提醒表重建用户的全部汇总行（不提交事务）
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :return: 写入的汇总行数
+    """
+    await db.execute(delete(ReminderDailyRollup).where(ReminderDailyRollup.user_id == user_id))
+    result = await db.execute(pg_insert(ReminderDailyRollup).from_select(
+        ["user_id", "medication_id", "scheduled_date", "scheduled", "completed", "on_time"],
+        _aggregate_reminders(user_id)
+    ))
+    return result.rowcount
+
+
+async def rebuild_rollups(user_id: Optional[str] = None, batch_size: int = 100) -> dict:
+    """
+    重建汇总表（按用户ID键集分页，每批单独提交）
+    修改REMINDER_ON_TIME_WINDOW_MINUTES后需要重建，已有汇总按旧的时间偏差计算
+    :param user_id: 只重建指定用户，为空表示全部用户
+    :param batch_size: 每批处理的用户数
+    :return: 重建统计（用户数、汇总行数）
+    """
+    stats = {"users": 0, "rows": 0}
+    last_id = ""
+
+    while True:
+        async with async_sessions() as db:
+            if user_id is not None:
+                user_ids = [user_id]
+            else:
+                user_ids = list(await db.scalars(
+                    select(UserProfile.id).where(UserProfile.id > last_id).order_by(UserProfile.id).limit(batch_size)
+                ))
+            if not user_ids:
+                break
+
+            for current_id in user_ids:
+                stats["rows"] += await rebuild_user_rollup(db, current_id)
+                stats["users"] += 1
+            await db.commit()
+
+        if user_id is not None:
+            break
+        last_id = user_ids[-1]
+        print(f"已重建 {stats['users']} 个用户的汇总（最后用户 {last_id}）")
+
+    return stats
+
+
+async def check_rollups(user_id: Optional[str] = None, limit: int = 100) -> List[dict]:
+    """
+    校验汇总表与提醒表是否一致（全量外连接比较，汇总行全为0视为不存在）
+    :param user_id: 只校验指定用户，为空表示全部用户
+    :param limit: 最多返回的不一致条数
+    :return: 不一致的汇总键及两边的计数
+    """
+    expected = _aggregate_reminders(user_id).subquery("expected")
+    actual_query = select(ReminderDailyRollup)
+    if user_id is not None:
+        actual_query = actual_query.where(ReminderDailyRollup.user_id == user_id)
+    actual = actual_query.subquery("actual")
+
+    counts = ("scheduled", "completed", "on_time")
+    query = select(
+        func.coalesce(expected.c.user_id, actual.c.user_id).label("user_id"),
+        func.coalesce(expected.c.medication_id, actual.c.medication_id).label("medication_id"),
+        func.coalesce(expected.c.scheduled_date, actual.c.scheduled_date).label("scheduled_date"),
+        *(func.coalesce(expected.c[name], 0).label(f"expected_{name}") for name in counts),
+        *(func.coalesce(actual.c[name], 0).label(f"actual_{name}") for name in counts)
+    ).select_from(
+        expected.join(
+            actual,
+            and_(
+                expected.c.user_id == actual.c.user_id,
+                expected.c.medication_id == actual.c.medication_id,
+                expected.c.scheduled_date == actual.c.scheduled_date
+            ),
+            full=True
+        )
+    ).where(
+        or_(*(func.coalesce(expected.c[name], 0) != func.coalesce(actual.c[name], 0) for name in counts))
+    ).limit(limit)
+
+    async with async_sessions() as db:
+        result = await db.execute(query)
+        return [dict(row) for row in result.mappings()]
@@ -0,0 +1,200 @@
+"""
+提醒后台调度服务
+在进程内周期性地为所有有激活药物的用户保持滚动N天的提醒记录
+"""
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional, List
+from sqlalchemy import select, or_, func
+from ..core.config import config
+from ..core.read_cache import read_cache
+from ..db.database import async_engine, async_sessions
+from ..db.models.medication import Medication
+from ..db.models.reminder_horizon import ReminderHorizon
+from . import reminder_service
+
+
+# 调度器的PostgreSQL会话级咨询锁键，多个工作进程中同一时间只有一个执行物化
+SCHEDULER_ADVISORY_LOCK_KEY = 0x4D54_5245_4D44  # "MTREMD"
+
+
+class ReminderScheduler:
+    """提醒物化调度器
+
+    - 每次运行按用户ID分批（keyset）处理需要补齐的用户
+    - 每个用户依据物化水位只生成新增的日期
+    - 记录运行耗时、吞吐量和滞后时间
+    """
+
+    def __init__(self, horizon_days: int, interval: int, batch_size: int):
+        self.horizon_days = horizon_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+        # 运行统计
+        self.runs = 0
+        self.failures = 0
+        self.user_failures = 0
+        self.skipped_runs = 0
+        self.total_users = 0
+        self.total_reminders = 0
+        self.last_run_started_at: Optional[datetime] = None
+        self.last_run_finished_at: Optional[datetime] = None
+        self.last_run_duration = 0.0
+        self.last_run_users = 0
+        self.last_run_reminders = 0
+        self.last_error: Optional[str] = None
+
+    async def start(self):
+        """启动后台调度任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """停止后台调度任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        """调度循环"""
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                self.last_error = f"{type(e).__name__}: {str(e)}"
+                print(f"提醒调度运行失败: {self.last_error}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self):
+        """
+        执行一次完整的物化（其他工作进程正在执行时跳过本次运行）
+        每个工作进程都会启动调度器，以咨询锁保证同一时间只有一个进程在物化；
+        锁在专用连接上持有，运行结束后释放
+        """
+        async with async_engine.connect() as lock_conn:
+            locked = await lock_conn.scalar(select(func.pg_try_advisory_lock(SCHEDULER_ADVISORY_LOCK_KEY)))
+            await lock_conn.commit()
+            if not locked:
+                self.skipped_runs += 1
+                return
+            try:
+                await self._run_locked()
+            finally:
+                await lock_conn.execute(select(func.pg_advisory_unlock(SCHEDULER_ADVISORY_LOCK_KEY)))
+                await lock_conn.commit()
+
+    async def _run_locked(self):
+        """逐批处理所有需要补齐的用户"""
+        started = time.perf_counter()
+        self.last_run_started_at = datetime.now()
+        through = date.today() + timedelta(days=self.horizon_days - 1)
+
+        users = 0
+        reminders = 0
+        errors = []
+        after_user_id = ""
+        while True:
+            user_ids, generated = await self._materialize_batch(after_user_id, through, errors)
+            users += len(user_ids)
+            reminders += generated
+            if len(user_ids) < self.batch_size:
+                break
+            after_user_id = user_ids[-1]
+
+        self.runs += 1
+        self.total_users += users
+        self.total_reminders += reminders
+        self.last_run_users = users
+        self.last_run_reminders = reminders
+        self.last_run_duration = time.perf_counter() - started
+        self.last_run_finished_at = datetime.now()
+        self.last_error = errors[-1] if errors else None
+
+    async def _materialize_batch(self, after_user_id: str, through: date, errors: List[str]) -> tuple[List[str], int]:
+        """
+        处理一批需要补齐提醒的用户（单个用户失败时回滚并记录，继续处理后续用户）
+        :param after_user_id: 上一批最后一个用户ID
+        :param through: 需要覆盖到的日期（含）
+        :param errors: 收集失败信息的列表
+        :return: (本批用户ID列表, 生成的记录数量)
+        """
+        async with async_sessions() as db:
+            # 有激活药物且水位缺失、不足或已失效的用户
+            rows = await db.execute(select(Medication.user_id).outerjoin(
+                ReminderHorizon, ReminderHorizon.user_id == Medication.user_id
+            ).where(
+                Medication.is_active == True,
+                Medication.user_id > after_user_id,
+                or_(
+                    ReminderHorizon.user_id.is_(None),
+                    ReminderHorizon.materialized_through < through,
+                    Medication.updated_at > ReminderHorizon.updated_at
+                )
+            ).distinct().order_by(Medication.user_id).limit(self.batch_size))
+
+            user_ids = [row.user_id for row in rows]
+            generated = 0
+            for user_id in user_ids:
+                try:
+                    count = await reminder_service.materialize_user_horizon(db, user_id, through)
+                    await db.commit()
+                except Exception as e:
+                    await db.rollback()
+                    self.user_failures += 1
+                    errors.append(f"用户 {user_id}: {type(e).__name__}: {str(e)}")
+                    print(f"提醒调度处理用户失败: {errors[-1]}")
+                    continue
+                if count:
+                    await read_cache.invalidate(user_id)
+                generated += count
+            return user_ids, generated
+
+    def stats(self) -> dict:
+        """
+        获取调度器运行状态
+        :return: 包含滞后时间与吞吐量的统计字典
+        """
+        lag_seconds = None
+        if self.last_run_finished_at is not None:
+            lag_seconds = round((datetime.now() - self.last_run_finished_at).total_seconds(), 3)
+
+        duration = self.last_run_duration
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "horizon_days": self.horizon_days,
+            "interval": self.interval,
+            "batch_size": self.batch_size,
+            "runs": self.runs,
+            "failures": self.failures,
+            "user_failures": self.user_failures,
+            "skipped_runs": self.skipped_runs,
+            "last_error": self.last_error,
+            "last_run_started_at": self.last_run_started_at,
+            "last_run_finished_at": self.last_run_finished_at,
+            "last_run_duration": round(duration, 3),
+            "last_run_users": self.last_run_users,
+            "last_run_reminders": self.last_run_reminders,
+            "users_per_second": round(self.last_run_users / duration, 2) if duration else 0.0,
+            "reminders_per_second": round(self.last_run_reminders / duration, 2) if duration else 0.0,
+            "total_users": self.total_users,
+            "total_reminders": self.total_reminders,
+            "lag_seconds": lag_seconds
+        }
+
+
+# 定义唯一的调度器实例
+reminder_scheduler = ReminderScheduler(
+    horizon_days=config.REMINDER_HORIZON_DAYS,
+    interval=config.REMINDER_SCHEDULER_INTERVAL,
+    batch_size=config.REMINDER_SCHEDULER_BATCH_SIZE
+)
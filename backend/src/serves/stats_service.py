@@ -0,0 +1,244 @@
+"""
+服药依从性统计服务层
+在数据库中按日、周、药物分组聚合完成率与准时率，只返回聚合结果
+默认准时窗口下读取按天维护的汇总表，行数与天数成正比而与服药次数无关
+"""
+from datetime import date, timedelta
+from typing import Dict, Optional, Tuple
+from sqlalchemy import select, func, cast, literal_column, Date
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import config
+from ..db.models.medication import Medication
+from ..db.models.reminder import Reminder
+from ..db.models.reminder_rollup import ReminderDailyRollup
+from . import reminder_service
+from . import rollup_service
+
+
+# 聚合结果：(已计划数, 已完成数, 准时完成数)
+Counts = Tuple[int, int, int]
+
+
+async def _aggregate_stored(
+    db: AsyncSession,
+    user_id: str,
+    start_date: date,
+    end_date: date,
+    window: timedelta
+) -> Tuple[Dict[date, Counts], Dict[date, Counts], Dict[int, Tuple[str, Counts]]]:
+    """
+    使用GROUPING SETS一次查询按日、周、药物聚合已存储的提醒
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param start_date: 开始日期
+    :param end_date: 结束日期
+    :param window: 准时判断的时间偏差
+    :return: (按日聚合, 按周聚合（键为周一日期）, 按药物聚合（药物ID -> (名称, 聚合)）)
+    """
+    # 字段名以字面量写入SQL，保证SELECT与GROUP BY中的表达式完全一致
+    week_start = cast(func.date_trunc(literal_column("'week'"), Reminder.scheduled_date), Date)
+    # grouping位：日期、周、药物ID，未参与分组的列对应位为1
+    grouping = func.grouping(Reminder.scheduled_date, week_start, Reminder.medication_id)
+
+    result = await db.execute(
+        select(
+            grouping.label("grouping"),
+            Reminder.scheduled_date,
+            week_start.label("week_start"),
+            Reminder.medication_id,
+            func.max(Medication.name).label("medication_name"),
+            func.count().label("scheduled"),
+            func.count().filter(Reminder.is_completed.is_(True)).label("completed"),
+            func.count().filter(rollup_service.on_time_expression(window)).label("on_time")
+        ).join(
+            Medication, Reminder.medication_id == Medication.id
+        ).where(
+            Reminder.user_id == user_id,
+            Reminder.scheduled_date >= start_date,
+            Reminder.scheduled_date <= end_date
+        ).group_by(
+            func.grouping_sets(Reminder.scheduled_date, week_start, Reminder.medication_id)
+        )
+    )
+
+    daily, weekly, medications = {}, {}, {}
+    for row in result:
+        counts = (row.scheduled, row.completed, row.on_time)
+        if row.grouping == 0b011:
+            daily[row.scheduled_date] = counts
+        elif row.grouping == 0b101:
+            weekly[row.week_start] = counts
+        elif row.grouping == 0b110:
+            medications[row.medication_id] = (row.medication_name, counts)
+    return daily, weekly, medications
+
+
+async def _aggregate_rollup(
+    db: AsyncSession,
+    user_id: str,
+    start_date: date,
+    end_date: date
+) -> Tuple[Dict[date, Counts], Dict[date, Counts], Dict[int, Tuple[str, Counts]]]:
+    """
+    使用GROUPING SETS一次查询按日、周、药物汇总每日汇总表（准时次数按REMINDER_ON_TIME_WINDOW_MINUTES计算）
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param start_date: 开始日期
+    :param end_date: 结束日期
+    :return: 与_aggregate_stored相同结构的聚合结果
+    """
+    week_start = cast(func.date_trunc(literal_column("'week'"), ReminderDailyRollup.scheduled_date), Date)
+    grouping = func.grouping(ReminderDailyRollup.scheduled_date, week_start, ReminderDailyRollup.medication_id)
+
+    result = await db.execute(
+        select(
+            grouping.label("grouping"),
+            ReminderDailyRollup.scheduled_date,
+            week_start.label("week_start"),
+            ReminderDailyRollup.medication_id,
+            func.max(Medication.name).label("medication_name"),
+            func.sum(ReminderDailyRollup.scheduled).label("scheduled"),
+            func.sum(ReminderDailyRollup.completed).label("completed"),
+            func.sum(ReminderDailyRollup.on_time).label("on_time")
+        ).join(
+            Medication, ReminderDailyRollup.medication_id == Medication.id
+        ).where(
+            ReminderDailyRollup.user_id == user_id,
+            ReminderDailyRollup.scheduled_date >= start_date,
+            ReminderDailyRollup.scheduled_date <= end_date,
+            ReminderDailyRollup.scheduled > 0
+        ).group_by(
+            func.grouping_sets(ReminderDailyRollup.scheduled_date, week_start, ReminderDailyRollup.medication_id)
+        )
+    )
+
+    daily, weekly, medications = {}, {}, {}
+    for row in result:
+        counts = (int(row.scheduled), int(row.completed), int(row.on_time))
+        if row.grouping == 0b011:
+            daily[row.scheduled_date] = counts
+        elif row.grouping == 0b101:
+            weekly[row.week_start] = counts
+        elif row.grouping == 0b110:
+            medications[row.medication_id] = (row.medication_name, counts)
+    return daily, weekly, medications
+
+
+async def _aggregate_virtual(
+    db: AsyncSession,
+    user_id: str,
+    start_date: date,
+    end_date: date,
+    window: timedelta
+) -> Tuple[Dict[date, Counts], Dict[date, Counts], Dict[int, Tuple[str, Counts]]]:
+    """
+    虚拟模式下按药物排期展开计划数，再合并已落库的完成记录进行聚合
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param start_date: 开始日期
+    :param end_date: 结束日期
+    :param window: 准时判断的时间偏差
+    :return: 与_aggregate_stored相同结构的聚合结果
+    """
+    reminders, _ = await reminder_service.get_date_range_reminders(db, user_id, start_date, end_date)
+
+    daily, weekly, medications = {}, {}, {}
+    for reminder in reminders:
+        on_time = rollup_service.is_on_time(reminder["scheduled_date"], reminder["scheduled_time"],
+                                            reminder["is_completed"], reminder["completed_at"], window)
+        delta = (1, int(bool(reminder["is_completed"])), int(on_time))
+        slot_date = reminder["scheduled_date"]
+        week = slot_date - timedelta(days=slot_date.weekday())
+        daily[slot_date] = _add_counts(daily.get(slot_date), delta)
+        weekly[week] = _add_counts(weekly.get(week), delta)
+        name, counts = medications.get(reminder["medication_id"], (reminder["medication_name"], None))
+        medications[reminder["medication_id"]] = (name, _add_counts(counts, delta))
+    return daily, weekly, medications
+
+
+def _add_counts(counts: Optional[Counts], delta: Counts) -> Counts:
+    """累加聚合计数"""
+    if counts is None:
+        return delta
+    return counts[0] + delta[0], counts[1] + delta[1], counts[2] + delta[2]
+
+
+def _rates(counts: Counts) -> dict:
+    """
+    将聚合计数转换为响应字典
+    :param counts: (已计划数, 已完成数, 准时完成数)
+    :return: 计数与完成率、准时率（准时率以已完成数为分母）
+    """
+    scheduled, completed, on_time = counts
+    return {
+        "scheduled": scheduled,
+        "completed": completed,
+        "on_time": on_time,
+        "completion_rate": round(completed / scheduled, 4) if scheduled else 0.0,
+        "on_time_rate": round(on_time / completed, 4) if completed else 0.0
+    }
+
+
+def _compute_streaks(daily: Dict[date, Counts]) -> dict:
+    """
+    计算连续全部完成的天数（没有计划的日期不中断连续记录）
+    今天及以后尚未全部完成时不中断当前连续记录
+    :param daily: 按日聚合
+    :return: 当前连续天数与最长连续天数
+    """
+    today = date.today()
+    longest = current = 0
+    for slot_date in sorted(daily):
+        scheduled, completed, _ = daily[slot_date]
+        if completed >= scheduled:
+            current += 1
+            longest = max(longest, current)
+        elif slot_date < today:
+            current = 0
+    return {"current": current, "longest": longest}
+
+
+async def get_adherence_stats(
+    db: AsyncSession,
+    user_id: str,
+    start_date: date,
+    end_date: date,
+    on_time_window_minutes: Optional[int] = None
+) -> dict:
+    """
+    获取日期范围内的服药依从性统计
+    :param db: 数据库会话
+    :param user_id: 用户ID
+    :param start_date: 开始日期
+    :param end_date: 结束日期
+    :param on_time_window_minutes: 准时判断允许的偏差（分钟），默认使用REMINDER_ON_TIME_WINDOW_MINUTES
+    :return: 汇总、按日、按周、按药物的完成率与准时率，以及连续完成天数
+    """
+    if on_time_window_minutes is None:
+        on_time_window_minutes = config.REMINDER_ON_TIME_WINDOW_MINUTES
+    window = timedelta(minutes=on_time_window_minutes)
+
+    if config.REMINDER_READ_MODE == "virtual":
+        daily, weekly, medications = await _aggregate_virtual(db, user_id, start_date, end_date, window)
+    elif config.REMINDER_STATS_USE_ROLLUP and on_time_window_minutes == config.REMINDER_ON_TIME_WINDOW_MINUTES:
+        daily, weekly, medications = await _aggregate_rollup(db, user_id, start_date, end_date)
+    else:
+        daily, weekly, medications = await _aggregate_stored(db, user_id, start_date, end_date, window)
+
+    total = (0, 0, 0)
+    for counts in daily.values():
+        total = _add_counts(total, counts)
+
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "on_time_window_minutes": on_time_window_minutes,
+        "summary": _rates(total),
+        "daily": [{"day": key, **_rates(daily[key])} for key in sorted(daily)],
+        "weekly": [{"week_start": key, **_rates(weekly[key])} for key in sorted(weekly)],
+        "medications": [
+            {"medication_id": medication_id, "medication_name": name, **_rates(counts)}
+            for medication_id, (name, counts) in sorted(medications.items())
+        ],
+        "streak": _compute_streaks(daily)
+    }
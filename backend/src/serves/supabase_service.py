@@ -2,14 +2,54 @@
 Supabase集成服务层
 处理Supabase Auth认证和Storage存储
 """
+import hashlib
+import time
 from typing import Optional, Dict, Any
 from supabase import create_client, Client
 from jose import jwt, JWTError
+from ..core.cache import TTLCache
 from ..core.config import config
 
 # 初始化Supabase客户端
 supabase: Client = create_client(config.SUPABASE_URL, config.SUPABASE_SERVICE_KEY)
 
+# 已验证token缓存（键为token的SHA-256摘要，条目不会存活超过token的过期时间）
+token_cache = TTLCache(maxsize=config.JWT_CACHE_MAXSIZE, ttl=config.JWT_CACHE_TTL)
+
+
+def _load_jwt_backend():
+    """
+    加载JWT解码实现
+    配置为pyjwt且已安装PyJWT时使用PyJWT，否则使用python-jose
+    :return: (解码函数, 验证失败异常类型)
+    """
+    if config.JWT_BACKEND == "pyjwt":
+        try:
+            import jwt as pyjwt
+        except ImportError:
+            print("未安装PyJWT，回退到python-jose进行JWT验证")
+        else:
+            def decode_with_pyjwt(token: str) -> Dict[str, Any]:
+                return pyjwt.decode(
+                    token,
+                    config.SUPABASE_JWT_SECRET,
+                    algorithms=["HS256"],
+                    audience="authenticated"
+                )
+            return decode_with_pyjwt, pyjwt.PyJWTError
+
+    def decode_with_jose(token: str) -> Dict[str, Any]:
+        return jwt.decode(
+            token,
+            config.SUPABASE_JWT_SECRET,
+            algorithms=["HS256"],
+            audience="authenticated"
+        )
+    return decode_with_jose, JWTError
+
+
+_decode_token, _JWTDecodeError = _load_jwt_backend()
+
 
 def verify_supabase_token(token: str) -> Optional[Dict[str, Any]]:
     """
@@ -17,25 +57,32 @@ def verify_supabase_token(token: str) -> Optional[Dict[str, Any]]:
 
     使用项目的JWT Secret验证token的签名和有效性。
     验证成功后返回token的payload，包含用户ID、邮箱等信息。
+    验证结果按token摘要缓存，命中时仍会检查过期时间。
 
     :param token: JWT token字符串
     :return: 解码后的payload字典，验证失败返回None
     """
-    try:
-        # 使用Supabase项目的JWT Secret来验证token
-        jwt_secret = config.SUPABASE_JWT_SECRET
+    cache_key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(cache_key)
+    if payload is not None:
+        # 过期的token永远不会被接受
+        if payload.get("exp") is None or payload["exp"] > time.time():
+            return payload
+        token_cache.delete(cache_key)
 
+    try:
         # 解码并验证token（验证签名、过期时间、audience等）
-        payload = jwt.decode(
-            token,
-            jwt_secret,
-            algorithms=["HS256"],
-            audience="authenticated"
-        )
+        payload = _decode_token(token)
+
+        # 缓存有效期不超过token的剩余有效期
+        ttl = config.JWT_CACHE_TTL
+        if payload.get("exp"):
+            ttl = min(ttl, payload["exp"] - time.time())
+        token_cache.set(cache_key, payload, ttl=ttl)
 
         return payload
 
-    except JWTError as e:
+    except _JWTDecodeError as e:
         # JWT验证失败（签名错误、过期、audience不匹配等）
         print(f"JWT验证失败: {type(e).__name__}")
         return None
@@ -2,35 +2,230 @@
 外部药物数据库服务层
 提供药物搜索和详情查询功能（对接极速API）
 """
-from typing import List, Optional, Literal
+from typing import List, Optional, Literal, Dict, Any, Hashable, Callable, Awaitable
+import asyncio
+import importlib.util
 import httpx
+from src.core.cache import TTLCache
+from src.core.singleflight import SingleFlight
 from src.core.config import config
+from src.serves import drug_catalog_service
+from src.serves.drug_search_index import get_drug_search_index
 
 
 # 极速API图片基础URL
 JISU_IMAGE_BASE_URL = "https://jisuapi.com/medicine/static/images/"
 
+# 应用级共享的HTTP客户端（在main.py的lifespan中创建和关闭，复用连接池）
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    """
+    创建调用极速API的HTTP客户端
+    已安装h2时启用HTTP/2，超时和连接池上限从配置读取
+    :return: HTTP客户端
+    """
+    http2 = config.JISU_HTTP2 and importlib.util.find_spec("h2") is not None
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(config.JISU_HTTP_TIMEOUT, connect=config.JISU_HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=config.JISU_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.JISU_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=config.JISU_HTTP_KEEPALIVE_EXPIRY
+        ),
+        http2=http2
+    )
+
+
+async def start_http_client():
+    """创建共享的HTTP客户端"""
+    global _http_client
+    if _http_client is None:
+        _http_client = _build_http_client()
+
+
+async def close_http_client():
+    """关闭共享的HTTP客户端"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """
+    获取共享的HTTP客户端（未经lifespan启动时按需创建）
+    :return: HTTP客户端
+    """
+    global _http_client
+    if _http_client is None:
+        _http_client = _build_http_client()
+    return _http_client
+
+
+# ========== 查询结果缓存 ==========
+# 搜索结果缓存（键为(搜索类型, 规范化关键词)）
+search_cache = TTLCache(maxsize=config.DRUG_SEARCH_CACHE_MAXSIZE, ttl=config.DRUG_SEARCH_CACHE_TTL)
+
+# 药品详情缓存（键为medicine_id）
+detail_cache = TTLCache(maxsize=config.DRUG_DETAIL_CACHE_MAXSIZE, ttl=config.DRUG_DETAIL_CACHE_TTL)
+
+# 正在后台刷新的缓存条目
+_refresh_tasks: Dict[tuple, asyncio.Task] = {}
+
+# 合并并发的相同上游请求（如热门条码扫描、说明书接口内部的详情查询）
+upstream_flights = SingleFlight()
+
+
+def _normalize_query(query: str) -> str:
+    """
+    规范化搜索关键词（去除首尾及重复空白、统一小写）
+    :param query: 搜索关键词
+    :return: 规范化后的关键词
+    """
+    return " ".join(query.lower().split())
+
+
+def _store_result(cache: TTLCache, key: Hashable, value: Any):
+    """
+    写入查询结果缓存
+    空结果（未找到）使用较短的负缓存时间，且不提供陈旧窗口
+    :param cache: 缓存
+    :param key: 缓存键
+    :param value: 查询结果
+    """
+    if value:
+        cache.set(key, value, stale_ttl=config.DRUG_CACHE_STALE_TTL)
+    else:
+        cache.set(key, value, ttl=config.DRUG_NEGATIVE_CACHE_TTL)
+
+
+def _schedule_refresh(cache: TTLCache, key: Hashable, fetch: Callable[[], Awaitable[Any]]):
+    """
+    在后台刷新陈旧的缓存条目（同一条目同时只刷新一次）
+    :param cache: 缓存
+    :param key: 缓存键
+    :param fetch: 获取最新结果的协程函数
+    """
+    refresh_key = (id(cache), key)
+    if refresh_key in _refresh_tasks:
+        return
+
+    async def refresh():
+        try:
+            _store_result(cache, key, await upstream_flights.do(refresh_key, fetch))
+        except Exception as e:
+            print(f"后台刷新药品缓存失败: {str(e)}")
+        finally:
+            _refresh_tasks.pop(refresh_key, None)
+
+    _refresh_tasks[refresh_key] = asyncio.create_task(refresh())
+
+
+async def _cached_call(cache: TTLCache, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    读取缓存，未命中时调用接口并写入缓存
+    命中陈旧条目时立即返回旧值，同时在后台刷新（stale-while-revalidate）
+    同一条目的并发未命中只会发起一次上游请求
+    :param cache: 缓存
+    :param key: 缓存键
+    :param fetch: 获取结果的协程函数
+    :return: 查询结果
+    """
+    found, value, stale = cache.lookup(key)
+    if found:
+        if stale:
+            _schedule_refresh(cache, key, fetch)
+        return value
+
+    async def fetch_and_store():
+        result = await fetch()
+        _store_result(cache, key, result)
+        return result
+
+    return await upstream_flights.do((id(cache), key), fetch_and_store)
+
 
 async def search_drugs_from_third_party(
         query: str,
         search_type: Literal["name", "barcode", "manufacturer"] = "name",
-        limit: int = 10
+        limit: int = 10,
+        mode: Optional[Literal["remote", "local", "auto"]] = None
 ) -> List[dict]:
     """
-    搜索药物
+    搜索药物（远程结果按搜索类型和规范化关键词缓存）
     :param query: 搜索关键词
     :param search_type: 搜索类型（name-名称, barcode-条码, manufacturer-厂家）
     :param limit: 返回结果数量限制
+    :param mode: 搜索模式（remote-极速API, local-本地目录索引, auto-本地索引有结果时优先），默认使用DRUG_SEARCH_MODE；
+                 本地索引尚未构建（如服务端配置为remote）时使用极速API
     :return: 药物列表
     """
     if not query or not query.strip():
         return []
 
+    mode = mode or config.DRUG_SEARCH_MODE
+    index = get_drug_search_index()
+    if mode != "remote" and index.ready:
+        results = index.search(query, search_type, limit)
+        if results or mode == "local":
+            return results
+
     if not config.JISU_API_KEY:
         raise ValueError("JISU_API_KEY 未配置，请在 .env 文件中设置")
 
     query = query.strip()
 
+    cache_key = (search_type, _normalize_query(query))
+    results = await _cached_call(
+        search_cache, cache_key,
+        lambda: _load_search_results(query, search_type)
+    )
+    return results[:limit]
+
+
+async def _load_search_results(
+        query: str,
+        search_type: Literal["name", "barcode", "manufacturer"]
+) -> List[dict]:
+    """
+    搜索药物：条码搜索优先读取本地药品目录，其余情况调用极速API并回写目录
+    :param query: 搜索关键词
+    :param search_type: 搜索类型
+    :return: 药物列表
+    """
+    if search_type == "barcode":
+        try:
+            catalog_results = await drug_catalog_service.find_catalog_by_barcode(query)
+        except Exception as e:
+            print(f"读取本地药品目录失败: {str(e)}")
+            catalog_results = []
+        if catalog_results:
+            return catalog_results
+
+    results = await _fetch_search_results(query, search_type)
+
+    try:
+        await drug_catalog_service.save_catalog_search_results(
+            results, barcode=query if search_type == "barcode" else None
+        )
+    except Exception as e:
+        print(f"写入本地药品目录失败: {str(e)}")
+
+    return results
+
+
+async def _fetch_search_results(
+        query: str,
+        search_type: Literal["name", "barcode", "manufacturer"]
+) -> List[dict]:
+    """
+    调用极速API搜索药物
+    :param query: 搜索关键词
+    :param search_type: 搜索类型
+    :return: 药物列表（接口返回的全部结果）
+    """
     # 构建请求参数
     params = {
         "appkey": config.JISU_API_KEY
@@ -48,42 +243,42 @@ async def search_drugs_from_third_party(
     url = f"{config.JISU_API_BASE_URL}/medicine/query"
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-
-            # 检查API返回状态
-            if data.get("status") != 0:
-                # 如果是未找到结果，返回空数组而不是抛出异常
-                error_msg = data.get('msg', '').lower()
-                if 'not found' in error_msg or '未找到' in error_msg or data.get("status") == 205:
-                    return []
-                raise Exception(f"API错误: {data.get('msg', '未知错误')}")
-
-            # 解析返回结果
-            result_list = data.get("result", {}).get("list", [])
-
-            # 转换为统一格式
-            results = []
-            for item in result_list[:limit]:
-                result = {
-                    "external_drug_id": f"jisu_{item['medicine_id']}",  # 添加前缀标识来源
-                    "name": item["name"],
-                    "generic_name": item["name"],  # API未提供通用名，使用药品名称
-                    "trade_name": item["name"],  # API未提供商品名，使用药品名称
-                    "manufacturer": item["manufacturer"],
-                    "specification": None,  # 查询接口不返回规格，需要调用详情接口
-                    "dosage_form": None,  # 查询接口不返回剂型，需要调用详情接口
-                    "is_prescription": item["prescription"] == 1,  # 1=处方药, 2=OTC
-                    "drug_image_url": _build_image_url(item.get("image", "")),
-                    "drug_code": None,  # 查询接口不返回药品本位码
-                    "approval_number": None,  # 查询接口不返回批准文号
-                    "medicine_id": item["medicine_id"]  # 保留原始ID用于详情查询
-                }
-                results.append(result)
+        client = _get_http_client()
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+
+        # 检查API返回状态
+        if data.get("status") != 0:
+            # 如果是未找到结果，返回空数组而不是抛出异常
+            error_msg = data.get('msg', '').lower()
+            if 'not found' in error_msg or '未找到' in error_msg or data.get("status") == 205:
+                return []
+            raise Exception(f"API错误: {data.get('msg', '未知错误')}")
+
+        # 解析返回结果
+        result_list = data.get("result", {}).get("list", [])
+
+        # 转换为统一格式
+        results = []
+        for item in result_list:
+            result = {
+                "external_drug_id": f"jisu_{item['medicine_id']}",  # 添加前缀标识来源
+                "name": item["name"],
+                "generic_name": item["name"],  # API未提供通用名，使用药品名称
+                "trade_name": item["name"],  # API未提供商品名，使用药品名称
+                "manufacturer": item["manufacturer"],
+                "specification": None,  # 查询接口不返回规格，需要调用详情接口
+                "dosage_form": None,  # 查询接口不返回剂型，需要调用详情接口
+                "is_prescription": item["prescription"] == 1,  # 1=处方药, 2=OTC
+                "drug_image_url": _build_image_url(item.get("image", "")),
+                "drug_code": None,  # 查询接口不返回药品本位码
+                "approval_number": None,  # 查询接口不返回批准文号
+                "medicine_id": item["medicine_id"]  # 保留原始ID用于详情查询
+            }
+            results.append(result)
 
-            return results
+        return results
 
     except httpx.HTTPError as e:
         raise Exception(f"HTTP请求失败: {str(e)}")
@@ -93,7 +288,7 @@ async def search_drugs_from_third_party(
 
 async def get_drug_detail_from_third_party(external_drug_id: str) -> Optional[dict]:
     """
-    获取药物详细信息
+    获取药物详细信息（结果按medicine_id缓存）
     :param external_drug_id: 外部数据库药物ID（格式：jisu_123 或直接传入 medicine_id）
     :return: 药物详细信息或None
     """
@@ -105,6 +300,50 @@ async def get_drug_detail_from_third_party(external_drug_id: str) -> Optional[di
     if external_drug_id.startswith("jisu_"):
         medicine_id = external_drug_id.replace("jisu_", "")
 
+    return await _cached_call(
+        detail_cache, medicine_id,
+        lambda: _load_drug_detail(medicine_id)
+    )
+
+
+async def _load_drug_detail(medicine_id: str) -> Optional[dict]:
+    """
+    获取药物详情：优先读取本地药品目录，未命中或超过刷新周期时调用极速API并回写目录
+    :param medicine_id: 极速API药品ID
+    :return: 药物详细信息或None
+    """
+    catalog_detail, is_fresh = None, False
+    try:
+        catalog_detail, is_fresh = await drug_catalog_service.get_catalog_detail(f"jisu_{medicine_id}")
+    except Exception as e:
+        print(f"读取本地药品目录失败: {str(e)}")
+
+    if catalog_detail is not None and is_fresh:
+        return catalog_detail
+
+    try:
+        drug_detail = await _fetch_drug_detail(medicine_id)
+    except Exception:
+        # 外部接口不可用时返回过期的目录记录
+        if catalog_detail is not None:
+            return catalog_detail
+        raise
+
+    if drug_detail:
+        try:
+            await drug_catalog_service.save_catalog_detail(drug_detail)
+        except Exception as e:
+            print(f"写入本地药品目录失败: {str(e)}")
+
+    return drug_detail
+
+
+async def _fetch_drug_detail(medicine_id: str) -> Optional[dict]:
+    """
+    调用极速API获取药物详细信息
+    :param medicine_id: 极速API药品ID
+    :return: 药物详细信息或None
+    """
     # 构建请求参数
     params = {
         "appkey": config.JISU_API_KEY,
@@ -115,42 +354,42 @@ async def get_drug_detail_from_third_party(external_drug_id: str) -> Optional[di
     url = f"{config.JISU_API_BASE_URL}/medicine/detail"
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-
-            # 检查API返回状态
-            if data.get("status") != 0:
-                # 如果是未找到，返回None
-                if "not found" in data.get("msg", "").lower():
-                    return None
-                raise Exception(f"API错误: {data.get('msg', '未知错误')}")
-
-            # 解析返回结果
-            result = data.get("result", {})
-
-            if not result:
+        client = _get_http_client()
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+
+        # 检查API返回状态
+        if data.get("status") != 0:
+            # 如果是未找到，返回None
+            if "not found" in data.get("msg", "").lower() or data.get("status") == 205:
                 return None
-
-            # 转换为统一格式
-            drug_detail = {
-                "external_drug_id": f"jisu_{result['medicine_id']}",
-                "name": result["name"],
-                "generic_name": result["name"],  # API未单独提供通用名
-                "trade_name": result["name"],  # API未单独提供商品名
-                "manufacturer": result["manufacturer"],
-                "specification": result.get("spec", ""),
-                "dosage_form": result.get("type", ""),
-                "is_prescription": result["prescription"] == 1,  # 1=处方药, 2=OTC
-                "drug_image_url": _build_image_url(result.get("image", "")),
-                "drug_code": result.get("reference_code", ""),  # 药品本位码
-                "approval_number": result.get("approval_num", ""),
-                "barcode": result.get("barcode", ""),
-                "instruction_manual": _parse_instruction_manual(result) if result["prescription"] == 2 else None
-            }
-
-            return drug_detail
+            raise Exception(f"API错误: {data.get('msg', '未知错误')}")
+
+        # 解析返回结果
+        result = data.get("result", {})
+
+        if not result:
+            return None
+
+        # 转换为统一格式
+        drug_detail = {
+            "external_drug_id": f"jisu_{result['medicine_id']}",
+            "name": result["name"],
+            "generic_name": result["name"],  # API未单独提供通用名
+            "trade_name": result["name"],  # API未单独提供商品名
+            "manufacturer": result["manufacturer"],
+            "specification": result.get("spec", ""),
+            "dosage_form": result.get("type", ""),
+            "is_prescription": result["prescription"] == 1,  # 1=处方药, 2=OTC
+            "drug_image_url": _build_image_url(result.get("image", "")),
+            "drug_code": result.get("reference_code", ""),  # 药品本位码
+            "approval_number": result.get("approval_num", ""),
+            "barcode": result.get("barcode", ""),
+            "instruction_manual": _parse_instruction_manual(result) if result["prescription"] == 2 else None
+        }
+
+        return drug_detail
 
     except httpx.HTTPError as e:
         raise Exception(f"HTTP请求失败: {str(e)}")
@@ -66,3 +66,46 @@ export const uncompleteReminder = (recordId) => {
     method: 'put'
   })
 }
+
+/**
+ * 获取日期范围内的服药依从性统计
+ * @param {string} startDate - 开始日期（YYYY-MM-DD格式），不传则默认最近30天
+ * @param {string} endDate - 结束日期（YYYY-MM-DD格式），不传则默认今天
+ * @returns {Promise}
+ */
+export const getReminderStats = (startDate, endDate) => {
+  return request({
+    url: '/reminders/stats',
+    method: 'get',
+    params: {
+      start_date: startDate,
+      end_date: endDate
+    }
+  })
+}
+
+/**
+ * 批量标记用药记录为已完成
+ * @param {number[]} recordIds - 记录ID列表
+ * @returns {Promise}
+ */
+export const batchCompleteReminders = (recordIds) => {
+  return request({
+    url: '/reminders/batch-complete',
+    method: 'post',
+    data: { ids: recordIds }
+  })
+}
+
+/**
+ * 批量取消用药记录的完成状态
+ * @param {number[]} recordIds - 记录ID列表
+ * @returns {Promise}
+ */
+export const batchUncompleteReminders = (recordIds) => {
+  return request({
+    url: '/reminders/batch-uncomplete',
+    method: 'post',
+    data: { ids: recordIds }
+  })
+}
@@ -54,6 +54,11 @@ export default defineConfig(({ mode }) => {
               console.log('代理请求:', req.method, req.url, '→', options.target + req.url.replace(/^\/api/, ''))
             })
           }
+        },
+        // 本地存储的药品照片（后端挂载在 /photos，无需改写路径）
+        '/photos': {
+          target: env.VITE_PROXY_TARGET || 'http://localhost:8000',
+          changeOrigin: true
         }
       }
     }